@@ -0,0 +1,88 @@
+"""
+AI分析プロンプトの固定部分
+
+OpenAIは直近のリクエストと先頭から一致する部分（1024トークン以上）を自動でキャッシュし、
+その入力トークンを割引料金で処理する。銘柄によって変わらない指示文・評価基準・回答形式を
+システムメッセージとして先頭に固定し、銘柄ごとのデータはその後ろ（ユーザーメッセージ）に
+置くことで、どの銘柄のリクエストでも先頭が1バイトも変わらないようにする。
+
+1銘柄ずつの分析とまとめて分析する場合で共通部分（ANALYSIS_INSTRUCTIONS）を揃え、
+回答形式だけを末尾で切り替える。
+"""
+
+from typing import Any, Dict
+
+# 分析に使うモデル
+MODEL = "gpt-4o-mini"
+
+# 指示文と評価基準（全リクエストで共通）
+ANALYSIS_INSTRUCTIONS = """あなたは初心者投資家向けのAI投資アドバイザーです。
+ユーザーが送る銘柄データを分析し、投資推奨をJSON形式で回答してください。
+
+【評価基準】
+- 割安度: PER・PBRは同じセクターの水準と比べて判断する（セクター平均があれば使う）
+- 収益性: ROEが高く安定している銘柄を評価する
+- 株主還元: 配当利回りは補助的な材料として扱う
+- トレンド: 移動平均の位置関係・ゴールデンクロス/デッドクロス・RSIの過熱感を考慮する
+- データが N/A の指標は推測で補わず、判断材料が少ないことを信頼度に反映する
+
+【信頼度（confidence_score）の目安】
+- 80-100: 財務指標とトレンドが同じ方向を示し、根拠が明確
+- 50-79: 根拠はあるが、相反する材料や不確実性がある
+- 0-49: 判断材料が不足している、または材料が拮抗している
+
+【推奨理由（reason）の書き方】
+- 専門用語は避けるか、初心者にも分かる言葉で補足する
+- 財務指標の評価、業績動向、投資判断の根拠を含める
+"""
+
+# 1銘柄ずつ分析する場合の回答形式
+SINGLE_RESPONSE_FORMAT = """
+以下のJSON形式で回答してください：
+{
+  "recommendation": "Buy" | "Sell" | "Hold",
+  "confidence_score": 0-100の整数,
+  "reason": "推奨理由を300文字程度で記述"
+}
+"""
+
+# 複数銘柄をまとめて分析する場合の回答形式
+GROUP_RESPONSE_FORMAT = """
+複数の銘柄が送られた場合は銘柄ごとに分析し、
+以下のJSON形式で、すべての銘柄について回答してください：
+{
+  "analyses": [
+    {
+      "ticker": "ティッカー",
+      "recommendation": "Buy" | "Sell" | "Hold",
+      "confidence_score": 0-100の整数,
+      "reason": "推奨理由を300文字程度で記述"
+    }
+  ]
+}
+"""
+
+# システムメッセージ（リクエストの先頭に固定する部分）
+SINGLE_SYSTEM_PROMPT = ANALYSIS_INSTRUCTIONS + SINGLE_RESPONSE_FORMAT
+GROUP_SYSTEM_PROMPT = ANALYSIS_INSTRUCTIONS + GROUP_RESPONSE_FORMAT
+
+
+def chat_request(system_prompt: str, payload: str) -> Dict[str, Any]:
+    """
+    固定部分と銘柄ごとのデータからチャットリクエストを作成
+
+    Args:
+        system_prompt: SINGLE_SYSTEM_PROMPT または GROUP_SYSTEM_PROMPT
+        payload: 銘柄ごとのデータ（ユーザーメッセージ）
+
+    Returns:
+        Dict: chat.completions.createの引数
+    """
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": payload},
+        ],
+        "response_format": {"type": "json_object"},
+    }
@@ -9,36 +9,129 @@ import sys
 import time
 import uuid
 import argparse
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Callable, Tuple
 from collections import deque
+from contextlib import nullcontext
 import threading
 import json
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
 
 import yfinance as yf
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 from openai import OpenAI
-from technical_analysis import calculate_trend_indicators, analyze_trend
+from technical_analysis import (
+    analyze_trend,
+    calculate_trend_indicators,
+    calculate_universe_indicators,
+)
+from pipeline import Pipeline, Stage
+from indicator_state import update_indicator_states
+from price_series import PriceSeries
+from db_pool import ConnectionPool, get_database_url
+from circuit_breaker import (
+    DEFAULT_COOLDOWN,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_MAX_OUTAGE,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from db_writer import DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL, BatchWriter
+from llm_batch import DEFAULT_BATCH_TIMEOUT, DEFAULT_POLL_INTERVAL, run_batch
+from materiality import (
+    DEFAULT_MAX_AGE_DAYS,
+    DEFAULT_PRICE_THRESHOLD,
+    DEFAULT_RATIO_THRESHOLD,
+    DEFAULT_RSI_THRESHOLD,
+    MaterialityGate,
+)
+from llm_cache import (
+    DEFAULT_CACHE_PATH,
+    DEFAULT_TTL_SECONDS,
+    LLMCache,
+    request_fingerprint,
+)
+from scheduler import AdmissionController, prioritize
+from prescoring import DEFAULT_BOUNDARY_MARGIN, DEFAULT_REFRESH_DAYS, PreScorer
+from analysis_prompt import GROUP_SYSTEM_PROMPT, SINGLE_SYSTEM_PROMPT, chat_request
+from llm_grouping import (
+    CACHE_VARIANT as GROUP_CACHE_VARIANT,
+    SectorGrouper,
+    group_request_timeout,
+    parse_group_response,
+    print_group_summary,
+)
+from metrics import (
+    DB_ANALYSES,
+    DB_PRICE_HISTORY,
+    FETCH,
+    LLM,
+    TA,
+    metrics,
+    payload_size,
+)
+from run_manifest import (
+    DEFERRED,
+    FAILED,
+    SUCCEEDED,
+    RunManifest,
+    create_run,
+    finish_run,
+    resume_run,
+    write_events,
+)
+from work_lease import (
+    DEFAULT_LEASE_SECONDS,
+    WorkLease,
+    daily_run_id,
+    ensure_run,
+    finalize_run,
+)
+from rate_limiter import (
+    acquire_openai,
+    all_limiters,
+    backoff_seconds,
+    openai_request_limiter,
+    openai_token_limiter,
+    report_error,
+    report_openai_error,
+    settle_openai,
+    wait_before_retry,
+    yahoo_limiter,
+)
+from rate_limiter import print_summary as print_rate_limit_summary
+from market_data import (
+    DEFAULT_CHUNK_SIZE,
+    download_price_histories,
+    fetch_fundamentals,
+    to_yahoo_ticker,
+)
+from price_store import prefetch_incremental_price_histories, upsert_price_histories
 
 # プロジェクトルートからの.envファイル読み込み
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(env_path)
 
 # 環境変数
-DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_URL = get_database_url()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # OpenAIクライアント初期化
-client = OpenAI(api_key=OPENAI_API_KEY)
+# （429をSDK内でリトライせず、共有のレート制限に反映させる）
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+# AI分析失敗時の推奨理由の接頭辞（この結果は再利用しない）
+ANALYSIS_ERROR_PREFIX = "AI分析中にエラーが発生しました"
 
 # OpenAI API料金（gpt-4o-mini）
 PRICING = {
     "input_per_1m_tokens": 0.150,  # $0.150 / 1M tokens
     "output_per_1m_tokens": 0.600,  # $0.600 / 1M tokens
+    "cached_input_per_1m_tokens": 0.075,  # プロンプトキャッシュに一致した入力
+    "batch_discount": 0.5,  # Batch APIは同期呼び出しの50%
 }
 
 
@@ -49,41 +142,91 @@ class APIUsageTracker:
         self.total_input_tokens = 0
         self.total_output_tokens = 0
         self.total_requests = 0
+        # 入力のうちプロンプトキャッシュに一致した分（同期呼び出しのみ、割引料金で計算）
+        self.cached_input_tokens = 0
+        # うちBatch API経由の分（割引料金で計算）
+        self.batch_input_tokens = 0
+        self.batch_output_tokens = 0
+        self.batch_requests = 0
         self.lock = threading.Lock()
 
-    def add_usage(self, input_tokens: int, output_tokens: int):
-        """使用量を追加"""
+    def add_usage(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        batch: bool = False,
+        cached_tokens: int = 0,
+    ):
+        """
+        使用量を追加
+
+        Args:
+            input_tokens: 入力トークン数（キャッシュに一致した分を含む）
+            output_tokens: 出力トークン数
+            batch: Batch API経由の場合はTrue
+            cached_tokens: 入力のうちプロンプトキャッシュに一致したトークン数
+        """
         with self.lock:
             self.total_input_tokens += input_tokens
             self.total_output_tokens += output_tokens
             self.total_requests += 1
+            if not batch:
+                self.cached_input_tokens += cached_tokens
+            if batch:
+                self.batch_input_tokens += input_tokens
+                self.batch_output_tokens += output_tokens
+                self.batch_requests += 1
+
+    def _calculate_costs(self) -> Tuple[float, float]:
+        """入力・出力の費用を計算（USD、ロック取得済みで呼ぶ）"""
+        discount = PRICING["batch_discount"]
+        input_tokens = (
+            self.total_input_tokens
+            - self.batch_input_tokens * (1 - discount)
+            - self.cached_input_tokens
+        )
+        output_tokens = self.total_output_tokens - self.batch_output_tokens * (
+            1 - discount
+        )
+        input_cost = (input_tokens / 1_000_000) * PRICING["input_per_1m_tokens"] + (
+            self.cached_input_tokens / 1_000_000
+        ) * PRICING["cached_input_per_1m_tokens"]
+        output_cost = (output_tokens / 1_000_000) * PRICING["output_per_1m_tokens"]
+        return input_cost, output_cost
 
     def get_cost(self) -> float:
         """総費用を計算（USD）"""
-        input_cost = (self.total_input_tokens / 1_000_000) * PRICING[
-            "input_per_1m_tokens"
-        ]
-        output_cost = (self.total_output_tokens / 1_000_000) * PRICING[
-            "output_per_1m_tokens"
-        ]
+        with self.lock:
+            input_cost, output_cost = self._calculate_costs()
         return input_cost + output_cost
 
     def print_summary(self):
         """費用サマリーを表示"""
         with self.lock:
-            input_cost = (self.total_input_tokens / 1_000_000) * PRICING[
-                "input_per_1m_tokens"
-            ]
-            output_cost = (self.total_output_tokens / 1_000_000) * PRICING[
-                "output_per_1m_tokens"
-            ]
+            input_cost, output_cost = self._calculate_costs()
             total_cost = input_cost + output_cost
 
             print("\n" + "=" * 50)
             print("💰 OpenAI API使用量サマリー")
             print("=" * 50)
             print(f"🔢 総リクエスト数: {self.total_requests:,}")
+            if self.batch_requests:
+                print(
+                    f"🗂️  うちBatch API: {self.batch_requests:,}件 "
+                    f"({PRICING['batch_discount']:.0%}の料金)"
+                )
             print(f"📥 入力トークン数: {self.total_input_tokens:,} tokens")
+            sync_input_tokens = self.total_input_tokens - self.batch_input_tokens
+            if sync_input_tokens:
+                saved = (self.cached_input_tokens / 1_000_000) * (
+                    PRICING["input_per_1m_tokens"]
+                    - PRICING["cached_input_per_1m_tokens"]
+                )
+                print(
+                    f"💾 うちキャッシュ一致: {self.cached_input_tokens:,} tokens "
+                    f"({self.cached_input_tokens / sync_input_tokens:.1%}、"
+                    f"削減 ${saved:.4f})"
+                )
             print(f"📤 出力トークン数: {self.total_output_tokens:,} tokens")
             print(f"💵 入力費用: ${input_cost:.4f}")
             print(f"💵 出力費用: ${output_cost:.4f}")
@@ -94,32 +237,72 @@ class APIUsageTracker:
 class StockQueue:
     """株式分析キュー管理（スレッドセーフ）"""
 
-    def __init__(self, stocks: List[Dict[str, Any]]):
+    def __init__(
+        self,
+        stocks: List[Dict[str, Any]],
+        admission: Optional[AdmissionController] = None,
+    ):
+        """
+        Args:
+            stocks: 処理順に並べた銘柄データのリスト
+            admission: 制限時間・費用上限による受け付け判定（オプション）
+        """
         self.queue = deque(stocks)
         self.total = len(stocks)
         self.processed = 0
         self.success = 0
         self.failed = 0
+        self.postponed = 0  # 受け付け後に持ち越した銘柄数
+        self.admission = admission
         self.lock = threading.Lock()
 
     def get_next(self) -> Optional[Dict[str, Any]]:
-        """次の銘柄を取得"""
+        """次の銘柄を取得（制限時間・費用上限に達しそうならNone）"""
         with self.lock:
-            if self.queue:
-                return self.queue.popleft()
-            return None
+            if not self.queue:
+                return None
+            if self.admission and not self.admission.admit():
+                return None
+            stock = self.queue.popleft()
+
+        if run_manifest:
+            run_manifest.start(stock["id"])
+        return stock
 
     def mark_success(self):
         """成功をカウント"""
         with self.lock:
             self.processed += 1
             self.success += 1
+        if self.admission:
+            self.admission.finish()
 
     def mark_failure(self):
         """失敗をカウント"""
         with self.lock:
             self.processed += 1
             self.failed += 1
+        if self.admission:
+            self.admission.finish()
+
+    def mark_deferred(self, stock: Dict[str, Any], reason: str):
+        """
+        受け付け後に処理せず次回に持ち越した銘柄を記録
+
+        Args:
+            stock: 銘柄データ
+            reason: 持ち越した理由
+        """
+        with self.lock:
+            self.postponed += 1
+        if run_manifest:
+            run_manifest.defer(stock["id"], reason)
+
+    @property
+    def deferred(self) -> int:
+        """受け付けを止めた・期限を過ぎたため処理しなかった銘柄数"""
+        with self.lock:
+            return len(self.queue) + self.postponed
 
     def get_progress(self) -> str:
         """進捗状況を取得"""
@@ -135,13 +318,101 @@ class StockQueue:
             return len(self.queue) == 0
 
 
+class LeasedStockQueue(StockQueue):
+    """共有のジョブテーブルから銘柄を借りて処理するキュー（--shard、スレッドセーフ）"""
+
+    def __init__(
+        self,
+        lease: WorkLease,
+        admission: Optional[AdmissionController] = None,
+        prefetch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        """
+        Args:
+            lease: ジョブテーブルのリース
+            admission: 制限時間・費用上限による受け付け判定（オプション）
+            prefetch: 借りた銘柄の株価履歴を一括取得するコールバック（オプション）
+        """
+        super().__init__([], admission)
+        self.lease = lease
+        self.prefetch = prefetch
+
+    def get_next(self) -> Optional[Dict[str, Any]]:
+        """
+        手元の銘柄がなくなったら次の数件を借りる（借りた時点で処理中として記録済み）
+
+        prefetch を指定した場合は、借りた数件の株価履歴をまとめて取得してから渡す。
+
+        制限時間・費用上限で受け付けを止めた場合は、リースを閉じる際に
+        実行の残りの銘柄を持ち越しにする（他のシャードも新しい銘柄を借りなくなる）。
+        """
+        with self.lock:
+            if not self.queue:
+                leased = self.lease.acquire()
+                if leased and self.prefetch:
+                    self.prefetch(leased)
+                self.queue.extend(leased)
+                self.total += len(leased)
+            if not self.queue:
+                return None
+            if self.admission and not self.admission.admit():
+                self.lease.defer(self.admission.stop_reason)
+                return None
+            return self.queue.popleft()
+
+
 # グローバルトラッカー
 usage_tracker = APIUsageTracker()
 
+# LLM応答キャッシュ（main()で有効化、Noneの場合は使わない）
+llm_cache: Optional[LLMCache] = None
+
+# 上流障害のサーキットブレーカー（main()で作成、Noneの場合は無効）
+fetch_breaker: Optional[CircuitBreaker] = None
+llm_breaker: Optional[CircuitBreaker] = None
+
+# 実行マニフェスト（main()で作成、Noneの場合は記録しない）
+run_manifest: Optional[RunManifest] = None
+
+# ルールによる事前判定（main()で作成、Noneの場合は全銘柄をAI分析）
+prescorer: Optional[PreScorer] = None
+
+# 全銘柄まとめて計算・逐次更新したテクニカル指標（main()で株価履歴を一括取得した
+# 場合に作成、含まれない銘柄は1銘柄ずつ計算）
+universe_indicators: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def record_stock_failure(stock: Dict[str, Any], error: str):
+    """
+    銘柄の失敗理由を実行マニフェストに記録
+
+    Args:
+        stock: 銘柄データ
+        error: エラー内容
+    """
+    if run_manifest:
+        run_manifest.fail(stock["id"], error)
+
 
 class StockData:
     """株式データクラス"""
 
+    # 数千銘柄分をパイプラインに流すため、属性辞書を持たせない
+    __slots__ = (
+        "ticker",
+        "market",
+        "current_price",
+        "pe_ratio",
+        "pb_ratio",
+        "roe",
+        "dividend_yield",
+        "company_name",
+        "sector",
+        "price_history",
+        "error",
+        "bytes_fetched",
+    )
+
     def __init__(self, ticker: str, market: str):
         self.ticker = ticker
         self.market = market
@@ -152,8 +423,35 @@ class StockData:
         self.dividend_yield: Optional[Decimal] = None
         self.company_name: str = ""
         self.sector: str = ""
-        self.price_history: List[Dict[str, Any]] = []
+        self.price_history = PriceSeries.empty()
         self.error: Optional[str] = None
+        self.bytes_fetched = 0  # 受信データ量の目安（計測用）
+
+
+def apply_fundamentals(stock_data: StockData, info: Dict[str, Any]):
+    """
+    Ticker.infoの内容を株式データに反映
+
+    Args:
+        stock_data: 株式データ
+        info: yfinanceのTicker.info
+    """
+    # 基本情報
+    stock_data.company_name = info.get("longName", stock_data.ticker)
+    stock_data.sector = info.get("sector", "Unknown")
+
+    # 株価データ
+    stock_data.current_price = Decimal(str(info.get("currentPrice", 0)))
+
+    # 財務指標
+    pe = info.get("trailingPE")
+    stock_data.pe_ratio = Decimal(str(pe)) if pe else None
+    pb = info.get("priceToBook")
+    stock_data.pb_ratio = Decimal(str(pb)) if pb else None
+    roe = info.get("returnOnEquity")
+    stock_data.roe = Decimal(str(roe * 100)) if roe else None
+    div_yield = info.get("dividendYield")
+    stock_data.dividend_yield = Decimal(str(div_yield * 100)) if div_yield else None
 
 
 def fetch_stock_data(ticker: str, market: str, max_retries: int = 3) -> StockData:
@@ -171,76 +469,205 @@ def fetch_stock_data(ticker: str, market: str, max_retries: int = 3) -> StockDat
     stock_data = StockData(ticker, market)
 
     # 日本株の場合、.Tサフィックスを追加
-    if market == "JP" and not ticker.endswith(".T"):
-        yahoo_ticker = f"{ticker}.T"
-    else:
-        yahoo_ticker = ticker
+    yahoo_ticker = to_yahoo_ticker(ticker, market)
 
     for attempt in range(max_retries + 1):
         try:
+            # 障害中は復旧まで待機（障害が続いていればCircuitOpenError）
+            if fetch_breaker:
+                fetch_breaker.before_call()
+
             # yfinanceでデータ取得
             stock = yf.Ticker(yahoo_ticker)
+            yahoo_limiter.acquire()
             info = stock.info
-
-            # 基本情報
-            stock_data.company_name = info.get("longName", ticker)
-            stock_data.sector = info.get("sector", "Unknown")
-
-            # 株価データ
-            stock_data.current_price = Decimal(str(info.get("currentPrice", 0)))
-
-            # 財務指標
-            pe = info.get("trailingPE")
-            stock_data.pe_ratio = Decimal(str(pe)) if pe else None
-            pb = info.get("priceToBook")
-            stock_data.pb_ratio = Decimal(str(pb)) if pb else None
-            roe = info.get("returnOnEquity")
-            stock_data.roe = Decimal(str(roe * 100)) if roe else None
-            div_yield = info.get("dividendYield")
-            stock_data.dividend_yield = (
-                Decimal(str(div_yield * 100)) if div_yield else None
-            )
+            stock_data.bytes_fetched += payload_size(info)
+            apply_fundamentals(stock_data, info)
 
             # 過去90日の株価履歴を取得（トレンド分析に必要）
             try:
+                yahoo_limiter.acquire()
                 hist = stock.history(period="3mo")
                 if not hist.empty:
-                    for idx in range(len(hist)):
-                        date = hist.index[idx]
-                        row = hist.iloc[idx]
-                        stock_data.price_history.append(
-                            {
-                                "date": date,  # datetimeオブジェクトのまま保持
-                                "open": float(row["Open"]),
-                                "high": float(row["High"]),
-                                "low": float(row["Low"]),
-                                "close": float(row["Close"]),
-                                "volume": int(row["Volume"]),
-                            }
-                        )
-            except Exception:
-                pass  # 履歴取得失敗は致命的ではないので続行
+                    stock_data.price_history = PriceSeries.from_frame(hist)
+                    stock_data.bytes_fetched += stock_data.price_history.nbytes
+            except Exception as e:
+                # 履歴取得失敗は致命的ではないので続行（429ならレートを下げる）
+                report_error(e, yahoo_limiter)
 
             # 成功したらループを抜ける
-            time.sleep(2)  # 成功後も少し待機
+            yahoo_limiter.on_success()
+            if fetch_breaker:
+                fetch_breaker.record_success()
+            return stock_data
+
+        except CircuitOpenError as e:
+            # 障害が続いているためリトライせずに諦める
+            stock_data.error = f"データ取得中止: {e}"
             return stock_data
 
         except Exception as e:
             error_msg = str(e)
+            if fetch_breaker:
+                fetch_breaker.record_failure()
 
             # リトライ上限到達
             if attempt == max_retries:
                 stock_data.error = f"データ取得失敗: {error_msg}"
                 return stock_data
 
-            # 429エラーなどの場合は長めに待機
-            wait_time = (attempt + 1) * 5  # 5秒, 10秒, 15秒...
+            # 429の場合はレートを下げて共有のバケットで待機、それ以外はバックオフ
+            rate_limited = wait_before_retry(e, attempt, yahoo_limiter)
+            metrics.retry(FETCH)
             print(
                 f"⚠️ {ticker}: データ取得エラー "
-                f"(リトライ {attempt+1}/{max_retries} - "
-                f"{wait_time}秒待機): {error_msg}"
+                f"(リトライ {attempt+1}/{max_retries}"
+                f"{' - レート制限' if rate_limited else ''}): {error_msg}"
             )
-            time.sleep(wait_time)
+
+    return stock_data
+
+
+def prefetch_price_histories(
+    stocks: List[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, PriceSeries]:
+    """
+    対象銘柄の株価履歴（3ヶ月分）を一括取得
+
+    Args:
+        stocks: 銘柄データのリスト
+        chunk_size: 1リクエストあたりの銘柄数
+
+    Returns:
+        Dict: DBのティッカーをキーとした株価履歴
+    """
+    symbol_to_ticker = {
+        to_yahoo_ticker(stock["ticker"], stock["market"]): stock["ticker"]
+        for stock in stocks
+    }
+    histories = download_price_histories(
+        list(symbol_to_ticker.keys()), period="3mo", chunk_size=chunk_size
+    )
+    return {
+        symbol_to_ticker[symbol]: history for symbol, history in histories.items()
+    }
+
+
+def prefetch_stock_histories(
+    conn,
+    stocks: List[Dict[str, Any]],
+    incremental: bool = False,
+    indicator_state: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[Dict[str, PriceSeries], Dict[str, Dict[str, Any]]]:
+    """
+    株価履歴を一括取得し、テクニカル指標を（銘柄×日）の行列でまとめて計算
+
+    Args:
+        conn: データベース接続（差分取得・指標の逐次更新で使う、それ以外はNone可）
+        stocks: 銘柄データのリスト
+        incremental: 保存済みの最新バー以降のみを取得するか
+        indicator_state: 差分取得時、保存済みの計算状態を新しいバーの分だけ進めるか
+        chunk_size: 1リクエストあたりの銘柄数
+
+    Returns:
+        Tuple: (DBのティッカーをキーとした株価履歴, ティッカーをキーとした指標)
+    """
+    if incremental:
+        histories = prefetch_incremental_price_histories(
+            conn, stocks, chunk_size=chunk_size
+        )
+    else:
+        histories = prefetch_price_histories(stocks, chunk_size=chunk_size)
+
+    if not histories:
+        return histories, {}
+    if incremental and indicator_state:
+        return histories, update_indicator_states(conn, stocks, histories)
+    return histories, calculate_universe_indicators(histories)
+
+
+def leased_batch_prefetcher(
+    db_pool: ConnectionPool,
+    price_histories: Dict[str, PriceSeries],
+    indicators: Dict[str, Dict[str, Any]],
+    incremental: bool = False,
+    indicator_state: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Callable[[List[Dict[str, Any]]], None]:
+    """
+    --shard で借りた数件ごとに株価履歴を一括取得するコールバックを作成
+
+    Args:
+        db_pool: コネクションプール
+        price_histories: 取得した株価履歴を追加する辞書（各ステージと共有）
+        indicators: 計算した指標を追加する辞書（universe_indicators と共有）
+        incremental: 保存済みの最新バー以降のみを取得するか
+        indicator_state: 差分取得時、保存済みの計算状態を新しいバーの分だけ進めるか
+        chunk_size: 1リクエストあたりの銘柄数
+
+    Returns:
+        Callable: 借りた銘柄のリストを受け取るコールバック
+    """
+
+    def prefetch(stocks: List[Dict[str, Any]]):
+        # 取得に失敗した銘柄は各ステージで個別取得する
+        # （接続は差分取得・指標の逐次更新の場合のみ使う）
+        try:
+            with db_pool.connection() if incremental else nullcontext() as conn:
+                histories, calculated = prefetch_stock_histories(
+                    conn,
+                    stocks,
+                    incremental=incremental,
+                    indicator_state=indicator_state,
+                    chunk_size=chunk_size,
+                )
+        except Exception as e:
+            print(f"⚠️ 株価履歴の一括取得に失敗（個別取得します）: {e}")
+            return
+        price_histories.update(histories)
+        indicators.update(calculated)
+
+    return prefetch
+
+
+def fetch_stock_fundamentals(
+    ticker: str, market: str, price_history: PriceSeries
+) -> StockData:
+    """
+    一括取得済みの株価履歴に、財務指標（Ticker.info）のみを追加取得して組み合わせる
+
+    Args:
+        ticker: ティッカーシンボル
+        market: 市場（JP/US）
+        price_history: 一括取得済みの株価履歴
+
+    Returns:
+        StockData: 取得した株価データ
+    """
+    stock_data = StockData(ticker, market)
+    stock_data.price_history = price_history
+
+    try:
+        if fetch_breaker:
+            fetch_breaker.before_call()
+        info = fetch_fundamentals(to_yahoo_ticker(ticker, market))
+        if fetch_breaker:
+            fetch_breaker.record_success()
+        stock_data.bytes_fetched += payload_size(info)
+        apply_fundamentals(stock_data, info)
+    except CircuitOpenError as e:
+        stock_data.error = f"データ取得中止: {e}"
+        return stock_data
+    except Exception as e:
+        if fetch_breaker:
+            fetch_breaker.record_failure()
+        stock_data.error = f"データ取得失敗: {e}"
+        return stock_data
+
+    # currentPriceが取れない場合は直近の終値を使用
+    if not stock_data.current_price and len(price_history):
+        stock_data.current_price = Decimal(str(price_history.close[-1]))
 
     return stock_data
 
@@ -358,28 +785,52 @@ def calculate_sector_comparison(
     }
 
 
-def analyze_with_openai(stock_data: StockData, max_retries: int = 2) -> Dict[str, Any]:
+def calculate_stock_trend(stock_data: StockData) -> Optional[Dict[str, Any]]:
     """
-    OpenAI APIで株式分析を実行（リトライあり）
+    株価履歴からトレンド情報を計算（株価履歴が25日以上ある場合のみ）
 
     Args:
         stock_data: 株式データ
-        max_retries: 最大リトライ回数（デフォルト: 2回）
 
     Returns:
-        Dict: AI分析結果
+        Dict: analyze_trend()の戻り値、計算できない場合はNone
     """
-    # トレンド分析セクションを準備（株価履歴が25日以上ある場合のみ）
-    trend_section = ""
-    if len(stock_data.price_history) >= 25:
-        try:
-            # テクニカル指標を計算
-            indicators = calculate_trend_indicators(stock_data.price_history)
+    if len(stock_data.price_history) < 25:
+        return None
+
+    try:
+        # テクニカル指標を計算（一括計算済みならその結果を使う）
+        with metrics.timer(TA):
+            indicators = (universe_indicators or {}).get(stock_data.ticker)
+            if indicators is None:
+                indicators = calculate_trend_indicators(stock_data.price_history)
             trend_info = analyze_trend(indicators)
+        print(f"   📊 トレンド: {trend_info['trend']}, " f"RSI: {trend_info['rsi']}")
+        return trend_info
+    except Exception as e:
+        # トレンド分析失敗時は既存の分析にフォールバック
+        print(f"   ⚠️ トレンド分析エラー（スキップ）: " f"{str(e)[:50]}")
+        return None
+
+
+def build_stock_section(
+    stock_data: StockData, trend_info: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    プロンプトの銘柄ごとの部分（銘柄情報・株価トレンド）を作成
 
-            # プロンプトに追加するトレンド情報
-            currency = "円" if stock_data.market == "JP" else "ドル"
-            trend_section = f"""
+    Args:
+        stock_data: 株式データ
+        trend_info: calculate_stock_trend()の結果（Noneの場合はトレンドなし）
+
+    Returns:
+        str: 【銘柄情報】から始まるテキスト
+    """
+    # プロンプトに追加するトレンド情報
+    trend_section = ""
+    if trend_info:
+        currency = "円" if stock_data.market == "JP" else "ドル"
+        trend_section = f"""
 【株価トレンド分析】
 - トレンド: {trend_info['trend']}
 - 5日移動平均: {trend_info['sma_5']}{currency}
@@ -387,19 +838,8 @@ def analyze_with_openai(stock_data: StockData, max_retries: int = 2) -> Dict[str
 - RSI(14日): {trend_info['rsi']} ({trend_info['rsi_signal']})
 - シグナル: {', '.join(trend_info['signals'])}
 """
-            print(
-                f"   📊 トレンド: {trend_info['trend']}, " f"RSI: {trend_info['rsi']}"
-            )
-        except Exception as e:
-            # トレンド分析失敗時は既存の分析にフォールバック
-            print(f"   ⚠️ トレンド分析エラー（スキップ）: " f"{str(e)[:50]}")
-
-    # プロンプト作成
-    prompt = f"""
-あなたは初心者投資家向けのAI投資アドバイザーです。
-以下の銘柄データを分析し、投資推奨を提供してください。
 
-【銘柄情報】
+    return f"""【銘柄情報】
 - ティッカー: {stock_data.ticker}
 - 企業名: {stock_data.company_name}
 - 市場: {'日本' if stock_data.market == 'JP' else '米国'}
@@ -412,342 +852,1465 @@ def analyze_with_openai(stock_data: StockData, max_retries: int = 2) -> Dict[str
     float(stock_data.dividend_yield) / 100
     if stock_data.dividend_yield else 'N/A'
 }%
-{trend_section}
-以下のJSON形式で回答してください：
-{{
-  "recommendation": "Buy" | "Sell" | "Hold",
-  "confidence_score": 0-100の整数,
-  "reason": "推奨理由を300文字程度で記述。"
-  "財務指標の評価、業績動向、投資判断の根拠を含める。"
-}}
-"""
-
-    # リトライロジック
-    for attempt in range(max_retries + 1):  # 初回 + リトライ2回 = 最大3回
-        try:
-            # OpenAI APIリクエスト
-            sys_msg = (
-                "あなたは初心者投資家向けのAI投資アドバイザーです。"
-                "JSON形式で回答してください。"
-            )
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": sys_msg},
-                    {"role": "user", "content": prompt},
-                ],
-                response_format={"type": "json_object"},
-                timeout=30,
-            )
-
-            # 使用量を追跡
-            if response.usage:
-                usage_tracker.add_usage(
-                    response.usage.prompt_tokens,
-                    response.usage.completion_tokens,
-                )
+{trend_section}"""
 
-            # レスポンス解析
-            content = response.choices[0].message.content
-            result = json.loads(content)
 
-            return result
+def build_group_payload(
+    items: List[Dict[str, Any]], sector_stats: Optional[Dict] = None
+) -> str:
+    """
+    同じセクターの複数銘柄をまとめて分析する場合のユーザーメッセージを作成
 
-        except Exception as e:
-            error_msg = str(e)
+    Args:
+        items: stock_data, trend_info を持つ銘柄のリスト（同じセクター）
+        sector_stats: セクター統計情報（オプション、全銘柄で共通の比較材料として含める）
 
-            # 最後の試行でもエラーの場合
-            if attempt == max_retries:
-                return {
-                    "recommendation": "Hold",
-                    "confidence_score": 0,
-                    "reason": (f"AI分析中にエラーが発生しました: {error_msg}"),
-                }
+    Returns:
+        str: セクター平均と各銘柄の【銘柄情報】を並べたテキスト
+    """
+    sector = items[0]["stock_data"].sector
+    stats = (sector_stats or {}).get(sector)
+    context = ""
+    if stats:
+        labels = (("avg_per", "PER"), ("avg_pbr", "PBR"), ("avg_roe", "ROE"))
+        averages = ", ".join(
+            f"{label}: {stats[key]:.2f}"
+            for key, label in labels
+            if stats.get(key) is not None
+        )
+        if averages:
+            context = f"\n【セクター平均（{stats['count']}銘柄）】\n- {averages}\n"
 
-            # リトライ前に遅延（エクスポネンシャルバックオフ: 1秒、2秒）
-            delay = 2**attempt  # 1秒、2秒
-            time.sleep(delay)
+    sections = "\n".join(
+        build_stock_section(item["stock_data"], item["trend_info"]) for item in items
+    )
+    return f"""以下の{len(items)}銘柄（セクター: {sector}）を銘柄ごとに分析してください。
+{context}
+{sections}"""
 
 
-def save_analysis_to_db(
-    conn,
-    stock_id: str,
-    stock_data: StockData,
-    analysis: Dict[str, Any],
-    sector_comparison: Optional[Dict[str, Any]] = None,
-) -> bool:
+def build_chat_request(
+    stock_data: StockData, trend_info: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
-    分析結果をデータベースに保存（既存データがあれば更新）
+    株式分析のチャットリクエストを作成（同期呼び出し・Batch APIで共通）
+
+    指示文・回答形式は固定のシステムメッセージとし、銘柄ごとのデータは後ろに置く
+    （analysis_prompt参照）。
 
     Args:
-        conn: データベース接続
-        stock_id: 銘柄ID
         stock_data: 株式データ
-        analysis: AI分析結果
-        sector_comparison: セクター比較データ（オプション）
+        trend_info: calculate_stock_trend()の結果（Noneの場合はトレンドなし）
 
     Returns:
-        bool: 保存成功の可否
+        Dict: chat.completions.createの引数
     """
-    try:
-        with conn.cursor() as cur:
-            # UTC時刻を取得（フロントエンドで日本時間に変換）
-            now = datetime.now(timezone.utc)
+    return chat_request(
+        SINGLE_SYSTEM_PROMPT, build_stock_section(stock_data, trend_info)
+    )
 
-            # 既存の分析データを確認
-            cur.execute(
-                """
-                SELECT id FROM analyses WHERE stock_id = %s LIMIT 1
-                """,
-                (stock_id,),
-            )
 
-            existing = cur.fetchone()
-
-            if existing:
-                # 既存データを更新
-                cur.execute(
-                    """
-                    UPDATE analyses SET
-                        analysis_date = %s,
-                        recommendation = %s,
-                        confidence_score = %s,
-                        reason = %s,
-                        current_price = %s,
-                        pe_ratio = %s,
-                        pb_ratio = %s,
-                        roe = %s,
-                        dividend_yield = %s,
-                        sector_comparison = %s,
-                        updated_at = %s
-                    WHERE id = %s
-                """,
-                    (
-                        now,
-                        analysis["recommendation"],
-                        analysis["confidence_score"],
-                        analysis["reason"],
-                        stock_data.current_price,
-                        stock_data.pe_ratio,
-                        stock_data.pb_ratio,
-                        stock_data.roe,
-                        stock_data.dividend_yield,
-                        json.dumps(sector_comparison) if sector_comparison else None,
-                        now,
-                        existing[0],  # タプルなのでインデックスでアクセス
-                    ),
-                )
-            else:
-                # 新規作成
-                analysis_id = str(uuid.uuid4())
-                cur.execute(
-                    """
-                    INSERT INTO analyses (
-                        id,
-                        stock_id,
-                        analysis_date,
-                        recommendation,
-                        confidence_score,
-                        reason,
-                        current_price,
-                        pe_ratio,
-                        pb_ratio,
-                        roe,
-                        dividend_yield,
-                        sector_comparison,
-                        created_at,
-                        updated_at
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s
-                    )
-                """,
-                    (
-                        analysis_id,
-                        stock_id,
-                        now,
-                        analysis["recommendation"],
-                        analysis["confidence_score"],
-                        analysis["reason"],
-                        stock_data.current_price,
-                        stock_data.pe_ratio,
-                        stock_data.pb_ratio,
-                        stock_data.roe,
-                        stock_data.dividend_yield,
-                        json.dumps(sector_comparison) if sector_comparison else None,
-                        now,
-                        now,
-                    ),
-                )
+def build_group_chat_request(
+    items: List[Dict[str, Any]], sector_stats: Optional[Dict] = None
+) -> Dict[str, Any]:
+    """
+    複数銘柄をまとめて分析するチャットリクエストを作成
 
-        conn.commit()
-        return True
+    Args:
+        items: stock_data, trend_info を持つ銘柄のリスト（同じセクター）
+        sector_stats: セクター統計情報（オプション）
 
-    except Exception as e:
-        conn.rollback()
-        print(f"❌ DB保存エラー: {str(e)}")
-        return False
+    Returns:
+        Dict: chat.completions.createの引数
+    """
+    return chat_request(GROUP_SYSTEM_PROMPT, build_group_payload(items, sector_stats))
 
 
-def save_price_history_to_db(conn, stock_id: str, stock_data: StockData) -> bool:
+def analysis_error_result(error_msg: str) -> Dict[str, Any]:
     """
-    株価履歴をデータベースに保存（N+1問題を防ぐため一括処理）
+    AI分析に失敗した場合の分析結果
 
     Args:
-        conn: データベース接続
-        stock_id: 銘柄ID
-        stock_data: 株式データ
+        error_msg: エラー内容
 
     Returns:
-        bool: 保存成功の可否
+        Dict: Hold・信頼度0の分析結果
     """
-    try:
-        if not stock_data.price_history:
-            return True
-
-        with conn.cursor() as cur:
-            # まず該当日付の既存データを削除
-            dates = [p["date"] for p in stock_data.price_history]
-            cur.execute(
-                """
-                DELETE FROM price_history
-                WHERE stock_id = %s AND date = ANY(%s)
-            """,
-                (stock_id, dates),
-            )
+    return {
+        "recommendation": "Hold",
+        "confidence_score": 0,
+        "reason": (f"{ANALYSIS_ERROR_PREFIX}: {error_msg}"),
+    }
 
-            # 一括挿入用のデータを準備
-            values = []
-            for price_data in stock_data.price_history:
-                values.append(
-                    (
-                        str(uuid.uuid4()),  # id
-                        stock_id,
-                        price_data["date"],
-                        price_data["open"],
-                        price_data["high"],
-                        price_data["low"],
-                        price_data["close"],
-                        price_data["volume"],
-                    )
-                )
 
-            # 一括挿入（1クエリ）
-            execute_values_query = """
-                INSERT INTO price_history (
-                    id, stock_id, date, open, high, low, close, volume,
-                    created_at, updated_at
-                ) VALUES %s
-            """
-            from psycopg2.extras import execute_values
+def cached_analysis(cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    LLM応答キャッシュから分析結果を取得
 
-            execute_values(
-                cur,
-                execute_values_query,
-                values,
-                template="(%s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())",
-            )
+    Args:
+        cache_key: request_fingerprint()のキー
 
-        conn.commit()
-        return True
+    Returns:
+        Dict: キャッシュ済みの分析結果（キャッシュ無効・未保存の場合はNone）
+    """
+    if llm_cache is None:
+        return None
 
-    except Exception as e:
-        conn.rollback()
-        print(f"❌ DB保存エラー: {str(e)}")
-        return False
+    content = llm_cache.get(cache_key)
+    if content is None:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
 
 
-def process_single_stock(
-    stock: Dict[str, Any], force: bool = False, sector_stats: Optional[Dict] = None
-) -> bool:
+def cache_response(cache_key: str, content: str, usage: Optional[Any]):
     """
-    単一銘柄を処理
+    解析できたOpenAIの応答をLLM応答キャッシュに保存
 
     Args:
-        stock: 銘柄データ
-        force: 既存データを無視して強制的に再実行
-        sector_stats: セクター統計情報（オプション）
-
-    Returns:
-        bool: 処理が成功したかどうか
+        cache_key: request_fingerprint()のキー
+        content: 応答本文
+        usage: トークン使用量（prompt_tokens / completion_tokens）
     """
-    conn = None
-    ticker = stock["ticker"]
+    if llm_cache is None:
+        return
 
-    try:
-        # データベース接続
-        conn = psycopg2.connect(DATABASE_URL)
-
-        # 今日の日付を取得（日本時間、日付のみ）
-        today = datetime.now(ZoneInfo("Asia/Tokyo")).date()
-
-        # forceフラグがfalseの場合のみ、
-        # 今日の分析データが既に存在するかチェック
-        if not force:
-            with conn.cursor() as cur:
-                # analysisDateはUTC保存なので、
-                # 日本時間に変換して日付比較
-                cur.execute(
-                    """
-                    SELECT id FROM analyses
-                    WHERE stock_id = %s
-                    AND DATE(
-                        analysis_date AT TIME ZONE 'Asia/Tokyo'
-                    ) = %s
-                    """,
-                    (stock["id"], today),
-                )
-                existing_today = cur.fetchone()
+    if isinstance(usage, dict):
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+    else:
+        input_tokens = usage.prompt_tokens if usage else 0
+        output_tokens = usage.completion_tokens if usage else 0
+    llm_cache.put(cache_key, content, input_tokens, output_tokens)
 
-            if existing_today:
-                print(f"⏭️  {ticker}: 本日分の分析済み（スキップ）")
-                return True
 
-        if force:
-            print(f"🔄 {ticker}: 強制再実行モード - 処理開始...")
-        else:
-            print(f"🔄 {ticker}: 処理開始...")
+def cached_prompt_tokens(usage: Optional[Any]) -> int:
+    """
+    入力トークンのうちプロンプトキャッシュに一致した数
 
-        # 株価データ取得
-        stock_data = fetch_stock_data(ticker, stock["market"])
+    Args:
+        usage: トークン使用量（応答のusage、またはBatch APIの結果の辞書）
 
-        # DBから取得したsectorを使用（yfinanceのsectorは英語なので使わない）
-        if stock.get("sector"):
-            stock_data.sector = stock["sector"]
+    Returns:
+        int: usage.prompt_tokens_details.cached_tokens（含まれない場合は0）
+    """
+    if isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details") or {}
+        return details.get("cached_tokens") or 0
 
-        if stock_data.error or stock_data.current_price == 0:
-            print(f"⚠️  {ticker}: データ取得失敗")
-            return False
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
 
-        # AI分析実行
-        analysis = analyze_with_openai(stock_data)
 
-        # セクター比較を計算
-        sector_comparison = None
-        if sector_stats and stock_data.sector in sector_stats:
-            sector_comparison = calculate_sector_comparison(
-                stock_data, sector_stats[stock_data.sector]
-            )
+def analyze_with_openai(
+    stock_data: StockData,
+    trend_info: Optional[Dict[str, Any]] = None,
+    max_retries: int = 2,
+) -> Dict[str, Any]:
+    """
+    OpenAI APIで株式分析を実行（リトライあり）
 
-        # データベースに保存
-        if save_analysis_to_db(conn, stock["id"], stock_data, analysis, sector_comparison):
-            # 株価履歴も保存
-            save_price_history_to_db(conn, stock["id"], stock_data)
+    Args:
+        stock_data: 株式データ
+        trend_info: calculate_stock_trend()の結果（Noneの場合はトレンドなし）
+        max_retries: 最大リトライ回数（デフォルト: 2回）
+
+    Returns:
+        Dict: AI分析結果
+
+    Raises:
+        CircuitOpenError: OpenAIの障害が続いていて呼び出しを中止した場合
+    """
+    request = build_chat_request(stock_data, trend_info)
+
+    # 同じ入力の応答がキャッシュにあれば再利用
+    cache_key = request_fingerprint(request)
+    cached = cached_analysis(cache_key)
+    if cached is not None:
+        return cached
+
+    # リトライロジック
+    for attempt in range(max_retries + 1):  # 初回 + リトライ2回 = 最大3回
+        answered = False
+        try:
+            # 障害中は復旧まで待機（障害が続いていればCircuitOpenError）
+            if llm_breaker:
+                llm_breaker.before_call()
+
+            # OpenAI APIリクエスト（リクエスト数・トークン数の枠を確保してから）
+            estimated_tokens = acquire_openai(request)
+            with metrics.timer(LLM) as amounts:
+                response = client.chat.completions.create(**request, timeout=30)
+                if response.usage:
+                    amounts["input_tokens"] = response.usage.prompt_tokens
+                    amounts["output_tokens"] = response.usage.completion_tokens
+                    amounts["cached_tokens"] = cached_prompt_tokens(response.usage)
+            settle_openai(estimated_tokens, response.usage)
+            # 上流は応答したので成功として数える（応答の解析エラーは障害に数えない）
+            answered = True
+            if llm_breaker:
+                llm_breaker.record_success()
+
+            # 使用量を追跡
+            if response.usage:
+                usage_tracker.add_usage(
+                    response.usage.prompt_tokens,
+                    response.usage.completion_tokens,
+                    cached_tokens=cached_prompt_tokens(response.usage),
+                )
+
+            # レスポンス解析
+            content = response.choices[0].message.content
+            result = json.loads(content)
+
+            cache_response(cache_key, content, response.usage)
+            return result
+
+        except CircuitOpenError:
+            # 障害中のエラー結果は保存せず、銘柄の失敗として扱う
+            raise
+
+        except Exception as e:
+            error_msg = str(e)
+            if llm_breaker and not answered:
+                llm_breaker.record_failure()
+
+            # 429の場合はレートを下げる（待機は次のacquire_openai()で行う）
+            rate_limited = report_openai_error(e)
+
+            # 最後の試行でもエラーの場合
+            if attempt == max_retries:
+                return analysis_error_result(error_msg)
+            metrics.retry(LLM)
+
+            # 429以外（5xx・タイムアウトなど）はバックオフしてから再試行
+            if not rate_limited:
+                time.sleep(backoff_seconds(attempt))
+
+
+def analyze_group_with_openai(
+    items: List[Dict[str, Any]], sector_stats: Optional[Dict] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    同じセクターの複数銘柄を1回のOpenAI API呼び出しでまとめて分析
+
+    キャッシュ済みの銘柄は呼び出しに含めない。応答に含まれない・形式が不正な銘柄や、
+    呼び出し自体が失敗した場合の銘柄は結果に含めない（呼び出し側で1銘柄ずつ分析する）。
+
+    Args:
+        items: stock, stock_data, trend_info を持つ銘柄のリスト（同じセクター）
+        sector_stats: セクター統計情報（オプション）
+
+    Returns:
+        Dict: 銘柄IDをキーとした分析結果
+
+    Raises:
+        CircuitOpenError: OpenAIの障害が続いていて呼び出しを中止した場合
+    """
+    analyses: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for item in items:
+        # 1銘柄ずつ分析した応答も、まとめて分析した応答も再利用する
+        request = build_chat_request(item["stock_data"], item["trend_info"])
+        item["cache_key"] = request_fingerprint(request, variant=GROUP_CACHE_VARIANT)
+        cached = cached_analysis(request_fingerprint(request))
+        if cached is None:
+            cached = cached_analysis(item["cache_key"])
+        if cached is not None:
+            analyses[item["stock"]["id"]] = cached
+        else:
+            pending.append(item)
+    if not pending:
+        return analyses
+
+    request = build_group_chat_request(pending, sector_stats)
+    tickers = [item["stock"]["ticker"] for item in pending]
+
+    # 障害中は復旧まで待機（障害が続いていればCircuitOpenError）
+    if llm_breaker:
+        llm_breaker.before_call()
+
+    estimated_tokens = acquire_openai(request)
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            **request, timeout=group_request_timeout(len(pending))
+        )
+    except Exception as e:
+        metrics.observe(LLM, time.perf_counter() - started, error=True)
+        if llm_breaker:
+            llm_breaker.record_failure()
+        report_openai_error(e)
+        print(f"⚠️ まとめて分析エラー ({', '.join(tickers)}): {str(e)[:50]}")
+        return analyses
+    elapsed = time.perf_counter() - started
+
+    settle_openai(estimated_tokens, response.usage)
+    if llm_breaker:
+        llm_breaker.record_success()
+
+    # トークン数・処理時間は1銘柄あたりでも記録する（まとめる銘柄数の調整用）
+    count = len(pending)
+    input_tokens = response.usage.prompt_tokens if response.usage else 0
+    output_tokens = response.usage.completion_tokens if response.usage else 0
+    cached_tokens = cached_prompt_tokens(response.usage)
+    if response.usage:
+        usage_tracker.add_usage(
+            input_tokens, output_tokens, cached_tokens=cached_tokens
+        )
+    metrics.observe(
+        LLM,
+        elapsed,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_tokens=cached_tokens,
+        tickers=count,
+        input_tokens_per_ticker=input_tokens / count,
+        output_tokens_per_ticker=output_tokens / count,
+        seconds_per_ticker=elapsed / count,
+    )
+
+    results = parse_group_response(response.choices[0].message.content, tickers)
+    if len(results) < count:
+        print(
+            f"⚠️ まとめて分析の結果が不足 ({len(results)}/{count}銘柄) "
+            "- 不足分は1銘柄ずつ分析します"
+        )
+
+    # 1銘柄分のリクエストにまとめて分析の区別を付けたキーでキャッシュする（トークン数は等分）
+    usage_share = {
+        "prompt_tokens": input_tokens // count,
+        "completion_tokens": output_tokens // count,
+    }
+    for item in pending:
+        analysis = results.get(item["stock"]["ticker"])
+        if analysis is None:
+            continue
+        analyses[item["stock"]["id"]] = analysis
+        cache_response(
+            item["cache_key"], json.dumps(analysis, ensure_ascii=False), usage_share
+        )
+
+    return analyses
+
+
+def analyze_stock(
+    stock: Dict[str, Any],
+    stock_data: StockData,
+    trend_info: Optional[Dict[str, Any]] = None,
+    gate: Optional[MaterialityGate] = None,
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    前回から変化が小さければ前回の分析を再利用し、ルールで判定できればその結果を使い、
+    どちらでもなければAI分析を実行
+
+    Args:
+        stock: 銘柄データ
+        stock_data: 株式データ
+        trend_info: calculate_stock_trend()の結果（Noneの場合はトレンドなし）
+        gate: AI再分析ゲート（Noneの場合は常にAI分析）
+
+    Returns:
+        Tuple: (分析結果, 再利用した前回の分析ID。AI分析した場合はNone)
+    """
+    previous = reusable_analysis(stock, stock_data, trend_info, gate)
+    if previous is not None:
+        return previous_analysis_result(previous), previous["id"]
+
+    analysis = rule_based_analysis(stock, stock_data, trend_info)
+    if analysis is not None:
+        return analysis, None
+
+    return analyze_with_openai(stock_data, trend_info), None
+
+
+def reusable_analysis(
+    stock: Dict[str, Any],
+    stock_data: StockData,
+    trend_info: Optional[Dict[str, Any]],
+    gate: Optional[MaterialityGate],
+) -> Optional[Dict[str, Any]]:
+    """
+    再利用できる前回の分析データを取得
+
+    Args:
+        stock: 銘柄データ
+        stock_data: 株式データ
+        trend_info: calculate_stock_trend()の結果
+        gate: AI再分析ゲート
+
+    Returns:
+        Dict: 前回の分析データ（再分析が必要な場合・ゲート無効時はNone）
+    """
+    if gate is None:
+        return None
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    previous = gate.check(
+        stock["id"],
+        {
+            "current_price": stock_data.current_price,
+            "pe_ratio": stock_data.pe_ratio,
+            "pb_ratio": stock_data.pb_ratio,
+            "roe": stock_data.roe,
+            "technical_indicators": trend_info,
+        },
+        now,
+    )
+    if previous is not None:
+        print(
+            f"♻️  {stock['ticker']}: 変化が小さいため前回の分析を再利用 "
+            f"({previous['recommendation']})"
+        )
+    return previous
+
+
+def rule_based_analysis(
+    stock: Dict[str, Any],
+    stock_data: StockData,
+    trend_info: Optional[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """
+    ルールによる事前判定で済む銘柄の分析結果を取得
+
+    Args:
+        stock: 銘柄データ
+        stock_data: 株式データ
+        trend_info: calculate_stock_trend()の結果
+
+    Returns:
+        Dict: ルールによる分析結果（AI分析が必要な場合・事前判定が無効な場合はNone）
+    """
+    if prescorer is None:
+        return None
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    item = {"stock": stock, "stock_data": stock_data, "trend_info": trend_info}
+    analysis = prescorer.triage([item], now)[0]
+    if analysis is not None:
+        print(
+            f"📐 {stock['ticker']}: ルールで判定 "
+            f"({analysis['recommendation']} {analysis['confidence_score']}%)"
+        )
+    return analysis
+
+
+def previous_analysis_result(previous: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    前回の分析データを分析結果の形式に変換
+
+    Args:
+        previous: load_previous_analyses()の分析データ
+
+    Returns:
+        Dict: AI分析結果と同じ形式の辞書
+    """
+    return {
+        "recommendation": previous["recommendation"],
+        "confidence_score": previous["confidence_score"],
+        "reason": previous["reason"],
+    }
+
+
+def load_previous_analyses(conn, stock_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    銘柄ごとの最新の分析データを一括取得（AI再分析ゲート用、1クエリ）
+
+    AI分析に失敗した結果は再利用しないので含めない。
+
+    Args:
+        conn: データベース接続
+        stock_ids: 対象の銘柄IDのリスト
+
+    Returns:
+        Dict: 銘柄IDをキーとした分析データ
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT DISTINCT ON (stock_id)
+                id,
+                stock_id,
+                recommendation,
+                confidence_score,
+                reason,
+                current_price,
+                pe_ratio,
+                pb_ratio,
+                roe,
+                technical_indicators,
+                COALESCE(llm_analyzed_at, analysis_date) AS llm_analyzed_at
+            FROM analyses
+            WHERE stock_id = ANY(%s)
+            ORDER BY stock_id, analysis_date DESC
+            """,
+            (stock_ids,),
+        )
+        rows = cur.fetchall()
+    conn.commit()
+
+    return {
+        row["stock_id"]: dict(row)
+        for row in rows
+        if not row["reason"].startswith(ANALYSIS_ERROR_PREFIX)
+    }
+
+
+def load_analysis_requests(conn, stock_ids: List[str]) -> Dict[str, datetime]:
+    """
+    ユーザーから分析をリクエストされた銘柄を一括取得（ルールによる事前判定用、1クエリ）
+
+    Args:
+        conn: データベース接続
+        stock_ids: 対象の銘柄IDのリスト
+
+    Returns:
+        Dict: 銘柄IDをキーとしたリクエストの最終更新日時（タイムゾーンなしのUTC）
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT stock_id, updated_at
+            FROM analysis_requests
+            WHERE stock_id = ANY(%s) AND request_count > 0
+            """,
+            (stock_ids,),
+        )
+        rows = cur.fetchall()
+    conn.commit()
+
+    return dict(rows)
+
+
+def load_schedule_inputs(conn, stock_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    優先度の計算に使う値を銘柄ごとに一括取得（1クエリ）
+
+    ボラティリティは保存済みの直近21本の終値から計算した日次リターンの標準偏差。
+
+    Args:
+        conn: データベース接続
+        stock_ids: 対象の銘柄IDのリスト
+
+    Returns:
+        Dict: 銘柄IDをキーとした request_count, last_analyzed_at, volatility
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT
+                s.id AS stock_id,
+                COALESCE(ar.request_count, 0) AS request_count,
+                la.last_analyzed_at,
+                vol.volatility
+            FROM stocks s
+            LEFT JOIN analysis_requests ar ON ar.stock_id = s.id
+            LEFT JOIN (
+                SELECT stock_id, MAX(analysis_date) AS last_analyzed_at
+                FROM analyses
+                WHERE stock_id = ANY(%s)
+                GROUP BY stock_id
+            ) la ON la.stock_id = s.id
+            LEFT JOIN LATERAL (
+                SELECT STDDEV_SAMP(daily_return) AS volatility
+                FROM (
+                    SELECT close / NULLIF(LAG(close) OVER (ORDER BY date), 0) - 1
+                        AS daily_return
+                    FROM (
+                        SELECT date, close FROM price_history
+                        WHERE stock_id = s.id
+                        ORDER BY date DESC
+                        LIMIT 21
+                    ) recent
+                ) returns
+            ) vol ON true
+            WHERE s.id = ANY(%s)
+            """,
+            (stock_ids, stock_ids),
+        )
+        rows = cur.fetchall()
+    conn.commit()
+
+    return {row["stock_id"]: dict(row) for row in rows}
+
+
+def upsert_analyses(conn, items: List[Dict[str, Any]]):
+    """
+    分析結果をまとめて保存（既存データがあれば更新、コミットは呼び出し側）
+
+    analysesは銘柄ごとに履歴を持つためstock_idには一意制約がない。
+    銘柄ごとの最新行のIDを1クエリで引き当て、主キーへの
+    INSERT ... ON CONFLICT (id) DO UPDATE で更新と新規作成を1文にまとめる。
+    前回の分析を再利用した銘柄は、分析時の株価・指標を残したまま分析日時のみ更新する
+    （次回も前回AI分析した時点の値と比較するため）。
+
+    Args:
+        conn: データベース接続
+        items: 保存対象（stock_id, stock_data, analysis, sector_comparison,
+            technical_indicators, reuse_id, analyzed_at を持つ辞書）のリスト
+    """
+    from psycopg2.extras import execute_values
+
+    # 同じ銘柄が複数あれば後のものを優先（ON CONFLICTは同じ行を2回更新できない）
+    latest_items = {item["stock_id"]: item for item in items}
+    reused_items = [item for item in latest_items.values() if item.get("reuse_id")]
+    analyzed_items = {
+        stock_id: item
+        for stock_id, item in latest_items.items()
+        if not item.get("reuse_id")
+    }
+
+    with conn.cursor() as cur:
+        if reused_items:
+            execute_values(
+                cur,
+                """
+                UPDATE analyses SET
+                    analysis_date = v.analyzed_at,
+                    updated_at = v.analyzed_at
+                FROM (VALUES %s) AS v(id, analyzed_at)
+                WHERE analyses.id = v.id
+                """,
+                [(item["reuse_id"], item["analyzed_at"]) for item in reused_items],
+            )
+
+        if not analyzed_items:
+            return
+
+        # 銘柄ごとの最新の分析データのIDを一括取得
+        cur.execute(
+            """
+            SELECT DISTINCT ON (stock_id) stock_id, id
+            FROM analyses
+            WHERE stock_id = ANY(%s)
+            ORDER BY stock_id, analysis_date DESC
+            """,
+            (list(analyzed_items),),
+        )
+        existing_ids = dict(cur.fetchall())
+
+        values = []
+        for stock_id, item in analyzed_items.items():
+            stock_data = item["stock_data"]
+            analysis = item["analysis"]
+            sector_comparison = item.get("sector_comparison")
+            technical_indicators = item.get("technical_indicators")
+            # UTC時刻（フロントエンドで日本時間に変換）
+            analyzed_at = item["analyzed_at"]
+            values.append(
+                (
+                    existing_ids.get(stock_id) or str(uuid.uuid4()),
+                    stock_id,
+                    analyzed_at,
+                    analysis["recommendation"],
+                    analysis["confidence_score"],
+                    analysis["reason"],
+                    stock_data.current_price,
+                    stock_data.pe_ratio,
+                    stock_data.pb_ratio,
+                    stock_data.roe,
+                    stock_data.dividend_yield,
+                    json.dumps(sector_comparison) if sector_comparison else None,
+                    json.dumps(technical_indicators) if technical_indicators else None,
+                    # ルールで判定した場合は前回のAI分析日時を引き継ぐ
+                    analysis.get("llm_analyzed_at") or analyzed_at,
+                    analyzed_at,
+                    analyzed_at,
+                )
+            )
+
+        execute_values(
+            cur,
+            """
+            INSERT INTO analyses (
+                id,
+                stock_id,
+                analysis_date,
+                recommendation,
+                confidence_score,
+                reason,
+                current_price,
+                pe_ratio,
+                pb_ratio,
+                roe,
+                dividend_yield,
+                sector_comparison,
+                technical_indicators,
+                llm_analyzed_at,
+                created_at,
+                updated_at
+            ) VALUES %s
+            ON CONFLICT (id) DO UPDATE SET
+                analysis_date = EXCLUDED.analysis_date,
+                recommendation = EXCLUDED.recommendation,
+                confidence_score = EXCLUDED.confidence_score,
+                reason = EXCLUDED.reason,
+                current_price = EXCLUDED.current_price,
+                pe_ratio = EXCLUDED.pe_ratio,
+                pb_ratio = EXCLUDED.pb_ratio,
+                roe = EXCLUDED.roe,
+                dividend_yield = EXCLUDED.dividend_yield,
+                sector_comparison = EXCLUDED.sector_comparison,
+                technical_indicators = EXCLUDED.technical_indicators,
+                llm_analyzed_at = EXCLUDED.llm_analyzed_at,
+                updated_at = EXCLUDED.updated_at
+            """,
+            values,
+        )
+
+
+def write_stock_results(conn, items: List[Dict[str, Any]]):
+    """
+    分析結果と株価履歴をまとめて書き込む（BatchWriterの書き込み関数）
+
+    Args:
+        conn: データベース接続
+        items: save_stock_results() が書き込みバッファに追加した保存対象
+    """
+    with metrics.timer(DB_ANALYSES) as amounts:
+        amounts["rows"] = len(items)
+        upsert_analyses(conn, items)
+    with metrics.timer(DB_PRICE_HISTORY) as amounts:
+        amounts["rows"] = sum(
+            len(item["stock_data"].price_history) for item in items
+        )
+        upsert_price_histories(
+            conn,
+            [(item["stock_id"], item["stock_data"].price_history) for item in items],
+        )
+
+
+def fetch_analyzed_today_stock_ids(conn, stock_ids: List[str]) -> Set[str]:
+    """
+    本日（日本時間）の分析データが既に存在する銘柄IDを一括取得（1クエリ）
+
+    analysis_dateはUTC保存なので、日本時間の当日0時〜翌日0時をUTCに変換した
+    範囲で検索する（列を関数で包まないのでanalysis_dateのインデックスが効く）。
+
+    Args:
+        conn: データベース接続
+        stock_ids: 対象の銘柄IDのリスト
+
+    Returns:
+        Set[str]: 本日分の分析済みの銘柄ID
+    """
+    jst = ZoneInfo("Asia/Tokyo")
+    today_start = datetime.now(jst).replace(hour=0, minute=0, second=0, microsecond=0)
+    tomorrow_start = today_start + timedelta(days=1)
+
+    # タイムゾーンなしのUTC日時に変換（analysis_dateの保存形式）
+    range_start = today_start.astimezone(timezone.utc).replace(tzinfo=None)
+    range_end = tomorrow_start.astimezone(timezone.utc).replace(tzinfo=None)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT DISTINCT stock_id FROM analyses
+            WHERE analysis_date >= %s
+              AND analysis_date < %s
+              AND stock_id = ANY(%s)
+            """,
+            (range_start, range_end, stock_ids),
+        )
+        analyzed = {row[0] for row in cur.fetchall()}
+    conn.commit()
+
+    return analyzed
+
+
+def save_stock_results(
+    writer: BatchWriter,
+    stock: Dict[str, Any],
+    stock_data: StockData,
+    analysis: Dict[str, Any],
+    sector_stats: Optional[Dict] = None,
+    on_saved: Optional[Callable[[bool], None]] = None,
+    trend_info: Optional[Dict[str, Any]] = None,
+    reuse_id: Optional[str] = None,
+):
+    """
+    セクター比較を計算し、分析結果と株価履歴を書き込みバッファに追加
+
+    実際の書き込みはバッファがたまった時点（または一定時間ごと）にまとめて行われ、
+    結果はon_savedで通知される。
+
+    Args:
+        writer: 書き込みバッファ
+        stock: 銘柄データ
+        stock_data: 株式データ
+        analysis: AI分析結果
+        sector_stats: セクター統計情報（オプション）
+        on_saved: 保存の成否(bool)を受け取るコールバック
+        trend_info: calculate_stock_trend()の結果（次回のAI再分析ゲートで比較）
+        reuse_id: 前回の分析を再利用した場合はその分析ID
+    """
+    ticker = stock["ticker"]
+
+    # セクター比較を計算
+    sector_comparison = None
+    if sector_stats and stock_data.sector in sector_stats:
+        sector_comparison = calculate_sector_comparison(
+            stock_data, sector_stats[stock_data.sector]
+        )
+
+    def report(saved: bool):
+        if saved:
             print(
                 f"✅ {ticker}: {analysis['recommendation']} "
                 f"({analysis['confidence_score']}%) 完了"
             )
-            return True
+            if run_manifest:
+                run_manifest.succeed(stock["id"])
+        else:
+            print(f"❌ {ticker}: DB保存失敗")
+            record_stock_failure(stock, "DB保存失敗")
+        if on_saved:
+            on_saved(saved)
+
+    writer.add(
+        {
+            "stock_id": stock["id"],
+            "stock_data": stock_data,
+            "analysis": analysis,
+            "sector_comparison": sector_comparison,
+            "technical_indicators": trend_info,
+            "reuse_id": reuse_id,
+            "analyzed_at": datetime.now(timezone.utc),
+        },
+        report,
+    )
+
+
+def fetch_stock_for_analysis(
+    stock: Dict[str, Any],
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+) -> Optional[StockData]:
+    """
+    分析用に株価データを取得（DBのセクターで上書き）
+
+    Args:
+        stock: 銘柄データ
+        price_histories: 一括取得済みの株価履歴（含まれない銘柄は個別取得）
+
+    Returns:
+        StockData: 取得した株価データ、取得失敗時はNone
+    """
+    ticker = stock["ticker"]
+
+    # 株価データ取得（一括取得済みなら財務指標のみ追加取得）
+    started = time.perf_counter()
+    if price_histories and ticker in price_histories:
+        stock_data = fetch_stock_fundamentals(
+            ticker, stock["market"], price_histories[ticker]
+        )
+    else:
+        stock_data = fetch_stock_data(ticker, stock["market"])
+    metrics.observe(
+        FETCH,
+        time.perf_counter() - started,
+        error=stock_data.error is not None,
+        bytes=stock_data.bytes_fetched,
+    )
+
+    # DBから取得したsectorを使用（yfinanceのsectorは英語なので使わない）
+    if stock.get("sector"):
+        stock_data.sector = stock["sector"]
+
+    if stock_data.error or stock_data.current_price == 0:
+        print(f"⚠️  {ticker}: データ取得失敗")
+        record_stock_failure(stock, stock_data.error or "株価を取得できませんでした")
+        return None
+
+    return stock_data
+
+
+def process_single_stock(
+    stock: Dict[str, Any],
+    writer: BatchWriter,
+    force: bool = False,
+    sector_stats: Optional[Dict] = None,
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+    on_saved: Optional[Callable[[bool], None]] = None,
+    gate: Optional[MaterialityGate] = None,
+) -> bool:
+    """
+    単一銘柄を処理
+
+    本日分の分析済み銘柄の除外は、呼び出し前に
+    fetch_analyzed_today_stock_ids() で一括して行う。
+
+    Args:
+        stock: 銘柄データ
+        writer: 書き込みバッファ
+        force: 強制再実行モードかどうか（ログ表示用）
+        sector_stats: セクター統計情報（オプション）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        on_saved: 保存の成否(bool)を受け取るコールバック
+        gate: AI再分析ゲート（オプション）
+
+    Returns:
+        bool: 書き込みバッファへの追加まで進んだか（保存の成否はon_savedで通知）
+    """
+    ticker = stock["ticker"]
+
+    try:
+        if force:
+            print(f"🔄 {ticker}: 強制再実行モード - 処理開始...")
+        else:
+            print(f"🔄 {ticker}: 処理開始...")
+
+        # 株価データ取得
+        stock_data = fetch_stock_for_analysis(stock, price_histories)
+        if stock_data is None:
+            return False
+
+        # トレンド分析 → AI分析実行（変化が小さければ前回の分析を再利用）
+        trend_info = calculate_stock_trend(stock_data)
+        analysis, reuse_id = analyze_stock(stock, stock_data, trend_info, gate)
+
+        save_stock_results(
+            writer,
+            stock,
+            stock_data,
+            analysis,
+            sector_stats,
+            on_saved=on_saved,
+            trend_info=trend_info,
+            reuse_id=reuse_id,
+        )
+        return True
+
+    except Exception as e:
+        print(f"❌ {ticker}: エラー - {str(e)[:50]}")
+        record_stock_failure(stock, str(e))
+        return False
+
+
+def progress_recorder(stock_queue: StockQueue) -> Callable[[bool], None]:
+    """
+    保存の成否をキューに記録して進捗を表示するコールバックを作成
+
+    Args:
+        stock_queue: 銘柄キュー
+
+    Returns:
+        Callable: 成否(bool)を受け取るコールバック
+    """
+
+    def record(saved: bool):
+        if saved:
+            stock_queue.mark_success()
+        else:
+            stock_queue.mark_failure()
+        print(f"📈 {stock_queue.get_progress()}")
+
+    return record
+
+
+def prepare_stages(
+    force: bool,
+    price_histories: Optional[Dict[str, PriceSeries]],
+    record: Callable[[bool], None],
+    fetch_workers: int = 2,
+    ta_workers: int = 1,
+) -> List[Stage]:
+    """
+    取得 → テクニカル分析 のパイプラインステージを作成
+
+    出力は {"stock", "stock_data", "trend_info"} の辞書。
+    取得に失敗した銘柄はrecordに失敗として通知してここで打ち切る。
+
+    Args:
+        force: 強制再実行モードかどうか（ログ表示用）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        record: 成否(bool)を受け取るコールバック
+        fetch_workers: 取得ステージの同時実行数
+        ta_workers: テクニカル分析ステージの同時実行数
+
+    Returns:
+        List[Stage]: パイプラインの先頭に並べるステージ
+    """
+
+    def fetch(stock: Dict[str, Any], state) -> Optional[Dict]:
+        ticker = stock["ticker"]
+
+        if force:
+            print(f"🔄 {ticker}: 強制再実行モード - 処理開始...")
+        else:
+            print(f"🔄 {ticker}: 処理開始...")
+        stock_data = fetch_stock_for_analysis(stock, price_histories)
+        if stock_data is None:
+            record(False)
+            return None
+
+        return {"stock": stock, "stock_data": stock_data}
+
+    def indicators(item: Dict[str, Any], state) -> Dict[str, Any]:
+        item["trend_info"] = calculate_stock_trend(item["stock_data"])
+        return item
+
+    return [
+        Stage("fetch", fetch, workers=fetch_workers),
+        Stage("indicators", indicators, workers=ta_workers),
+    ]
+
+
+def stage_error_reporter(
+    record: Callable[[bool], None],
+) -> Callable[[Any, str, Exception], None]:
+    """
+    パイプラインのステージで発生した例外を失敗として記録するコールバックを作成
+
+    Args:
+        record: 成否(bool)を受け取るコールバック
+
+    Returns:
+        Callable: Pipelineのon_errorに渡すコールバック
+    """
+
+    def on_error(item: Any, stage_name: str, error: Exception):
+        # まとめて分析するステージのアイテムは銘柄のリスト
+        for member in item if isinstance(item, list) else [item]:
+            stock = member["stock"] if "stock" in member else member
+            print(f"❌ {stock['ticker']}: {stage_name}エラー - {str(error)[:50]}")
+            record_stock_failure(stock, f"{stage_name}: {error}")
+            record(False)
+
+    return on_error
+
+
+def run_sequential(
+    stocks: List[Dict[str, Any]],
+    writer: BatchWriter,
+    force: bool = False,
+    sector_stats: Optional[Dict] = None,
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+    gate: Optional[MaterialityGate] = None,
+    admission: Optional[AdmissionController] = None,
+    stock_queue: Optional[StockQueue] = None,
+) -> StockQueue:
+    """
+    銘柄を1件ずつ順番に処理
+
+    Args:
+        stocks: 処理対象の銘柄リスト
+        writer: 書き込みバッファ
+        force: 強制再実行モードかどうか（ログ表示用）
+        sector_stats: セクター統計情報（オプション）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        gate: AI再分析ゲート（オプション）
+        admission: 制限時間・費用上限による受け付け判定（オプション）
+        stock_queue: 処理に使うキュー（省略時はstocksから作成）
+
+    Returns:
+        StockQueue: 処理後のキュー（書き込みバッファを閉じた時点で成功数・失敗数が確定）
+    """
+    if stock_queue is None:
+        stock_queue = StockQueue(stocks, admission)
+    record = progress_recorder(stock_queue)
+
+    for i, stock in enumerate(iter(stock_queue.get_next, None)):
+        print(f"[{i + 1}/{stock_queue.total}] ", end="")
+        if not process_single_stock(
+            stock,
+            writer,
+            force=force,
+            sector_stats=sector_stats,
+            price_histories=price_histories,
+            on_saved=record,
+            gate=gate,
+        ):
+            record(False)
+
+    return stock_queue
+
+
+def stock_worker(
+    worker_id: int,
+    stock_queue: StockQueue,
+    writer: BatchWriter,
+    force: bool = False,
+    sector_stats: Optional[Dict] = None,
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+    gate: Optional[MaterialityGate] = None,
+):
+    """
+    ワーカースレッド: キューが空になるまで銘柄を処理
+
+    保存は共有の書き込みバッファにまとめるため、ワーカーはDB接続を持たない。
+
+    Args:
+        worker_id: ワーカー番号（ログ表示用）
+        stock_queue: 共有の銘柄キュー
+        writer: 書き込みバッファ
+        force: 強制再実行モードかどうか（ログ表示用）
+        sector_stats: セクター統計情報（オプション）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        gate: AI再分析ゲート（オプション）
+    """
+    record = progress_recorder(stock_queue)
+
+    try:
+        while True:
+            stock = stock_queue.get_next()
+            if stock is None:
+                break
+
+            if not process_single_stock(
+                stock,
+                writer,
+                force=force,
+                sector_stats=sector_stats,
+                price_histories=price_histories,
+                on_saved=record,
+                gate=gate,
+            ):
+                record(False)
+
+    except Exception as e:
+        print(f"❌ ワーカー{worker_id}: 異常終了 - {e}")
+
+
+def run_worker_pool(
+    stocks: List[Dict[str, Any]],
+    workers: int,
+    writer: BatchWriter,
+    force: bool = False,
+    sector_stats: Optional[Dict] = None,
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+    gate: Optional[MaterialityGate] = None,
+    admission: Optional[AdmissionController] = None,
+    stock_queue: Optional[StockQueue] = None,
+) -> StockQueue:
+    """
+    ワーカープールで銘柄キューを並列処理
+
+    Args:
+        stocks: 処理対象の銘柄リスト
+        workers: ワーカー数
+        writer: 書き込みバッファ
+        force: 強制再実行モードかどうか（ログ表示用）
+        sector_stats: セクター統計情報（オプション）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        gate: AI再分析ゲート（オプション）
+        admission: 制限時間・費用上限による受け付け判定（オプション）
+        stock_queue: 処理に使うキュー（省略時はstocksから作成）
+
+    Returns:
+        StockQueue: 処理後のキュー（書き込みバッファを閉じた時点で成功数・失敗数が確定）
+    """
+    if stock_queue is None:
+        stock_queue = StockQueue(stocks, admission)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for worker_id in range(1, workers + 1):
+            executor.submit(
+                stock_worker,
+                worker_id,
+                stock_queue,
+                writer,
+                force,
+                sector_stats,
+                price_histories,
+                gate,
+            )
+
+    # 全ワーカーが異常終了した場合、未処理の銘柄は失敗として扱う
+    while (stock := stock_queue.get_next()) is not None:
+        record_stock_failure(stock, "ワーカーが異常終了しました")
+        stock_queue.mark_failure()
+
+    return stock_queue
+
+
+def run_pipeline(
+    stocks: List[Dict[str, Any]],
+    writer: BatchWriter,
+    force: bool = False,
+    sector_stats: Optional[Dict] = None,
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+    gate: Optional[MaterialityGate] = None,
+    admission: Optional[AdmissionController] = None,
+    stock_queue: Optional[StockQueue] = None,
+    fetch_workers: int = 2,
+    ta_workers: int = 1,
+    llm_workers: int = 4,
+    db_workers: int = 2,
+    queue_size: int = 10,
+    group_size: int = 1,
+) -> StockQueue:
+    """
+    取得 → テクニカル分析 → 再分析判定 → AI分析 → DB保存 をステージ分割して並行処理
+
+    銘柄Nが OpenAI の応答待ちの間に、銘柄N+1 の取得と銘柄N-1 の保存が進む。
+    ステージ間は上限付きキューで接続されるため、銘柄数が増えてもメモリは一定。
+    前回から変化が小さい銘柄は再分析判定ステージで保存に回し、AI分析ステージを通さない。
+    group_size が2以上の場合は、同じセクターの銘柄を group_size 件ずつまとめて
+    1回のAI分析に送る（結果が得られなかった銘柄は1銘柄ずつ分析する）。
+
+    Args:
+        stocks: 処理対象の銘柄リスト（本日分の分析済み銘柄は除外済み）
+        writer: 書き込みバッファ（DB保存ステージはここに追加する）
+        force: 強制再実行モードかどうか（ログ表示用）
+        sector_stats: セクター統計情報（オプション）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        gate: AI再分析ゲート（オプション）
+        admission: 制限時間・費用上限による受け付け判定（オプション）
+        stock_queue: 処理に使うキュー（省略時はstocksから作成）
+        fetch_workers: 取得ステージの同時実行数
+        ta_workers: テクニカル分析ステージの同時実行数
+        llm_workers: AI分析ステージの同時実行数
+        db_workers: DB保存ステージの同時実行数
+        queue_size: ステージ間キューの上限
+        group_size: 1回のAI分析にまとめる同じセクターの銘柄数
+
+    Returns:
+        StockQueue: 処理後のキュー（書き込みバッファを閉じた時点で成功数・失敗数が確定）
+    """
+    if stock_queue is None:
+        stock_queue = StockQueue(stocks, admission)
+    record = progress_recorder(stock_queue)
+    on_error = stage_error_reporter(record)
+
+    def screen(item: Dict[str, Any], state) -> Optional[Dict[str, Any]]:
+        previous = reusable_analysis(
+            item["stock"], item["stock_data"], item["trend_info"], gate
+        )
+        if previous is not None:
+            # 前回の分析を再利用する銘柄はAI分析ステージを飛ばして保存する
+            item["analysis"] = previous_analysis_result(previous)
+            item["reuse_id"] = previous["id"]
         else:
-            print(f"❌ {ticker}: DB保存失敗")
-            return False
+            item["analysis"] = rule_based_analysis(
+                item["stock"], item["stock_data"], item["trend_info"]
+            )
+            if item["analysis"] is None:
+                return item
+
+        # ルールで判定できた銘柄も同様
+        save(item, state)
+        return None
+
+    def analyze(item: Dict[str, Any], state) -> Dict[str, Any]:
+        item["analysis"] = analyze_with_openai(item["stock_data"], item["trend_info"])
+        return item
+
+    def analyze_group(group: List[Dict[str, Any]], state) -> None:
+        try:
+            analyses = analyze_group_with_openai(group, sector_stats)
+        except CircuitOpenError:
+            # 1銘柄ずつの分析でも同じ理由で中止され、銘柄ごとに失敗として記録される
+            analyses = {}
+        except Exception as e:
+            # 想定外の応答などでまとめて分析できなければ1銘柄ずつ分析する
+            tickers = ", ".join(item["stock"]["ticker"] for item in group)
+            print(f"⚠️ まとめて分析エラー ({tickers}): {str(e)[:50]}")
+            analyses = {}
+
+        for item in group:
+            analysis = analyses.get(item["stock"]["id"])
+            try:
+                item["analysis"] = analysis or analyze_with_openai(
+                    item["stock_data"], item["trend_info"]
+                )
+            except Exception as e:
+                on_error(item, "llm", e)
+                continue
+            save(item, state)
+
+    def save(item: Dict[str, Any], state) -> None:
+        # 保存の成否は書き込みバッファからrecordに通知される
+        save_stock_results(
+            writer,
+            item["stock"],
+            item["stock_data"],
+            item["analysis"],
+            sector_stats,
+            on_saved=record,
+            trend_info=item["trend_info"],
+            reuse_id=item.get("reuse_id"),
+        )
+
+    if group_size > 1:
+        # 同じセクターが group_size 件たまったらまとめて分析・保存する
+        analysis_stages = [
+            Stage(
+                "group",
+                lambda item, grouper: grouper.add(item),
+                setup=lambda: SectorGrouper(group_size),
+                flush=lambda grouper: grouper.flush(),
+            ),
+            Stage("llm", analyze_group, workers=llm_workers),
+        ]
+    else:
+        analysis_stages = [
+            Stage("llm", analyze, workers=llm_workers),
+            Stage("db", save, workers=db_workers),
+        ]
+
+    pipeline = Pipeline(
+        prepare_stages(force, price_histories, record, fetch_workers, ta_workers)
+        + [Stage("gate", screen, workers=ta_workers)]
+        + analysis_stages,
+        queue_size=queue_size,
+        on_error=on_error,
+    )
+    pipeline.run(iter(stock_queue.get_next, None))
+
+    return stock_queue
+
+
+def run_llm_batch(
+    stocks: List[Dict[str, Any]],
+    writer: BatchWriter,
+    force: bool = False,
+    sector_stats: Optional[Dict] = None,
+    price_histories: Optional[Dict[str, PriceSeries]] = None,
+    gate: Optional[MaterialityGate] = None,
+    admission: Optional[AdmissionController] = None,
+    fetch_workers: int = 2,
+    ta_workers: int = 1,
+    queue_size: int = 10,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    timeout: Optional[float] = DEFAULT_BATCH_TIMEOUT,
+) -> StockQueue:
+    """
+    OpenAI Batch API で全銘柄をまとめて分析
+
+    取得・テクニカル分析はパイプラインで並行処理し、全銘柄分のリクエストを
+    1つのバッチとして投入する。結果は custom_id（銘柄ID）で突き合わせて
+    通常の保存処理に流す。バッチで結果が得られなかった銘柄は同期呼び出しで分析する
+    （制限時間を過ぎていれば同期呼び出しせず、次回に持ち越す）。
 
+    Args:
+        stocks: 処理対象の銘柄リスト（本日分の分析済み銘柄は除外済み）
+        writer: 書き込みバッファ
+        force: 強制再実行モードかどうか（ログ表示用）
+        sector_stats: セクター統計情報（オプション）
+        price_histories: 一括取得済みの株価履歴（オプション）
+        gate: AI再分析ゲート（オプション）
+        admission: 制限時間・費用上限による受け付け判定（オプション）
+        fetch_workers: 取得ステージの同時実行数
+        ta_workers: テクニカル分析ステージの同時実行数
+        queue_size: ステージ間キューの上限
+        poll_interval: バッチの完了確認の間隔（秒）
+        timeout: バッチの完了を待つ上限（秒）
+
+    Returns:
+        StockQueue: 処理後のキュー（書き込みバッファを閉じた時点で成功数・失敗数が確定）
+    """
+    stock_queue = StockQueue(stocks, admission)
+    record = progress_recorder(stock_queue)
+
+    # 取得・テクニカル分析まで済んだ銘柄を集める
+    prepared: List[Dict[str, Any]] = []
+    pipeline = Pipeline(
+        prepare_stages(force, price_histories, record, fetch_workers, ta_workers),
+        queue_size=queue_size,
+        on_complete=prepared.append,
+        on_error=stage_error_reporter(record),
+    )
+    pipeline.run(iter(stock_queue.get_next, None))
+
+    # 前回の分析を再利用する銘柄・ルールで判定できる銘柄・キャッシュ済みの銘柄は
+    # バッチに含めない（ルールによる判定は全銘柄分をまとめて計算）
+    candidates = []
+    for item in prepared:
+        previous = reusable_analysis(
+            item["stock"], item["stock_data"], item["trend_info"], gate
+        )
+        if previous is not None:
+            item["analysis"] = previous_analysis_result(previous)
+            item["reuse_id"] = previous["id"]
+        else:
+            candidates.append(item)
+    if prescorer and candidates:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for item, analysis in zip(candidates, prescorer.triage(candidates, now)):
+            item["analysis"] = analysis
+
+    requests = []
+    for item in candidates:
+        if item.get("analysis") is not None:
+            continue
+
+        request = build_chat_request(item["stock_data"], item["trend_info"])
+        item["cache_key"] = request_fingerprint(request)
+        item["analysis"] = cached_analysis(item["cache_key"])
+        if item["analysis"] is None:
+            requests.append({"custom_id": item["stock"]["id"], "body": request})
+    if len(requests) < len(prepared):
+        print(
+            "♻️  バッチ対象外（再利用・ルール判定・キャッシュ済み）: "
+            f"{len(prepared) - len(requests)}件"
+        )
+
+    # 制限時間がある場合は、バッチの完了待ちも期限までに打ち切る
+    remaining = admission.remaining_seconds() if admission else None
+    if remaining is not None:
+        remaining = max(remaining, poll_interval)
+        timeout = remaining if timeout is None else min(timeout, remaining)
+
+    try:
+        results = run_batch(client, requests, poll_interval, timeout)
     except Exception as e:
-        print(f"❌ {ticker}: エラー - {str(e)[:50]}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+        print(f"⚠️ Batch APIエラー - 同期呼び出しで分析します: {e}")
+        results = {}
+
+    for item in prepared:
+        ticker = item["stock"]["ticker"]
+        analysis = item["analysis"]
+        result = results.get(item["stock"]["id"])
+
+        if analysis is None and result:
+            if result["usage"]:
+                usage_tracker.add_usage(
+                    result["usage"]["prompt_tokens"],
+                    result["usage"]["completion_tokens"],
+                    batch=True,
+                )
+            if result["content"]:
+                try:
+                    analysis = json.loads(result["content"])
+                    cache_response(
+                        item["cache_key"], result["content"], result["usage"]
+                    )
+                except ValueError as e:
+                    result["error"] = f"JSON解析エラー: {e}"
+
+        if analysis is None and admission and admission.remaining_seconds() <= 0:
+            # 期限後に同期呼び出し（バッチの2倍の単価）で分析し直さない
+            print(f"⏹️  {ticker}: バッチ結果なし - 制限時間を過ぎたため次回に持ち越し")
+            stock_queue.mark_deferred(item["stock"], "制限時間（Batch APIの完了待ち）")
+            continue
+
+        if analysis is None:
+            reason = result["error"] if result else "結果なし"
+            print(f"⚠️ {ticker}: バッチ結果なし ({reason}) - 同期呼び出しで分析します")
+            try:
+                analysis = analyze_with_openai(
+                    item["stock_data"], item["trend_info"]
+                )
+            except CircuitOpenError as e:
+                print(f"❌ {ticker}: {e}")
+                record_stock_failure(item["stock"], str(e))
+                record(False)
+                continue
+
+        save_stock_results(
+            writer,
+            item["stock"],
+            item["stock_data"],
+            analysis,
+            sector_stats,
+            on_saved=record,
+            trend_info=item["trend_info"],
+            reuse_id=item.get("reuse_id"),
+        )
+
+    return stock_queue
 
 
 def log_batch_job(
@@ -757,6 +2320,7 @@ def log_batch_job(
     success_count: int,
     failure_count: int,
     error_message: Optional[str] = None,
+    run_metrics: Optional[Dict[str, Any]] = None,
 ):
     """
     バッチジョブログを記録
@@ -768,6 +2332,7 @@ def log_batch_job(
         success_count: 成功数
         failure_count: 失敗数
         error_message: エラーメッセージ
+        run_metrics: ステージ別の計測値（collect_run_metrics()参照）
     """
     try:
         duration = int((datetime.now() - start_time).total_seconds() * 1000)
@@ -796,8 +2361,9 @@ def log_batch_job(
                     failure_count,
                     error_message,
                     duration,
+                    metrics,
                     created_at
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
                 (
                     log_id,
@@ -808,6 +2374,11 @@ def log_batch_job(
                     failure_count,
                     error_message,
                     duration,
+                    (
+                        json.dumps(run_metrics, ensure_ascii=False)
+                        if run_metrics
+                        else None
+                    ),
                     now,
                 ),
             )
@@ -820,101 +2391,765 @@ def log_batch_job(
         print(f"⚠️ バッチジョブログの記録失敗: {e}")
 
 
+def collect_run_metrics(
+    db_pool: Optional[ConnectionPool] = None, writer: Optional[BatchWriter] = None
+) -> Dict[str, Any]:
+    """
+    実行全体の計測値をまとめる（batch_job_logs.metrics・--metrics-json の内容）
+
+    Args:
+        db_pool: DB接続プール（オプション）
+        writer: 書き込みバッファ（オプション）
+
+    Returns:
+        Dict: ステージ別の計測値に、OpenAIの使用量・レート制限・DB接続の統計を加えたもの
+    """
+    run_metrics = metrics.snapshot()
+    with usage_tracker.lock:
+        run_metrics["openai"] = {
+            "requests": usage_tracker.total_requests,
+            "input_tokens": usage_tracker.total_input_tokens,
+            "cached_input_tokens": usage_tracker.cached_input_tokens,
+            "output_tokens": usage_tracker.total_output_tokens,
+        }
+    run_metrics["openai"]["cost_usd"] = round(usage_tracker.get_cost(), 6)
+    run_metrics["rate_limits"] = {
+        stats["name"]: stats
+        for stats in (limiter.get_stats() for limiter in all_limiters())
+    }
+    if db_pool:
+        run_metrics["db_pool"] = db_pool.get_stats()
+    if writer:
+        run_metrics["writer"] = writer.get_stats()
+    if prescorer:
+        run_metrics["prescoring"] = prescorer.get_stats()
+    return run_metrics
+
+
 def main():
     """メイン処理"""
+    global llm_cache, fetch_breaker, llm_breaker, run_manifest, prescorer
+    global universe_indicators
+
     # コマンドライン引数の解析
     parser = argparse.ArgumentParser(description="AI株式分析バッチ処理")
     parser.add_argument(
         "--force", action="store_true", help="既存データを無視して強制的に再実行"
     )
     parser.add_argument("--limit", type=int, help="処理する銘柄数の上限")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="並列ワーカー数（1の場合は順次処理）",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="取得・テクニカル分析・AI分析・DB保存をステージ分割して並行処理",
+    )
+    parser.add_argument(
+        "--fetch-workers", type=int, default=2, help="取得ステージの同時実行数"
+    )
+    parser.add_argument(
+        "--ta-workers", type=int, default=1, help="テクニカル分析ステージの同時実行数"
+    )
+    parser.add_argument(
+        "--llm-workers", type=int, default=4, help="AI分析ステージの同時実行数"
+    )
+    parser.add_argument(
+        "--db-workers", type=int, default=2, help="DB保存ステージの同時実行数"
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=10, help="ステージ間キューの上限"
+    )
+    parser.add_argument(
+        "--group-size",
+        type=int,
+        default=1,
+        help="--pipeline で1回のAI分析にまとめる同じセクターの銘柄数（1はまとめない）",
+    )
+    parser.add_argument(
+        "--no-bulk-fetch",
+        action="store_true",
+        help="株価履歴の一括取得を無効化（銘柄ごとに個別取得）",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="保存済みの株価履歴以降の差分のみ取得・保存",
+    )
+    parser.add_argument(
+        "--no-indicator-state",
+        action="store_true",
+        help="差分取得時もテクニカル指標を逐次更新せず株価履歴から計算",
+    )
+    parser.add_argument(
+        "--fetch-chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="株価履歴の一括取得1リクエストあたりの銘柄数",
+    )
+    parser.add_argument(
+        "--llm-mode",
+        choices=["sync", "batch"],
+        default="sync",
+        help="AI分析の実行方法（batch: OpenAI Batch APIにまとめて投入、料金半額）",
+    )
+    parser.add_argument(
+        "--batch-poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="Batch APIの完了確認の間隔（秒）",
+    )
+    parser.add_argument(
+        "--batch-timeout",
+        type=float,
+        default=DEFAULT_BATCH_TIMEOUT,
+        help="Batch APIの完了を待つ上限（秒、超えた銘柄は同期呼び出しで分析）",
+    )
+    parser.add_argument(
+        "--no-materiality-gate",
+        action="store_true",
+        help="前回から変化が小さい銘柄も必ずAI分析する（--force指定時も同様）",
+    )
+    parser.add_argument(
+        "--gate-price-pct",
+        type=float,
+        default=DEFAULT_PRICE_THRESHOLD * 100,
+        help="この変化率（%%）以上の株価変動でAI再分析",
+    )
+    parser.add_argument(
+        "--gate-ratio-pct",
+        type=float,
+        default=DEFAULT_RATIO_THRESHOLD * 100,
+        help="この変化率（%%）以上のPER/PBR/ROE変動でAI再分析",
+    )
+    parser.add_argument(
+        "--gate-rsi",
+        type=float,
+        default=DEFAULT_RSI_THRESHOLD,
+        help="このポイント以上のRSI変動でAI再分析",
+    )
+    parser.add_argument(
+        "--gate-max-age-days",
+        type=float,
+        default=DEFAULT_MAX_AGE_DAYS,
+        help="前回のAI分析からこの日数が経過したら変化に関係なく再分析",
+    )
+    parser.add_argument(
+        "--no-prescoring",
+        action="store_true",
+        help="ルールによる事前判定を行わず全銘柄をAI分析する（--force指定時も同様）",
+    )
+    parser.add_argument(
+        "--prescore-margin",
+        type=float,
+        default=DEFAULT_BOUNDARY_MARGIN,
+        help="推奨の閾値からこの幅以内のスコア（-1〜1）の銘柄はAI分析",
+    )
+    parser.add_argument(
+        "--prescore-refresh-days",
+        type=float,
+        default=DEFAULT_REFRESH_DAYS,
+        help="前回のAI分析からこの日数が経過した銘柄はAI分析",
+    )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="LLM応答キャッシュを使わない（同じ入力でも必ずOpenAIに問い合わせる）",
+    )
+    parser.add_argument(
+        "--llm-cache-path",
+        default=DEFAULT_CACHE_PATH,
+        help="LLM応答キャッシュの保存先（SQLiteファイル）",
+    )
+    parser.add_argument(
+        "--llm-cache-ttl",
+        type=float,
+        default=DEFAULT_TTL_SECONDS / 3600,
+        help="LLM応答キャッシュの有効期間（時間）",
+    )
+    parser.add_argument(
+        "--write-batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="分析結果をまとめて書き込む件数",
+    )
+    parser.add_argument(
+        "--write-interval",
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help="件数に関係なく分析結果を書き込む間隔（秒）",
+    )
+    parser.add_argument(
+        "--yahoo-rps",
+        type=float,
+        default=yahoo_limiter.max_rate,
+        help="Yahoo Financeへの1秒あたりの最大リクエスト数（429で自動的に下げる）",
+    )
+    parser.add_argument(
+        "--openai-rpm",
+        type=float,
+        default=openai_request_limiter.max_rate * 60,
+        help="OpenAIへの1分あたりの最大リクエスト数",
+    )
+    parser.add_argument(
+        "--openai-tpm",
+        type=float,
+        default=openai_token_limiter.max_rate * 60,
+        help="OpenAIへの1分あたりの最大トークン数",
+    )
+    parser.add_argument(
+        "--no-circuit-breaker",
+        action="store_true",
+        help="上流障害時のサーキットブレーカーを無効化（各銘柄がリトライを使い切る）",
+    )
+    parser.add_argument(
+        "--breaker-failure-pct",
+        type=float,
+        default=DEFAULT_FAILURE_THRESHOLD * 100,
+        help="直近の呼び出しの失敗率がこの値（%%）以上で取得・AI分析を一時停止",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=DEFAULT_COOLDOWN,
+        help="一時停止してから復旧を確認するまでの秒数",
+    )
+    parser.add_argument(
+        "--breaker-max-outage",
+        type=float,
+        default=DEFAULT_MAX_OUTAGE,
+        help="障害がこの秒数続いたら残りの銘柄を即時失敗にして終了",
+    )
+    parser.add_argument(
+        "--order",
+        choices=["priority", "ticker"],
+        default="priority",
+        help="処理順（priority: リクエスト数・経過日数・ボラティリティの優先度順）",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="開始からの制限時間（分）。間に合わない銘柄は受け付けずに次回へ持ち越す",
+    )
+    parser.add_argument(
+        "--max-cost-usd",
+        type=float,
+        help="OpenAI APIの費用上限（USD）。超えそうなら新しい銘柄を受け付けない",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="中断した実行の未完了（未処理・処理中・失敗）の銘柄だけを再開",
+    )
+    parser.add_argument(
+        "--no-run-manifest",
+        action="store_true",
+        help="銘柄ごとの進捗（batch_runs / batch_run_items）を記録しない",
+    )
+    parser.add_argument(
+        "--shard",
+        action="store_true",
+        help="複数プロセスで同じ実行を分担（ジョブテーブルから銘柄を借りて処理）",
+    )
+    parser.add_argument(
+        "--run-id",
+        help="--shard で分担する実行ID（省略時は日本時間の日付ごとに共通のID）",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help="借りた銘柄のリース期間（秒）。延長が止まったら他のプロセスが借り直す",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="ステージ別の処理時間・リトライ数・トークン数などを終了時にJSONで出力",
+    )
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error("--workers は1以上を指定してください")
+    for option in ("fetch_workers", "ta_workers", "llm_workers", "db_workers"):
+        if getattr(args, option) < 1:
+            parser.error(f"--{option.replace('_', '-')} は1以上を指定してください")
+    if args.queue_size < 1:
+        parser.error("--queue-size は1以上を指定してください")
+    if args.group_size < 1:
+        parser.error("--group-size は1以上を指定してください")
+    if args.group_size > 1 and not args.pipeline:
+        parser.error("--group-size は --pipeline と同時に指定してください")
+    if args.write_batch_size < 1:
+        parser.error("--write-batch-size は1以上を指定してください")
+    if args.write_interval <= 0:
+        parser.error("--write-interval は0より大きい値を指定してください")
+    if args.llm_mode == "batch" and (args.pipeline or args.workers > 1):
+        parser.error("--llm-mode batch は --pipeline / --workers と同時に指定できません")
+    if args.batch_poll_interval <= 0 or args.batch_timeout <= 0:
+        parser.error("--batch-poll-interval / --batch-timeout は0より大きい値を指定してください")
+    for option in ("gate_price_pct", "gate_ratio_pct", "gate_rsi", "gate_max_age_days"):
+        if getattr(args, option) < 0:
+            parser.error(f"--{option.replace('_', '-')} は0以上を指定してください")
+    if args.llm_cache_ttl <= 0:
+        parser.error("--llm-cache-ttl は0より大きい値を指定してください")
+    if args.incremental and args.no_bulk_fetch:
+        parser.error("--incremental と --no-bulk-fetch は同時に指定できません")
+    for option in ("yahoo_rps", "openai_rpm", "openai_tpm"):
+        if getattr(args, option) <= 0:
+            parser.error(f"--{option.replace('_', '-')} は0より大きい値を指定してください")
+    if args.shard and (args.resume or args.no_run_manifest or args.llm_mode == "batch"):
+        parser.error(
+            "--shard は --resume / --no-run-manifest / --llm-mode batch と"
+            "同時に指定できません"
+        )
+    if args.run_id and not args.shard:
+        parser.error("--run-id は --shard と同時に指定してください")
+    if args.lease_seconds <= 0:
+        parser.error("--lease-seconds は0より大きい値を指定してください")
+    if args.resume and (args.no_run_manifest or args.limit):
+        parser.error("--resume は --no-run-manifest / --limit と同時に指定できません")
+    if args.deadline is not None and args.deadline <= 0:
+        parser.error("--deadline は0より大きい値を指定してください")
+    if args.max_cost_usd is not None and args.max_cost_usd <= 0:
+        parser.error("--max-cost-usd は0より大きい値を指定してください")
+    if not 0 < args.breaker_failure_pct <= 100:
+        parser.error("--breaker-failure-pct は0より大きく100以下を指定してください")
+    if args.breaker_cooldown <= 0 or args.breaker_max_outage <= 0:
+        parser.error(
+            "--breaker-cooldown / --breaker-max-outage は0より大きい値を指定してください"
+        )
+
+    # 全ワーカーで共有するレート制限の上限
+    yahoo_limiter.set_limit(args.yahoo_rps)
+    openai_request_limiter.set_limit(args.openai_rpm / 60)
+    openai_token_limiter.set_limit(
+        args.openai_tpm / 60, capacity=args.openai_tpm / 60 * 10
+    )
+
+    # 上流障害時は各銘柄のリトライを待たずにステージごと停止する
+    if not args.no_circuit_breaker:
+        breaker_options = {
+            "failure_threshold": args.breaker_failure_pct / 100,
+            "cooldown": args.breaker_cooldown,
+            "max_outage": args.breaker_max_outage,
+        }
+        fetch_breaker = CircuitBreaker("Yahoo Finance", **breaker_options)
+        llm_breaker = CircuitBreaker("OpenAI", **breaker_options)
+
     start_time = datetime.now()
+    metrics.reset()
+
+    # 制限時間・費用上限に達する前に新しい銘柄の受け付けを止める
+    admission = None
+    if args.deadline is not None or args.max_cost_usd is not None:
+        admission = AdmissionController(
+            deadline=(
+                time.monotonic() + args.deadline * 60
+                if args.deadline is not None
+                else None
+            ),
+            max_cost_usd=args.max_cost_usd,
+            cost_func=usage_tracker.get_cost,
+        )
 
     print("\n" + "=" * 50)
     print("🚀 AI株式分析バッチジョブ開始 (Python + yfinance)")
     print(f"⏰ 開始時刻: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print("🔄 順次処理モード")
+    if args.llm_mode == "batch":
+        print(
+            "🗂️  Batch APIモード: "
+            f"取得{args.fetch_workers} / TA{args.ta_workers} "
+            f"(完了待ち上限{args.batch_timeout:.0f}秒)"
+        )
+    elif args.pipeline:
+        print(
+            "🔄 パイプライン処理: "
+            f"取得{args.fetch_workers} / TA{args.ta_workers} / "
+            f"AI{args.llm_workers} / DB{args.db_workers} "
+            f"(キュー上限{args.queue_size})"
+        )
+        if args.group_size > 1:
+            print(f"📦 同じセクターの{args.group_size}銘柄ずつまとめてAI分析")
+    elif args.workers > 1:
+        print(f"🔄 並列処理: {args.workers}ワーカー")
+    else:
+        print("🔄 順次処理モード")
     if args.force:
         print("⚡ 強制再実行モード有効")
+    if args.deadline is not None:
+        print(f"⏳ 制限時間: {args.deadline:.0f}分")
+    if args.max_cost_usd is not None:
+        print(f"💵 費用上限: ${args.max_cost_usd:.2f}")
     print("=" * 50 + "\n")
 
-    conn = None
+    db_pool = None
+    writer = None
+    gate = None
+    total_stocks = 0
     success_count = 0
     failure_count = 0
+    deferred_count = 0
 
     try:
-        # データベース接続
-        conn = psycopg2.connect(DATABASE_URL)
-        print("✅ データベース接続成功\n")
-
-        # 銘柄リストを取得（is_ai_analysis_target=trueのみ）
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT id, ticker, market, sector
-                FROM stocks
-                WHERE is_ai_analysis_target = true
-                ORDER BY ticker
-            """)
-            stocks = cur.fetchall()
-
-        # --limitオプションが指定されている場合は制限
-        if args.limit:
-            stocks = stocks[: args.limit]
-            print(f"⚡ 処理制限: 最初の{args.limit}件のみ\n")
-
-        total_stocks = len(stocks)
-        print(f"📋 分析対象銘柄数: {total_stocks}件\n")
-
-        if total_stocks == 0:
-            print("⚠️ 分析対象の銘柄が見つかりませんでした")
-            log_batch_job(
-                conn, start_time, 0, 0, 0, "分析対象の銘柄が見つかりませんでした"
+        # 同じ入力の分析は前回の応答を再利用（--force再実行時の再課金を防ぐ）
+        if not args.no_llm_cache:
+            llm_cache = LLMCache(
+                args.llm_cache_path, ttl_seconds=args.llm_cache_ttl * 3600
             )
-            return
 
-        # セクター統計を計算
-        print("📊 セクター統計を計算中...")
-        sector_stats = calculate_sector_statistics(conn)
-        print(f"✅ {len(sector_stats)}セクターの統計を取得\n")
+        # データベース接続プール（メイン + 書き込みバッファ + 実行マニフェストの3接続、
+        # --shard の場合はリース用と借りた銘柄の差分取得用にもう2接続）
+        db_pool = ConnectionPool(DATABASE_URL, maxconn=5 if args.shard else 3)
+
+        # メインの接続は実行中ずっと保持する
+        with db_pool.connection() as conn:
+            print("✅ データベース接続成功\n")
+
+            if args.resume:
+                # 中断した実行の未完了の銘柄のみ（処理順は前回のまま）
+                stocks = resume_run(conn, args.resume)
+                print(f"🔁 実行 {args.resume} を再開: 未完了{len(stocks)}件\n")
+                if not stocks:
+                    finish_run(conn, args.resume)
+                    print("✅ 未完了の銘柄はありません")
+                    return
+            else:
+                # 銘柄リストを取得（is_ai_analysis_target=trueのみ）
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        SELECT id, ticker, market, sector
+                        FROM stocks
+                        WHERE is_ai_analysis_target = true
+                        ORDER BY ticker
+                    """)
+                    stocks = cur.fetchall()
+
+            # 優先度の高い銘柄から処理する（打ち切られても残るのは優先度の低い銘柄）
+            if args.order == "priority" and stocks and not args.resume:
+                schedule_inputs = load_schedule_inputs(
+                    conn, [stock["id"] for stock in stocks]
+                )
+                stocks = prioritize(
+                    stocks,
+                    schedule_inputs,
+                    datetime.now(timezone.utc).replace(tzinfo=None),
+                )
+
+            # --limitオプションが指定されている場合は制限
+            if args.limit:
+                stocks = stocks[: args.limit]
+                print(f"⚡ 処理制限: 最初の{args.limit}件のみ\n")
 
-        # 順次処理
-        for i, stock in enumerate(stocks):
-            print(f"[{i + 1}/{total_stocks}] ", end="")
-            success = process_single_stock(stock, force=args.force, sector_stats=sector_stats)
+            total_stocks = len(stocks)
+            print(f"📋 分析対象銘柄数: {total_stocks}件\n")
 
-            if success:
-                success_count += 1
-            else:
-                failure_count += 1
+            if total_stocks == 0:
+                print("⚠️ 分析対象の銘柄が見つかりませんでした")
+                log_batch_job(
+                    conn, start_time, 0, 0, 0, "分析対象の銘柄が見つかりませんでした"
+                )
+                return
+
+            # 本日分の分析済み銘柄を一括で除外（スキップは成功として数える）
+            target_stocks = stocks
+            analyzed_ids: Set[str] = set()
+            if not args.force:
+                analyzed_ids = fetch_analyzed_today_stock_ids(
+                    conn, [stock["id"] for stock in stocks]
+                )
+                if analyzed_ids:
+                    stocks = [s for s in stocks if s["id"] not in analyzed_ids]
+                    success_count += len(analyzed_ids)
+                    print(
+                        f"⏭️  本日分の分析済み: {len(analyzed_ids)}件をスキップ "
+                        f"(残り{len(stocks)}件)\n"
+                    )
+
+            # 実行マニフェスト（中断した場合は --resume <実行ID> で未完了の銘柄だけ再開）
+            manifest_writer = None
+            lease = None
+            if not args.no_run_manifest:
+                run_options = {
+                    key: value
+                    for key, value in vars(args).items()
+                    if value not in (None, False)
+                }
+                if args.shard:
+                    # 同じ実行IDのシャードで1つのジョブテーブルを分担する
+                    run_id = args.run_id or daily_run_id()
+                    added = ensure_run(
+                        conn, run_id, target_stocks, analyzed_ids, run_options
+                    )
+                    lease = WorkLease(
+                        db_pool, run_id, lease_seconds=args.lease_seconds
+                    )
+                    print(
+                        f"🧩 シャード {lease.owner}: 実行 {run_id} を分担 "
+                        f"(新規登録{added}件)\n"
+                    )
+                else:
+                    run_id = args.resume or create_run(conn, stocks, run_options)
+                manifest_writer = BatchWriter(
+                    db_pool,
+                    write_events,
+                    batch_size=args.write_batch_size,
+                    flush_interval=args.write_interval,
+                )
+                run_manifest = RunManifest(run_id, manifest_writer)
+                # 再開時、前回の中断までに保存済みだった銘柄は成功として記録
+                if args.resume:
+                    for stock_id in analyzed_ids:
+                        run_manifest.succeed(stock_id)
+                print(f"🧾 実行ID: {run_id}（中断した場合は --resume {run_id} で再開）\n")
+
+            # 前回の分析を一括取得（変化が小さい銘柄・ルールで判定できる銘柄はAI分析を省略）
+            use_gate = not args.force and not args.no_materiality_gate
+            use_prescoring = not args.force and not args.no_prescoring
+            previous_analyses = {}
+            if use_gate or use_prescoring:
+                previous_analyses = load_previous_analyses(
+                    conn, [stock["id"] for stock in stocks]
+                )
+                print(f"🚦 前回の分析データ: {len(previous_analyses)}件\n")
+            if use_gate:
+                gate = MaterialityGate(
+                    previous_analyses,
+                    price_threshold=args.gate_price_pct / 100,
+                    ratio_threshold=args.gate_ratio_pct / 100,
+                    rsi_threshold=args.gate_rsi,
+                    max_age=timedelta(days=args.gate_max_age_days),
+                )
 
-            # 少し待機（レート制限対策）
-            if i < total_stocks - 1:
-                time.sleep(1)
+            # セクター統計を計算
+            print("📊 セクター統計を計算中...")
+            sector_stats = calculate_sector_statistics(conn)
+            print(f"✅ {len(sector_stats)}セクターの統計を取得\n")
 
-        # バッチジョブログを記録
-        error_message = (
-            f"{failure_count}件の銘柄分析に失敗しました" if failure_count > 0 else None
-        )
-        log_batch_job(
-            conn,
-            start_time,
-            total_stocks,
-            success_count,
-            failure_count,
-            error_message,
-        )
+            # ルールによる事前判定（判定境界・リクエスト・定期更新の銘柄のみAI分析）
+            if use_prescoring:
+                requested_at = load_analysis_requests(
+                    conn, [stock["id"] for stock in stocks]
+                )
+                prescorer = PreScorer(
+                    sector_stats,
+                    previous_analyses,
+                    requested_at,
+                    boundary_margin=args.prescore_margin,
+                    refresh_age=timedelta(days=args.prescore_refresh_days),
+                )
+                print(f"📐 ルールによる事前判定: 分析リクエスト{len(requested_at)}件\n")
+
+            # 株価履歴を一括取得（財務指標は分析する銘柄のみ個別に取得）
+            # テクニカル指標は（銘柄×日）の行列でまとめて計算
+            # （差分取得時は保存済みの計算状態を新しいバーの分だけ進める）
+            price_histories = None
+            prefetch = None
+            if lease and not args.no_bulk_fetch:
+                # --shard では処理する銘柄が借りるまで決まらないため、借りた数件ごとに取得
+                price_histories = {}
+                universe_indicators = {}
+                prefetch = leased_batch_prefetcher(
+                    db_pool,
+                    price_histories,
+                    universe_indicators,
+                    incremental=args.incremental,
+                    indicator_state=not args.no_indicator_state,
+                    chunk_size=args.fetch_chunk_size,
+                )
+            elif not args.no_bulk_fetch:
+                print(
+                    "📈 株価履歴を差分取得中..."
+                    if args.incremental
+                    else "📈 株価履歴を一括取得中..."
+                )
+                started = time.perf_counter()
+                price_histories, universe_indicators = prefetch_stock_histories(
+                    conn,
+                    stocks,
+                    incremental=args.incremental,
+                    indicator_state=not args.no_indicator_state,
+                    chunk_size=args.fetch_chunk_size,
+                )
+                print(
+                    f"✅ {len(price_histories)}/{len(stocks)}銘柄の株価履歴を取得・"
+                    f"テクニカル指標 {len(universe_indicators)}銘柄を計算 "
+                    f"({time.perf_counter() - started:.2f}秒)\n"
+                )
+
+            # 分析結果はN件ごと・T秒ごとにまとめて書き込む
+            writer = BatchWriter(
+                db_pool,
+                write_stock_results,
+                batch_size=args.write_batch_size,
+                flush_interval=args.write_interval,
+            )
+            # 保存結果をマニフェストに記録してから、マニフェストを書き込んで閉じる
+            # （最後に、借りたまま処理しなかった銘柄を返す）
+            stock_queue = (
+                LeasedStockQueue(lease, admission, prefetch) if lease else None
+            )
+            with lease or nullcontext(), manifest_writer or nullcontext(), writer:
+                if args.llm_mode == "batch":
+                    # Batch API（全銘柄のリクエストをまとめて投入）
+                    stock_queue = run_llm_batch(
+                        stocks,
+                        writer,
+                        force=args.force,
+                        sector_stats=sector_stats,
+                        price_histories=price_histories,
+                        gate=gate,
+                        admission=admission,
+                        fetch_workers=args.fetch_workers,
+                        ta_workers=args.ta_workers,
+                        queue_size=args.queue_size,
+                        poll_interval=args.batch_poll_interval,
+                        timeout=args.batch_timeout,
+                    )
+                elif args.pipeline:
+                    # パイプライン処理（ステージ間を上限付きキューで接続）
+                    stock_queue = run_pipeline(
+                        stocks,
+                        writer,
+                        force=args.force,
+                        sector_stats=sector_stats,
+                        price_histories=price_histories,
+                        gate=gate,
+                        admission=admission,
+                        stock_queue=stock_queue,
+                        fetch_workers=args.fetch_workers,
+                        ta_workers=args.ta_workers,
+                        llm_workers=args.llm_workers,
+                        db_workers=args.db_workers,
+                        queue_size=args.queue_size,
+                        group_size=args.group_size,
+                    )
+                elif args.workers > 1:
+                    # 並列処理（ワーカープールでキューを消化）
+                    stock_queue = run_worker_pool(
+                        stocks,
+                        args.workers,
+                        writer,
+                        force=args.force,
+                        sector_stats=sector_stats,
+                        price_histories=price_histories,
+                        gate=gate,
+                        admission=admission,
+                        stock_queue=stock_queue,
+                    )
+                else:
+                    # 順次処理
+                    stock_queue = run_sequential(
+                        stocks,
+                        writer,
+                        force=args.force,
+                        sector_stats=sector_stats,
+                        price_histories=price_histories,
+                        gate=gate,
+                        admission=admission,
+                        stock_queue=stock_queue,
+                    )
+
+            # 書き込みバッファを閉じた時点で成功数・失敗数が確定する
+            success_count += stock_queue.success
+            failure_count += stock_queue.failed
+
+            # --shard: 全シャードが終わっていれば、最後に終えたシャードがまとめて記録する
+            job_start = start_time
+            finalized = None
+            if lease:
+                finalized = finalize_run(conn, lease.run_id)
+            deferred_count = lease.deferred if lease else stock_queue.deferred
+            if finalized:
+                counts = finalized["counts"]
+                total_stocks = sum(counts.values())
+                success_count = counts.get(SUCCEEDED, 0)
+                failure_count = counts.get(FAILED, 0)
+                deferred_count = counts.get(DEFERRED, 0)
+                # 実行の開始時刻（UTC）から全シャード分の処理時間を計算する
+                job_start = (
+                    finalized["started_at"]
+                    .replace(tzinfo=timezone.utc)
+                    .astimezone()
+                    .replace(tzinfo=None)
+                )
+                print(f"🧩 全シャードの処理が完了: {lease.run_id}")
+            elif run_manifest:
+                manifest_counts = finish_run(conn, run_manifest.run_id)
+                print(
+                    "🧾 実行マニフェスト: "
+                    + " / ".join(
+                        f"{state} {count}件"
+                        for state, count in sorted(manifest_counts.items())
+                    )
+                )
+
+            # バッチジョブログを記録（上流障害の期間も残す）
+            messages = [
+                breaker.describe_outages()
+                for breaker in (fetch_breaker, llm_breaker)
+                if breaker
+            ]
+            if deferred_count > 0:
+                # 全シャード分を記録する場合、このシャードは上限に達していないことがある
+                reason = (
+                    admission.stop_reason
+                    if admission and admission.stop_reason
+                    else "制限時間・費用上限"
+                )
+                messages.insert(0, f"{reason}のため{deferred_count}件を次回に持ち越し")
+            if failure_count > 0:
+                messages.insert(0, f"{failure_count}件の銘柄分析に失敗しました")
+            error_message = " / ".join(m for m in messages if m) or None
+            if lease and not finalized:
+                print(
+                    "🧩 他のシャードが処理中のため、バッチジョブログは"
+                    "最後に終えたシャードが記録します"
+                )
+            else:
+                log_batch_job(
+                    conn,
+                    job_start,
+                    total_stocks,
+                    success_count,
+                    failure_count,
+                    error_message,
+                    collect_run_metrics(db_pool, writer),
+                )
 
     except Exception as e:
         print(f"\n❌ バッチジョブでエラーが発生しました: {e}")
-        if conn:
-            log_batch_job(conn, start_time, 0, 0, 0, f"バッチジョブエラー: {str(e)}")
+        if db_pool:
+            with db_pool.connection() as conn:
+                log_batch_job(
+                    conn,
+                    start_time,
+                    0,
+                    0,
+                    0,
+                    f"バッチジョブエラー: {str(e)}",
+                    collect_run_metrics(db_pool, writer),
+                )
         sys.exit(1)
 
     finally:
-        if conn:
-            conn.close()
+        if db_pool:
+            db_pool.closeall()
+        if llm_cache:
+            llm_cache.close()
+        if args.metrics_json:
+            run_metrics = collect_run_metrics(db_pool, writer)
+            run_metrics["result"] = {
+                "total_stocks": total_stocks,
+                "success": success_count,
+                "failure": failure_count,
+                "deferred": deferred_count,
+            }
+            with open(args.metrics_json, "w", encoding="utf-8") as f:
+                json.dump(run_metrics, f, ensure_ascii=False, indent=2)
+            print(f"📝 計測結果を出力しました: {args.metrics_json}")
 
     # 結果サマリー
     duration = (datetime.now() - start_time).total_seconds()
@@ -926,13 +3161,58 @@ def main():
         print("✅ バッチジョブ完了")
     print(f"⏱️  処理時間: {duration:.2f}秒")
     print("📊 結果サマリー:")
-    print(f"   - 対象銘柄数: {len(stocks)}")
+    print(f"   - 対象銘柄数: {total_stocks}")
     print(f"   - 成功: {success_count}")
     print(f"   - 失敗: {failure_count}")
+    if deferred_count > 0:
+        print(f"   - 次回に持ち越し: {deferred_count}")
     print("=" * 50)
 
+    # AI再分析ゲートの判定結果を表示
+    if gate:
+        gate.print_summary()
+
+    # ルールによる事前判定の結果と、省略できたAI分析の時間・費用の目安を表示
+    if prescorer:
+        # まとめて分析した呼び出しは含まれる銘柄数で数える（1銘柄あたりの実測値）
+        llm_stage = metrics.snapshot()["stages"].get(LLM, {})
+        grouped = llm_stage.get("tickers", {})
+        analyzed = (
+            llm_stage.get("calls", 0)
+            - grouped.get("count", 0)
+            + grouped.get("total", 0)
+        )
+        prescorer.print_summary(
+            llm_stage["busy_seconds"] / analyzed if analyzed else None,
+            usage_tracker.get_cost() / analyzed if analyzed else None,
+        )
+
     # OpenAI API費用サマリーを表示
     usage_tracker.print_summary()
+    if llm_cache:
+        llm_cache.print_summary(PRICING)
+
+    # ステージ別の処理時間を表示
+    metrics.print_summary()
+    print_group_summary(metrics.snapshot()["stages"].get(LLM, {}))
+
+    # レート制限による待機・429の回数を表示
+    print_rate_limit_summary()
+    for breaker in (fetch_breaker, llm_breaker):
+        if breaker and breaker.outages:
+            print(f"🔌 {breaker.describe_outages()}")
+
+    # DB接続プールのメトリクスを表示
+    if db_pool:
+        db_pool.print_summary()
+    if writer:
+        writer_stats = writer.get_stats()
+        print(
+            f"💾 書き込み: {writer_stats['written']}件 / "
+            f"{writer_stats['flushes']}回 "
+            f"(失敗{writer_stats['failed']}件, "
+            f"1件ずつの書き直し{writer_stats['fallbacks']}回)"
+        )
 
     # 失敗があった場合は終了コード1を返す
     if failure_count > 0:
@@ -0,0 +1,140 @@
+"""
+ベンチマーク・テスト用の使い捨てデータベース
+
+既存のPostgreSQLに一時スキーマを作り、prisma/migrations のSQLを順に適用する。
+接続URLに search_path を付けて渡すため、バッチ側のコードは変更せずに一時スキーマを使える。
+"""
+
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+import psycopg2
+
+# リポジトリの prisma/migrations
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "prisma" / "migrations"
+
+# ベンチマーク用の銘柄に割り当てるセクター
+SECTORS = [
+    "情報・通信業",
+    "電気機器",
+    "輸送用機器",
+    "銀行業",
+    "医薬品",
+    "小売業",
+    "化学",
+    "機械",
+]
+
+
+def schema_url(base_url: str, schema: str) -> str:
+    """
+    一時スキーマを search_path にした接続URL
+
+    Args:
+        base_url: 接続先URL
+        schema: スキーマ名
+
+    Returns:
+        str: 接続URL
+    """
+    separator = "&" if "?" in base_url else "?"
+    return f"{base_url}{separator}options=-csearch_path%3D{schema}"
+
+
+def apply_migrations(conn, migrations_dir: Path = MIGRATIONS_DIR):
+    """
+    マイグレーションのSQLを順に適用（コミットは呼び出し側）
+
+    Args:
+        conn: search_path を一時スキーマにした接続
+        migrations_dir: prisma/migrations のパス
+    """
+    with conn.cursor() as cur:
+        for path in sorted(migrations_dir.glob("*/migration.sql")):
+            # 初期マイグレーションの public スキーマ作成は不要
+            sql = path.read_text().replace('CREATE SCHEMA IF NOT EXISTS "public";', "")
+            cur.execute(sql)
+
+
+def seed_stocks(conn, count: int) -> List[str]:
+    """
+    分析対象の銘柄を登録（半分は日本株、半分は米国株。コミットは呼び出し側）
+
+    Args:
+        conn: データベース接続
+        count: 銘柄数
+
+    Returns:
+        List[str]: 登録したティッカー
+    """
+    from psycopg2.extras import execute_values
+
+    rows = []
+    for i in range(count):
+        if i % 2 == 0:
+            ticker, market = f"{1000 + i // 2}", "JP"
+        else:
+            ticker, market = f"B{i // 2:04d}", "US"
+        rows.append(
+            (
+                f"bench-{i}",
+                ticker,
+                f"ベンチマーク銘柄{i}",
+                market,
+                SECTORS[i % len(SECTORS)],
+            )
+        )
+
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO stocks (
+                id, ticker, name, market, sector, is_ai_analysis_target, updated_at
+            ) VALUES %s
+            """,
+            rows,
+            template="(%s, %s, %s, %s, %s, true, NOW())",
+            page_size=1000,
+        )
+    return [row[1] for row in rows]
+
+
+@contextmanager
+def temporary_schema(
+    base_url: str, migrations_dir: Path = MIGRATIONS_DIR
+) -> Iterator[str]:
+    """
+    マイグレーションを適用した一時スキーマを作り、終了時に削除する
+
+    Args:
+        base_url: 接続先URL（スキーマを作成できる権限が必要）
+        migrations_dir: prisma/migrations のパス
+
+    Yields:
+        str: 一時スキーマに接続するURL
+    """
+    schema = f"bench_{uuid.uuid4().hex[:12]}"
+    url = schema_url(base_url, schema)
+
+    admin = psycopg2.connect(base_url)
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f'CREATE SCHEMA "{schema}"')
+        try:
+            conn = psycopg2.connect(url)
+            try:
+                apply_migrations(conn, migrations_dir)
+                conn.commit()
+            finally:
+                conn.close()
+
+            yield url
+        finally:
+            with admin.cursor() as cur:
+                cur.execute(f'DROP SCHEMA "{schema}" CASCADE')
+    finally:
+        admin.close()
@@ -0,0 +1,385 @@
+"""
+ベンチマーク用の外部サービスの代役
+
+- FakeYahoo: yfinance の Ticker / download を置き換え、合成した株価・財務指標を返す
+  （遅延と429の発生率を指定できる）
+- FakeOpenAIServer: chat.completions 互換のHTTPサーバー（遅延とトークン数を指定できる。
+  2回目以降の同じシステムメッセージはプロンプトキャッシュに一致したとして報告する）
+- install_round_trip_counter: psycopg2 の接続を置き換え、DBへの往復回数を数える
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+
+# 合成する株価履歴の営業日数（約3ヶ月）
+HISTORY_DAYS = 63
+
+# プロンプトキャッシュが効く先頭部分の最小トークン数と、一致を数える単位（OpenAIと同じ）
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+
+class YFRateLimitError(Exception):
+    """yfinanceのレート制限エラーの代役（rate_limiter.is_rate_limit_error()が429と判定する）"""
+
+    def __init__(self):
+        super().__init__("Too Many Requests. Rate limited. Try after a while.")
+
+
+def _seed(symbol: str) -> int:
+    """シンボルから決まる乱数の種（実行ごとに同じデータを返す）"""
+    return int.from_bytes(hashlib.sha256(symbol.encode()).digest()[:4], "big")
+
+
+def synthetic_history(symbol: str, days: int = HISTORY_DAYS) -> pd.DataFrame:
+    """
+    シンボルごとに決まった乱歩の株価履歴（Ticker.history() と同じ列）
+
+    Args:
+        symbol: Yahoo Financeのシンボル
+        days: 営業日数
+
+    Returns:
+        DataFrame: Open/High/Low/Close/Volume列、タイムゾーン付きの日付インデックス
+    """
+    rng = np.random.default_rng(_seed(symbol))
+    tz = "Asia/Tokyo" if symbol.endswith(".T") else "America/New_York"
+    today = pd.Timestamp(datetime.now(timezone.utc).date())
+    index = pd.bdate_range(end=today, periods=days).tz_localize(tz)
+
+    start = 1000.0 if symbol.endswith(".T") else 100.0
+    close = start * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    open_ = close * (1 + rng.normal(0, 0.005, days))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, days))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, days))
+    volume = rng.integers(100_000, 5_000_000, days)
+
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+def synthetic_info(symbol: str) -> Dict[str, Any]:
+    """
+    シンボルごとに決まった財務指標（Ticker.info の一部）
+
+    Args:
+        symbol: Yahoo Financeのシンボル
+
+    Returns:
+        Dict: Ticker.info 形式の辞書
+    """
+    rng = random.Random(_seed(symbol))
+    close = float(synthetic_history(symbol)["Close"].iloc[-1])
+    info = {
+        "symbol": symbol,
+        "longName": f"Benchmark {symbol}",
+        "sector": "Technology",
+        "currentPrice": round(close, 2),
+        "trailingPE": round(rng.uniform(5, 40), 2),
+        "priceToBook": round(rng.uniform(0.5, 5), 2),
+        "returnOnEquity": round(rng.uniform(-0.05, 0.3), 4),
+        "dividendYield": round(rng.uniform(0, 0.05), 4),
+    }
+    # 実際の Ticker.info と同程度の大きさ（数KB）にする
+    info["longBusinessSummary"] = "Synthetic company used for benchmarks. " * 40
+    return info
+
+
+class FakeYahoo:
+    """yfinance の Ticker / download を合成データで置き換える"""
+
+    def __init__(self, latency: float = 0.0, rate_limit_ratio: float = 0.0):
+        """
+        Args:
+            latency: 1リクエストあたりの遅延（秒）
+            rate_limit_ratio: 429を返すリクエストの割合（0〜1）
+        """
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.lock = threading.Lock()
+        self.rng = random.Random(0)
+        self.requests = 0
+        self.rate_limited = 0
+        self._original: Dict[str, Any] = {}
+
+    def _request(self):
+        """1リクエスト分の遅延と429の発生"""
+        with self.lock:
+            self.requests += 1
+            limited = self.rng.random() < self.rate_limit_ratio
+            if limited:
+                self.rate_limited += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            raise YFRateLimitError()
+
+    def install(self):
+        """yfinance を置き換える"""
+        import yfinance
+
+        fake = self
+
+        class Ticker:
+            def __init__(self, symbol: str):
+                self.symbol = symbol
+
+            @property
+            def info(self) -> Dict[str, Any]:
+                fake._request()
+                return synthetic_info(self.symbol)
+
+            def history(self, period: str = "3mo", **kwargs) -> pd.DataFrame:
+                fake._request()
+                return synthetic_history(self.symbol)
+
+        def download(tickers: List[str], **kwargs) -> pd.DataFrame:
+            fake._request()
+            return pd.concat(
+                {symbol: synthetic_history(symbol) for symbol in tickers}, axis=1
+            )
+
+        self._original = {"Ticker": yfinance.Ticker, "download": yfinance.download}
+        yfinance.Ticker = Ticker
+        yfinance.download = download
+
+    def uninstall(self):
+        """yfinance を元に戻す"""
+        import yfinance
+
+        for name, value in self._original.items():
+            setattr(yfinance, name, value)
+        self._original = {}
+
+
+class FakeOpenAIServer:
+    """chat.completions 互換のHTTPサーバー（別スレッドで動かす）"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: int = 250,
+    ):
+        """
+        Args:
+            latency: 1リクエストあたりの遅延（秒）
+            prompt_tokens: 応答に含める入力トークン数（省略時はリクエストの文字数から推定）
+            completion_tokens: 応答に含める出力トークン数
+        """
+        self.latency = latency
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.seen_system_prompts = set()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """OpenAIクライアントに渡すURL（OPENAI_BASE_URL）"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """サーバーを起動（空いているポートを使う）"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                body = json.dumps(fake.completion(request)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-openai", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """サーバーを停止"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        リクエストに対する応答を作成（遅延を入れる）
+
+        Args:
+            request: chat.completions.create のリクエスト
+
+        Returns:
+            Dict: chat.completion 形式の応答
+        """
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        prompt = "".join(
+            str(message.get("content", "")) for message in request.get("messages", [])
+        )
+        prompt_tokens = self.prompt_tokens or max(len(prompt) // 2, 1)
+
+        # 以前と同じシステムメッセージ（先頭部分）はプロンプトキャッシュに一致したとみなす
+        system = "".join(
+            str(message.get("content", ""))
+            for message in request.get("messages", [])
+            if message.get("role") == "system"
+        )
+        with self.lock:
+            seen = system in self.seen_system_prompts
+            self.seen_system_prompts.add(system)
+        prefix_tokens = min(len(system) // 2, prompt_tokens)
+        cached_tokens = 0
+        if seen and prefix_tokens >= PROMPT_CACHE_MIN_TOKENS:
+            cached_tokens = prefix_tokens // PROMPT_CACHE_INCREMENT * (
+                PROMPT_CACHE_INCREMENT
+            )
+
+        # 複数銘柄をまとめた依頼にはティッカーごとの配列で答える
+        tickers = re.findall(r"- ティッカー: (\S+)", prompt)
+        analyses = [
+            {
+                "ticker": ticker,
+                "recommendation": ["Buy", "Hold", "Sell"][len(ticker) % 3],
+                "confidence_score": 50 + len(prompt) % 50,
+                "reason": "ベンチマーク用の合成された分析結果です。" * 10,
+            }
+            for ticker in tickers or [""]
+        ]
+        if '"analyses"' in prompt:
+            content = json.dumps({"analyses": analyses}, ensure_ascii=False)
+            completion_tokens = self.completion_tokens * len(analyses)
+        else:
+            analyses[0].pop("ticker")
+            content = json.dumps(analyses[0], ensure_ascii=False)
+            completion_tokens = self.completion_tokens
+        return {
+            "id": f"chatcmpl-bench-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }
+
+
+class RoundTripCounter:
+    """DBへの往復回数（SQLの実行・COPY・コミット・ロールバック）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def add(self):
+        with self.lock:
+            self.count += 1
+
+
+def install_round_trip_counter() -> RoundTripCounter:
+    """
+    psycopg2.connect を置き換え、以降に作る接続の往復回数を数える
+
+    カーソルの種類（RealDictCursorなど）は呼び出し側の指定を保ったまま数える。
+
+    Returns:
+        RoundTripCounter: 往復回数
+    """
+    counter = RoundTripCounter()
+    cursor_classes: Dict[type, type] = {}
+
+    def counting_cursor(base: type) -> type:
+        cls = cursor_classes.get(base)
+        if cls is None:
+
+            def counted(name):
+                method = getattr(base, name)
+
+                def wrapper(self, *args, **kwargs):
+                    counter.add()
+                    return method(self, *args, **kwargs)
+
+                return wrapper
+
+            cls = cursor_classes[base] = type(
+                f"Counting{base.__name__}",
+                (base,),
+                {
+                    name: counted(name)
+                    for name in ("execute", "executemany", "copy_expert", "copy_from")
+                },
+            )
+        return cls
+
+    class CountingConnection(psycopg2.extensions.connection):
+        def cursor(self, *args, **kwargs):
+            base = (
+                kwargs.get("cursor_factory")
+                or self.cursor_factory
+                or psycopg2.extensions.cursor
+            )
+            kwargs["cursor_factory"] = counting_cursor(base)
+            return super().cursor(*args, **kwargs)
+
+        def commit(self):
+            counter.add()
+            return super().commit()
+
+        def rollback(self):
+            counter.add()
+            return super().rollback()
+
+    original_connect = psycopg2.connect
+
+    def connect(*args, **kwargs):
+        kwargs.setdefault("connection_factory", CountingConnection)
+        return original_connect(*args, **kwargs)
+
+    psycopg2.connect = connect
+    return counter
@@ -0,0 +1,154 @@
+"""
+テクニカル指標の計算のベンチマーク
+
+合成した株価履歴（日本株・米国株を半数ずつ、営業日がずれるため行列には欠損が入る）で、
+1銘柄ずつ calculate_trend_indicators() を呼ぶ場合と、calculate_universe_indicators()
+で（銘柄×日）の行列にまとめて計算する場合の処理時間を比べ、結果が一致するかを確かめる。
+
+    python -m benchmarks.ta_benchmark --tickers 4000 --days 250
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fakes import synthetic_history
+from price_series import PriceSeries
+from technical_analysis import (
+    calculate_trend_indicators,
+    calculate_universe_indicators,
+)
+
+# 計測する銘柄数・営業日数（全上場銘柄・約1年分）
+DEFAULT_TICKERS = 4000
+DEFAULT_DAYS = 250
+
+# 計測の繰り返し回数（最短時間を使う）
+DEFAULT_REPEAT = 3
+
+
+def synthetic_histories(tickers: int, days: int) -> Dict[str, PriceSeries]:
+    """
+    ベンチマーク用の株価履歴
+
+    Args:
+        tickers: 銘柄数
+        days: 営業日数
+
+    Returns:
+        Dict: シンボルをキーとした株価履歴
+    """
+    symbols = [
+        f"{1000 + i}.T" if i % 2 == 0 else f"B{i:04d}" for i in range(tickers)
+    ]
+    return {
+        symbol: PriceSeries.from_frame(synthetic_history(symbol, days))
+        for symbol in symbols
+    }
+
+
+def per_ticker_indicators(
+    histories: Dict[str, PriceSeries],
+) -> Dict[str, Dict[str, float]]:
+    """1銘柄ずつ計算（計算できない銘柄は含まない）"""
+    results = {}
+    for ticker, history in histories.items():
+        try:
+            results[ticker] = calculate_trend_indicators(history)
+        except ValueError:
+            continue
+    return results
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    """repeat回実行した最短時間（秒）"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def mismatched_tickers(
+    expected: Dict[str, Dict[str, float]], actual: Dict[str, Dict[str, Any]]
+) -> List[str]:
+    """1銘柄ずつの結果と一致しない銘柄"""
+    if set(expected) != set(actual):
+        return sorted(set(expected) ^ set(actual))
+    return [
+        ticker
+        for ticker, indicators in expected.items()
+        if any(actual[ticker][name] != value for name, value in indicators.items())
+    ]
+
+
+def run(tickers: int, days: int, repeat: int) -> Dict[str, Any]:
+    """
+    1銘柄ずつの計算と行列での計算を計測
+
+    Args:
+        tickers: 銘柄数
+        days: 営業日数
+        repeat: 繰り返し回数
+
+    Returns:
+        Dict: 計測結果
+    """
+    histories = synthetic_histories(tickers, days)
+
+    per_ticker_seconds = best_time(lambda: per_ticker_indicators(histories), repeat)
+    universe_seconds = best_time(
+        lambda: calculate_universe_indicators(histories), repeat
+    )
+    mismatched = mismatched_tickers(
+        per_ticker_indicators(histories), calculate_universe_indicators(histories)
+    )
+
+    return {
+        "tickers": tickers,
+        "days": days,
+        "per_ticker_seconds": round(per_ticker_seconds, 4),
+        "universe_seconds": round(universe_seconds, 4),
+        "speedup": round(per_ticker_seconds / universe_seconds, 1),
+        "mismatched": mismatched,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="テクニカル指標の計算のベンチマーク")
+    parser.add_argument("--tickers", type=int, default=DEFAULT_TICKERS)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--output", help="計測結果を出力するJSONファイル")
+    args = parser.parse_args(argv)
+
+    print(f"⏱️  {args.tickers}銘柄 × {args.days}日を計測中...")
+    result = run(args.tickers, args.days, args.repeat)
+
+    print("\n" + "=" * 50)
+    print("🏁 テクニカル指標の計算")
+    print("=" * 50)
+    print(f"1銘柄ずつ: {result['per_ticker_seconds']:.3f}秒")
+    print(
+        f"行列で一括: {result['universe_seconds']:.3f}秒 "
+        f"({result['speedup']:.1f}倍)"
+    )
+    print("=" * 50)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"📝 計測結果を出力しました: {args.output}")
+
+    if result["mismatched"]:
+        print(f"❌ 結果が一致しない銘柄: {', '.join(result['mismatched'][:10])}")
+        sys.exit(1)
+    print("✅ 1銘柄ずつの計算と結果が一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+上流障害向けのサーキットブレーカー
+
+Yahoo Finance や OpenAI の障害時に、各銘柄がそれぞれリトライを使い切るのを防ぐ。
+直近の呼び出しの失敗率が閾値を超えたら回路を開いてステージ全体を一時停止し、
+クールダウン後に少数の試行（半開）で復旧を確認する。
+障害が上限時間を超えて続いた場合は以降の呼び出しを即時失敗させ、実行を早く終わらせる。
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+# 回路の状態
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 回路を開く失敗率
+DEFAULT_FAILURE_THRESHOLD = 0.5
+
+# 失敗率を判定する直近の呼び出し数（これ未満では開かない）
+DEFAULT_WINDOW_SIZE = 20
+DEFAULT_MIN_CALLS = 10
+
+# 回路を開いてから試行を再開するまでの秒数
+DEFAULT_COOLDOWN = 30.0
+
+# 半開状態で復旧とみなすのに必要な試行の成功数
+DEFAULT_HALF_OPEN_PROBES = 2
+
+# 障害がこの秒数続いたら以降の呼び出しを即時失敗させる
+DEFAULT_MAX_OUTAGE = 600.0
+
+
+class CircuitOpenError(Exception):
+    """上流の障害が続いているため呼び出しを中止した"""
+
+
+class CircuitBreaker:
+    """実行全体で共有するサーキットブレーカー（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: float = DEFAULT_FAILURE_THRESHOLD,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        cooldown: float = DEFAULT_COOLDOWN,
+        half_open_probes: int = DEFAULT_HALF_OPEN_PROBES,
+        max_outage: float = DEFAULT_MAX_OUTAGE,
+    ):
+        """
+        Args:
+            name: 上流の名前（ログ・障害記録用）
+            failure_threshold: 回路を開く失敗率（0〜1）
+            window_size: 失敗率を判定する直近の呼び出し数
+            min_calls: 回路を開く判定に必要な最低呼び出し数
+            cooldown: 回路を開いてから試行を再開するまでの秒数
+            half_open_probes: 復旧とみなすのに必要な試行の成功数
+            max_outage: 即時失敗に切り替えるまでの障害の継続秒数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min(min_calls, window_size)
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.max_outage = max_outage
+        self.cond = threading.Condition()
+
+        self.state = CLOSED
+        self.outcomes: Deque[bool] = deque(maxlen=window_size)
+        self.opened_at = 0.0  # 直近に回路を開いた時刻（monotonic）
+        self.outage_started_at = 0.0  # 障害の開始時刻（monotonic）
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.aborted = False
+
+        # 障害の記録（started_at / ended_at はUTC。復旧しなかった場合ended_atはNone）
+        self.outages: List[Dict[str, Any]] = []
+        self.rejected = 0
+
+    def before_call(self):
+        """
+        呼び出し前に回路の状態を確認
+
+        回路が開いている間はクールダウンが終わるまで待機し（ステージの一時停止）、
+        半開状態では試行の枠が空くまで待機する。
+
+        Raises:
+            CircuitOpenError: 障害が上限時間を超えて続いている場合
+        """
+        with self.cond:
+            while True:
+                if self.aborted:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"{self.name}の障害が{self.max_outage:.0f}秒以上続いています"
+                    )
+
+                if self.state == CLOSED:
+                    return
+
+                now = time.monotonic()
+                outage_left = self.outage_started_at + self.max_outage - now
+                if outage_left <= 0:
+                    self._abort()
+                    continue
+
+                if self.state == OPEN:
+                    cooldown_left = self.opened_at + self.cooldown - now
+                    if cooldown_left <= 0:
+                        self.state = HALF_OPEN
+                        self.probes_in_flight = 0
+                        self.probe_successes = 0
+                        print(f"🔌 {self.name}: 復旧を確認中（半開）")
+                        continue
+                    self.cond.wait(min(cooldown_left, outage_left))
+                    continue
+
+                # 半開: 試行の枠が空いていれば通し、なければ結果を待つ
+                if self.probes_in_flight < self.half_open_probes:
+                    self.probes_in_flight += 1
+                    return
+                self.cond.wait(min(self.cooldown, outage_left))
+
+    def record_success(self):
+        """呼び出しの成功を記録"""
+        with self.cond:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self._close()
+            elif self.state == CLOSED:
+                self.outcomes.append(True)
+
+    def record_failure(self):
+        """呼び出しの失敗を記録（失敗率が閾値を超えたら回路を開く）"""
+        with self.cond:
+            if self.state == HALF_OPEN:
+                # 試行が失敗したらクールダウンからやり直す
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                print(f"🔌 {self.name}: 復旧していません（{self.cooldown:.0f}秒後に再確認）")
+                self.cond.notify_all()
+            elif self.state == CLOSED:
+                self.outcomes.append(False)
+                failures = self.outcomes.count(False)
+                if (
+                    len(self.outcomes) >= self.min_calls
+                    and failures / len(self.outcomes) >= self.failure_threshold
+                ):
+                    self._open()
+
+    def _open(self):
+        """回路を開いて障害の記録を開始（ロック取得済みで呼ぶ）"""
+        now = time.monotonic()
+        self.state = OPEN
+        self.opened_at = now
+        self.outage_started_at = now
+        self.outages.append(
+            {"started_at": datetime.now(timezone.utc), "ended_at": None}
+        )
+        print(
+            f"🔌 {self.name}: 失敗率が{self.failure_threshold:.0%}を超えたため"
+            f"{self.cooldown:.0f}秒間停止します"
+        )
+
+    def _close(self):
+        """回路を閉じて障害の記録を終了（ロック取得済みで呼ぶ）"""
+        self.state = CLOSED
+        self.outcomes.clear()
+        self.outages[-1]["ended_at"] = datetime.now(timezone.utc)
+        print(f"✅ {self.name}: 復旧しました")
+        self.cond.notify_all()
+
+    def _abort(self):
+        """以降の呼び出しを即時失敗させる（ロック取得済みで呼ぶ）"""
+        self.aborted = True
+        self.state = OPEN
+        print(
+            f"❌ {self.name}: 障害が{self.max_outage:.0f}秒続いたため、"
+            "以降の呼び出しを中止します"
+        )
+        self.cond.notify_all()
+
+    def describe_outages(self) -> Optional[str]:
+        """
+        障害の期間をバッチジョブログ用の文字列にする
+
+        Returns:
+            str: 例 "Yahoo Finance障害 01:02:03〜01:05:10 UTC"（障害がなければNone）
+        """
+        with self.cond:
+            if not self.outages:
+                return None
+
+            windows = []
+            for outage in self.outages:
+                started = outage["started_at"].strftime("%H:%M:%S")
+                if outage["ended_at"] is not None:
+                    ended = outage["ended_at"].strftime("%H:%M:%S")
+                elif self.aborted:
+                    ended = "（中止）"
+                else:
+                    ended = "（未復旧）"
+                windows.append(f"{started}〜{ended}")
+            return f"{self.name}障害 {', '.join(windows)} UTC"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """メトリクスを取得"""
+        with self.cond:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "trips": len(self.outages),
+                "rejected": self.rejected,
+                "aborted": self.aborted,
+            }
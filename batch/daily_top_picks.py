@@ -11,15 +11,16 @@ from typing import List, Dict
 import json
 import requests
 
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
+from db_pool import ConnectionPool, get_database_url
+
 # .env読み込み
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(env_path)
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_URL = get_database_url()
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
 
 
@@ -175,32 +176,33 @@ def main():
         print("❌ SLACK_WEBHOOK_URLが設定されていません")
         sys.exit(1)
 
-    conn = None
+    db_pool = None
     try:
         # データベース接続
-        conn = psycopg2.connect(DATABASE_URL)
-        print("✅ データベース接続成功\n")
+        db_pool = ConnectionPool(DATABASE_URL, maxconn=1)
+        with db_pool.connection() as conn:
+            print("✅ データベース接続成功\n")
 
-        # 上位3銘柄を取得
-        top_picks = get_top_picks(conn)
-        print(f"📋 取得した銘柄: {len(top_picks)}件\n")
+            # 上位3銘柄を取得
+            top_picks = get_top_picks(conn)
+            print(f"📋 取得した銘柄: {len(top_picks)}件\n")
 
-        if len(top_picks) < 3:
-            print("⚠️ 十分な分析結果が見つかりませんでした")
-            sys.exit(0)
+            if len(top_picks) < 3:
+                print("⚠️ 十分な分析結果が見つかりませんでした")
+                sys.exit(0)
 
-        # 投稿テンプレート生成
-        template = generate_tweet_template(top_picks)
-        print("📝 投稿テンプレート:\n")
-        print(template)
-        print("\n")
+            # 投稿テンプレート生成
+            template = generate_tweet_template(top_picks)
+            print("📝 投稿テンプレート:\n")
+            print(template)
+            print("\n")
 
-        # Slackに送信
-        send_to_slack(SLACK_WEBHOOK_URL, template)
+            # Slackに送信
+            send_to_slack(SLACK_WEBHOOK_URL, template)
 
-        print("\n" + "=" * 50)
-        print("✅ 処理完了")
-        print("=" * 50)
+            print("\n" + "=" * 50)
+            print("✅ 処理完了")
+            print("=" * 50)
 
     except Exception as e:
         print(f"\n❌ エラーが発生しました: {e}")
@@ -210,8 +212,8 @@ def main():
         sys.exit(1)
 
     finally:
-        if conn:
-            conn.close()
+        if db_pool:
+            db_pool.closeall()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+"""
+データベース接続プール
+
+psycopg2 の ThreadedConnectionPool をラップし、以下を追加する:
+- 上限到達時は PoolError にせず空きが出るまで待機
+- 返却された接続は maxconn 本まで保持して再利用（psycopg2 は minconn 本を超えると閉じる）
+- チェックアウト時のヘルスチェック（一定時間アイドルだった接続のみ SELECT 1）
+- プール待ち時間などのメトリクス
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+# この秒数以上アイドルだった接続はチェックアウト時に疎通確認する
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+
+
+def get_database_url(default: Optional[str] = None) -> Optional[str]:
+    """
+    DATABASE_URLを取得し、psycopg2非対応のパラメータを削除
+
+    Args:
+        default: 環境変数が未設定の場合の接続先
+
+    Returns:
+        str: psycopg2で接続可能なURL（未設定の場合はNone）
+    """
+    url = os.getenv("DATABASE_URL", default)
+    if not url:
+        return url
+
+    # URLをパース
+    parsed = urlparse(url)
+
+    # クエリパラメータをパース
+    query_params = parse_qs(parsed.query)
+
+    # pgbouncerパラメータを削除（Prisma用のパラメータでlibpqは受け付けない）
+    if "pgbouncer" in query_params:
+        del query_params["pgbouncer"]
+
+    # 新しいクエリ文字列を構築
+    new_query = urlencode(query_params, doseq=True)
+
+    # URLを再構築
+    return urlunparse(parsed._replace(query=new_query))
+
+
+class ConnectionPool:
+    """スレッドセーフな接続プール（待機・ヘルスチェック・メトリクス付き）"""
+
+    def __init__(
+        self,
+        dsn: str,
+        maxconn: int,
+        minconn: int = 1,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+    ):
+        """
+        Args:
+            dsn: 接続先URL
+            maxconn: 最大接続数（ワーカー数に合わせる）
+            minconn: 起動時に確立しておく接続数
+            health_check_interval: この秒数以上アイドルだった接続を疎通確認する
+        """
+        if maxconn < 1:
+            raise ValueError("maxconnは1以上を指定してください")
+
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self._pool = ThreadedConnectionPool(min(minconn, maxconn), maxconn, dsn)
+        # psycopg2 は返却時にアイドル接続が minconn 本あると閉じるため、起動時に
+        # 確立する本数とは別に maxconn 本まで保持させる（同時に借りても張り直さない）
+        self._pool.minconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._open: Set[int] = set()
+        self._last_used: Dict[int, float] = {}
+        self.lock = threading.Lock()
+
+        # メトリクス
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.reconnects = 0
+        self.opened = 0
+        self.closed = 0
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        接続をチェックアウトし、ブロック終了時にプールへ返却する
+
+        返却時に未確定のトランザクションはロールバックされる。
+
+        Yields:
+            接続（psycopg2のconnection）
+        """
+        started = time.perf_counter()
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            wait = time.perf_counter() - started
+            with self.lock:
+                self.checkouts += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            yield conn
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    def _checkout(self):
+        """プールから健全な接続を取り出す"""
+        conn = self._getconn()
+        if self._is_healthy(conn):
+            return conn
+
+        # 切断・異常な接続は破棄して張り直す
+        self._putconn(conn, close=True)
+        with self.lock:
+            self.reconnects += 1
+        return self._getconn()
+
+    def _checkin(self, conn):
+        """接続をプールに返却"""
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+
+        self._putconn(conn, close=broken)
+
+    def _getconn(self):
+        """プールから接続を取り出す（初めて使う接続は新規に開いた接続として数える）"""
+        conn = self._pool.getconn()
+        with self.lock:
+            if id(conn) not in self._open:
+                self._open.add(id(conn))
+                self.opened += 1
+        return conn
+
+    def _putconn(self, conn, close: bool):
+        """
+        接続をプールに戻す
+
+        psycopg2 が閉じた接続（close 指定・サーバー切断）は記録から外す。
+        閉じた接続と同じ id() の新しい接続が疎通確認を省略しないようにするため。
+        """
+        self._pool.putconn(conn, close=close)
+        with self.lock:
+            if conn.closed:
+                self._open.discard(id(conn))
+                self._last_used.pop(id(conn), None)
+                self.closed += 1
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+
+    def _is_healthy(self, conn) -> bool:
+        """接続が使用可能か確認（最近使った接続は確認を省略）"""
+        if conn.closed:
+            return False
+
+        with self.lock:
+            last_used = self._last_used.get(id(conn))
+        if (
+            last_used is not None
+            and time.monotonic() - last_used < self.health_check_interval
+        ):
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """メトリクスを取得"""
+        with self.lock:
+            return {
+                "max_connections": self.maxconn,
+                "checkouts": self.checkouts,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "avg_wait_ms": round(
+                    self.total_wait / self.checkouts * 1000 if self.checkouts else 0,
+                    2,
+                ),
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "reconnects": self.reconnects,
+                "opened_connections": self.opened,
+                "closed_connections": self.closed,
+            }
+
+    def print_summary(self):
+        """メトリクスのサマリーを表示"""
+        stats = self.get_stats()
+        print("\n" + "=" * 50)
+        print("🔌 DB接続プールサマリー")
+        print("=" * 50)
+        print(f"🔢 最大接続数: {stats['max_connections']}")
+        print(f"📤 チェックアウト数: {stats['checkouts']:,}")
+        print(
+            f"⏳ プール待ち時間: 平均 {stats['avg_wait_ms']}ms / "
+            f"最大 {stats['max_wait_ms']}ms"
+        )
+        print(f"🔁 再接続数: {stats['reconnects']}")
+        print(
+            f"🔓 接続の新規作成: {stats['opened_connections']} / "
+            f"切断: {stats['closed_connections']}"
+        )
+        print("=" * 50)
+
+    def closeall(self):
+        """すべての接続を閉じる"""
+        self._pool.closeall()
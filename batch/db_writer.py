@@ -0,0 +1,176 @@
+"""
+書き込みバッファ（write-behind）
+
+処理が終わった銘柄の結果をためておき、N件ごと・T秒ごとにまとめて1トランザクションで
+書き込む。銘柄ごとに SELECT → UPDATE/INSERT → COMMIT していた往復を数十回に減らす。
+バッチ全体の書き込みが失敗した場合は1件ずつ書き直し、原因の行だけを失敗として切り分ける。
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# この件数たまったら書き込む
+DEFAULT_BATCH_SIZE = 50
+
+# 件数がたまらなくてもこの秒数ごとに書き込む
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class BatchWriter:
+    """N件ごと・T秒ごとにまとめてコミットする書き込みバッファ"""
+
+    def __init__(
+        self,
+        db_pool,
+        write_func: Callable[[Any, List[Any]], None],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        """
+        Args:
+            db_pool: DB接続プール（connection()で接続を借りられるもの）
+            write_func: 書き込み関数 write_func(conn, items)。コミットはこちらで行う
+            batch_size: この件数たまったら書き込む
+            flush_interval: 件数に関係なく書き込む間隔（秒）
+        """
+        if batch_size < 1:
+            raise ValueError("batch_sizeは1以上を指定してください")
+        if flush_interval <= 0:
+            raise ValueError("flush_intervalは0より大きい値を指定してください")
+
+        self.db_pool = db_pool
+        self.write_func = write_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.pending: List[Tuple[Any, Optional[Callable[[bool], None]]]] = []
+        self.lock = threading.Lock()
+        # 書き込みは1本ずつ（接続を1つしか使わない）
+        self.flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+
+        # メトリクス
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+        self.fallbacks = 0
+
+    def __enter__(self) -> "BatchWriter":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """一定間隔で書き込むスレッドを開始"""
+        if self._timer is not None:
+            return
+        self._stop.clear()
+        self._timer = threading.Thread(
+            target=self._run_timer, name="batch-writer", daemon=True
+        )
+        self._timer.start()
+
+    def close(self):
+        """タイマーを止め、残っている分をすべて書き込む"""
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+        self.flush()
+
+    def add(self, item: Any, on_result: Optional[Callable[[bool], None]] = None):
+        """
+        書き込み対象を追加（batch_size件たまったらその場で書き込む）
+
+        Args:
+            item: write_funcに渡す書き込み対象
+            on_result: 書き込み後に成否(bool)を受け取るコールバック
+        """
+        with self.lock:
+            self.pending.append((item, on_result))
+            full = len(self.pending) >= self.batch_size
+
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        たまっている分をまとめて書き込む
+
+        Returns:
+            int: 書き込みに成功した件数
+        """
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+
+            items = [item for item, _ in batch]
+            try:
+                with self.db_pool.connection() as conn:
+                    results = self._write(conn, items)
+            except Exception as e:
+                print(f"❌ 書き込み用のDB接続エラー ({len(items)}件): {e}")
+                results = [False] * len(items)
+
+            succeeded = sum(results)
+            with self.lock:
+                self.flushes += 1
+                self.written += succeeded
+                self.failed += len(results) - succeeded
+
+        for (_, on_result), ok in zip(batch, results):
+            if on_result:
+                on_result(ok)
+
+        return succeeded
+
+    def _write(self, conn, items: List[Any]) -> List[bool]:
+        """1トランザクションで書き込み、失敗したら1件ずつ書き直す"""
+        try:
+            self.write_func(conn, items)
+            conn.commit()
+            return [True] * len(items)
+        except Exception as e:
+            conn.rollback()
+            if len(items) == 1:
+                print(f"❌ DB保存エラー: {e}")
+                return [False]
+            print(f"⚠️ 一括書き込み失敗 ({len(items)}件) - 1件ずつ書き直します: {e}")
+
+        with self.lock:
+            self.fallbacks += 1
+
+        results = []
+        for item in items:
+            try:
+                self.write_func(conn, [item])
+                conn.commit()
+                results.append(True)
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ DB保存エラー: {e}")
+                results.append(False)
+        return results
+
+    def _run_timer(self):
+        """flush_intervalごとに書き込む"""
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ 定期書き込みエラー: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """メトリクスを取得"""
+        with self.lock:
+            return {
+                "flushes": self.flushes,
+                "written": self.written,
+                "failed": self.failed,
+                "fallbacks": self.fallbacks,
+            }
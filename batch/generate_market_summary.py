@@ -6,6 +6,7 @@ OpenAI APIを使って朝・夜の投稿内容を生成
 
 import os
 import sys
+import time
 from datetime import datetime
 import json
 import requests
@@ -13,6 +14,16 @@ from dotenv import load_dotenv
 import yfinance as yf
 from openai import OpenAI
 
+from rate_limiter import (
+    acquire_openai,
+    backoff_seconds,
+    report_error,
+    report_openai_error,
+    settle_openai,
+    wait_before_retry,
+    yahoo_limiter,
+)
+
 # .env読み込み
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(env_path)
@@ -30,8 +41,6 @@ def get_market_data():
     Returns:
         Dict: 市況データ（日経平均、米国市場）
     """
-    import time
-
     def fetch_ticker_data(ticker_symbol, name, max_retries=3):
         """
         ティッカーデータを取得（リトライ機能付き）
@@ -52,20 +61,25 @@ def get_market_data():
                 )
                 ticker = yf.Ticker(ticker_symbol)
                 # 1ヶ月分取得してより確実に
+                yahoo_limiter.acquire()
                 data = ticker.history(period="1mo")
+                yahoo_limiter.on_success()
 
                 if len(data) >= 2:
                     print(f"  ✅ {name}: {len(data)}日分のデータを取得")
                     return data
                 else:
                     print(f"  ⚠️ {name}: データが不足 " f"({len(data)}日分)")
+                    if attempt < max_retries - 1:
+                        time.sleep(backoff_seconds(attempt))
 
             except Exception as e:
                 print(f"  ⚠️ {name}取得エラー " f"(試行 {attempt + 1}): {e}")
-
-            # 最後の試行でなければ待機
-            if attempt < max_retries - 1:
-                time.sleep(2)
+                # 429の場合はレートを下げて共有のバケットで待機、それ以外はバックオフ
+                if attempt < max_retries - 1:
+                    wait_before_retry(e, attempt, yahoo_limiter)
+                else:
+                    report_error(e, yahoo_limiter)
 
         return None
 
@@ -142,22 +156,26 @@ X投稿用に生成してください。
 - ハッシュタグは含めない（後で追加する）
 - 投資助言にならないよう注意（「見込み」「予想」など柔らかい表現）"""
 
+    request = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {
+                "role": "system",
+                "content": (
+                    "あなたは日本株市場の専門家です。"
+                    "簡潔で分かりやすい市況サマリーを作成してください。"
+                ),
+            },
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.7,
+        "max_tokens": 200,
+    }
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "あなたは日本株市場の専門家です。"
-                        "簡潔で分かりやすい市況サマリーを作成してください。"
-                    ),
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=200,
-        )
+        estimated_tokens = acquire_openai(request)
+        response = client.chat.completions.create(**request)
+        settle_openai(estimated_tokens, response.usage)
 
         summary = response.choices[0].message.content.strip()
         # URLとハッシュタグを追加（URL→ハッシュタグの順）
@@ -166,6 +184,7 @@ X投稿用に生成してください。
 
         return summary
     except Exception as e:
+        report_openai_error(e)
         print(f"AI生成エラー: {e}")
         return None
 
@@ -199,22 +218,26 @@ X投稿用に生成してください。
 - ハッシュタグは含めない（後で追加する）
 - 投資助言にならないよう注意"""
 
+    request = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {
+                "role": "system",
+                "content": (
+                    "あなたは日本株市場の専門家です。"
+                    "簡潔で分かりやすい市況振り返りを作成してください。"
+                ),
+            },
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.7,
+        "max_tokens": 200,
+    }
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "あなたは日本株市場の専門家です。"
-                        "簡潔で分かりやすい市況振り返りを作成してください。"
-                    ),
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=200,
-        )
+        estimated_tokens = acquire_openai(request)
+        response = client.chat.completions.create(**request)
+        settle_openai(estimated_tokens, response.usage)
 
         summary = response.choices[0].message.content.strip()
         # URLとハッシュタグを追加（URL→ハッシュタグの順）
@@ -223,6 +246,7 @@ X投稿用に生成してください。
 
         return summary
     except Exception as e:
+        report_openai_error(e)
         print(f"AI生成エラー: {e}")
         return None
 
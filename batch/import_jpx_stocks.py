@@ -3,16 +3,15 @@
 JPX公式サイトから全銘柄リストを取得してデータベースに登録するスクリプト
 """
 
-import os
 import sys
 import requests
 import pandas as pd
-import psycopg2
 from datetime import datetime
 from io import BytesIO
-from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 import uuid
 
+from db_pool import ConnectionPool, get_database_url
+
 # 色付き出力
 class Colors:
     GREEN = '\033[0;32m'
@@ -27,28 +26,7 @@ def print_color(color, message):
 JPX_URL = "https://www.jpx.co.jp/markets/statistics-equities/misc/tvdivq0000001vg2-att/data_j.xls"
 
 # データベース接続情報（環境変数から取得、ローカル環境の場合はデフォルト値を使用）
-def get_database_url():
-    """DATABASE_URLを取得し、psycopg2非対応のパラメータを削除"""
-    url = os.getenv('DATABASE_URL', 'postgresql://kouheikameyama@localhost:5432/stock_analyzer_dev')
-
-    # URLをパース
-    parsed = urlparse(url)
-
-    # クエリパラメータをパース
-    query_params = parse_qs(parsed.query)
-
-    # pgbouncerパラメータを削除
-    if 'pgbouncer' in query_params:
-        del query_params['pgbouncer']
-
-    # 新しいクエリ文字列を構築
-    new_query = urlencode(query_params, doseq=True)
-
-    # URLを再構築
-    new_parsed = parsed._replace(query=new_query)
-    return urlunparse(new_parsed)
-
-DATABASE_URL = get_database_url()
+DATABASE_URL = get_database_url('postgresql://kouheikameyama@localhost:5432/stock_analyzer_dev')
 
 def download_jpx_data():
     """JPXから銘柄リストをダウンロード"""
@@ -90,70 +68,71 @@ def import_to_database(df):
     """データベースに銘柄を登録"""
     print_color(Colors.YELLOW, "3. データベースに登録中...")
 
+    db_pool = None
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-
-        inserted = 0
-        updated = 0
-        skipped = 0
-
-        for _, row in df.iterrows():
-            # 証券コード（4桁の数字）
-            ticker = str(row['コード']).strip()
-
-            # 銘柄名
-            name = row['銘柄名'].strip()
-
-            # 33業種コード・33業種区分から業種を取得
-            sector = row.get('33業種区分', None)
-            if pd.isna(sector):
-                sector = None
-
-            # 既存データを確認
-            cur.execute("SELECT id FROM stocks WHERE ticker = %s", (ticker,))
-            existing = cur.fetchone()
-
-            if existing:
-                # 既存データを更新
-                cur.execute("""
-                    UPDATE stocks SET
-                        name = %s,
-                        sector = %s,
-                        updated_at = NOW()
-                    WHERE ticker = %s
-                """, (name, sector, ticker))
-                updated += 1
-            else:
-                # 新規登録（UUIDを生成）
-                new_id = str(uuid.uuid4())
-                cur.execute("""
-                    INSERT INTO stocks (
-                        id,
-                        ticker,
-                        name,
-                        market,
-                        sector,
-                        is_ai_analysis_target,
-                        created_at,
-                        updated_at
-                    ) VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-                """, (new_id, ticker, name, 'JP', sector, False))
-                inserted += 1
-
-        conn.commit()
-
-        print_color(Colors.GREEN, f"   ✓ 新規登録: {inserted}件")
-        print_color(Colors.GREEN, f"   ✓ 更新: {updated}件")
-        print_color(Colors.GREEN, f"   ✓ 合計: {inserted + updated}件")
-
-        cur.close()
-        conn.close()
+        db_pool = ConnectionPool(DATABASE_URL, maxconn=1)
+        with db_pool.connection() as conn, conn.cursor() as cur:
+            inserted = 0
+            updated = 0
+            skipped = 0
+
+            for _, row in df.iterrows():
+                # 証券コード（4桁の数字）
+                ticker = str(row['コード']).strip()
+
+                # 銘柄名
+                name = row['銘柄名'].strip()
+
+                # 33業種コード・33業種区分から業種を取得
+                sector = row.get('33業種区分', None)
+                if pd.isna(sector):
+                    sector = None
+
+                # 既存データを確認
+                cur.execute("SELECT id FROM stocks WHERE ticker = %s", (ticker,))
+                existing = cur.fetchone()
+
+                if existing:
+                    # 既存データを更新
+                    cur.execute("""
+                        UPDATE stocks SET
+                            name = %s,
+                            sector = %s,
+                            updated_at = NOW()
+                        WHERE ticker = %s
+                    """, (name, sector, ticker))
+                    updated += 1
+                else:
+                    # 新規登録（UUIDを生成）
+                    new_id = str(uuid.uuid4())
+                    cur.execute("""
+                        INSERT INTO stocks (
+                            id,
+                            ticker,
+                            name,
+                            market,
+                            sector,
+                            is_ai_analysis_target,
+                            created_at,
+                            updated_at
+                        ) VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
+                    """, (new_id, ticker, name, 'JP', sector, False))
+                    inserted += 1
+
+            conn.commit()
+
+            print_color(Colors.GREEN, f"   ✓ 新規登録: {inserted}件")
+            print_color(Colors.GREEN, f"   ✓ 更新: {updated}件")
+            print_color(Colors.GREEN, f"   ✓ 合計: {inserted + updated}件")
 
     except Exception as e:
         print_color(Colors.RED, f"   ✗ 登録失敗: {e}")
         sys.exit(1)
 
+    finally:
+        if db_pool:
+            db_pool.closeall()
+
 def main():
     print_color(Colors.YELLOW, "=" * 60)
     print_color(Colors.YELLOW, "JPX全銘柄リスト取得・登録")
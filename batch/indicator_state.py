@@ -0,0 +1,342 @@
+"""
+テクニカル指標の逐次更新（銘柄ごとの計算状態の保存）
+
+SMA・Wilder平滑化のRSIは直前の状態と新しい終値だけで次の値が決まる。銘柄ごとに
+直近26本の終値（25日移動平均とその前日分）・上昇幅/下落幅の平滑平均・最新バーの日時を
+indicator_states に保存しておき、次回は新しいバーの分だけ進める（履歴の長さによらず
+1バーあたり一定の計算量）。最新バーと同じ日時のバーは置き換えるため、場中に何度
+更新してもよい。
+
+状態がない・保存済みの終値と株価履歴が食い違う（株式分割・配当による遡及調整）・
+状態の最新バーが株価履歴の範囲外の場合は、株価履歴の全体から計算し直す。
+RSIは状態を作った時点の最初のバーから平滑化を続けるため、直近3ヶ月分から毎回
+計算し直す calculate_trend_indicators() とは初期値の影響（14日平滑で3ヶ月後に1%未満）
+だけ値が異なる。
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from psycopg2.extras import RealDictCursor
+
+from price_series import PriceSeries
+
+# 移動平均の期間とRSIの期間（technical_analysis.calculate_trend_indicators() と同じ）
+SHORT_WINDOW = 5
+LONG_WINDOW = 25
+RSI_WINDOW = 14
+
+# 保存する終値の本数（25日移動平均の当日分と前日分）
+CLOSE_WINDOW = LONG_WINDOW + 1
+
+# 保存済みの終値と株価履歴を照合する際の許容誤差（比率）
+RECONCILE_TOLERANCE = 1e-9
+
+
+class IndicatorState:
+    """1銘柄分の指標の計算状態"""
+
+    __slots__ = (
+        "last_date",
+        "bars",
+        "closes",
+        "avg_gain",
+        "avg_loss",
+        "prev_avg_gain",
+        "prev_avg_loss",
+    )
+
+    def __init__(
+        self,
+        last_date: Optional[datetime] = None,
+        bars: int = 0,
+        closes: Optional[List[float]] = None,
+        avg_gain: float = 0.0,
+        avg_loss: float = 0.0,
+        prev_avg_gain: float = 0.0,
+        prev_avg_loss: float = 0.0,
+    ):
+        """
+        Args:
+            last_date: 最新バーの日時（タイムゾーンなしのUTC）
+            bars: これまでに取り込んだバー数
+            closes: 直近の終値（最大 CLOSE_WINDOW 本、最後が最新バー）
+            avg_gain: 最新バーまでの上昇幅の平滑平均
+            avg_loss: 最新バーまでの下落幅の平滑平均
+            prev_avg_gain: 最新バーの前までの上昇幅の平滑平均（最新バーの置き換え用）
+            prev_avg_loss: 最新バーの前までの下落幅の平滑平均（最新バーの置き換え用）
+        """
+        self.last_date = last_date
+        self.bars = bars
+        self.closes = list(closes or [])
+        self.avg_gain = avg_gain
+        self.avg_loss = avg_loss
+        self.prev_avg_gain = prev_avg_gain
+        self.prev_avg_loss = prev_avg_loss
+
+    @classmethod
+    def from_history(cls, history: PriceSeries) -> "IndicatorState":
+        """
+        株価履歴の全体から計算（状態がない場合・照合に失敗した場合）
+
+        Args:
+            history: 日付順の株価履歴
+
+        Returns:
+            IndicatorState: 最新バーまで進めた状態
+        """
+        state = cls()
+        for position, close in enumerate(history.close.tolist()):
+            state.advance(history.date_at(position), close)
+        return state
+
+    def advance(self, date: datetime, close: float):
+        """
+        1本分進める（最新バーと同じ日時なら置き換える）
+
+        Args:
+            date: バーの日時（タイムゾーンなしのUTC）
+            close: 終値
+
+        Raises:
+            ValueError: 最新バーより古い日時の場合
+        """
+        if self.last_date is not None and date < self.last_date:
+            raise ValueError(f"最新バー（{self.last_date}）より古いバー: {date}")
+
+        if self.last_date is not None and date == self.last_date:
+            # 場中の再取得などで最新バーが更新された場合は最新バーの前から計算し直す
+            self.closes.pop()
+        else:
+            self.bars += 1
+            self.prev_avg_gain = self.avg_gain
+            self.prev_avg_loss = self.avg_loss
+
+        # 前日比（最初のバーは上昇・下落とも0、technical_analysis.rsi() と同じ）
+        change = close - self.closes[-1] if self.closes else 0.0
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        if self.bars == 1:
+            self.avg_gain, self.avg_loss = gain, loss
+        else:
+            self.avg_gain = _wilder_step(self.prev_avg_gain, gain)
+            self.avg_loss = _wilder_step(self.prev_avg_loss, loss)
+
+        self.closes.append(close)
+        del self.closes[:-CLOSE_WINDOW]
+        self.last_date = date
+
+    def indicators(self) -> Optional[Dict[str, Any]]:
+        """
+        現在の指標
+
+        Returns:
+            Dict: calculate_trend_indicators() と同じ形の辞書
+                （golden_cross / dead_cross を追加。26本に満たない場合はNone）
+        """
+        if self.bars < CLOSE_WINDOW or len(self.closes) < CLOSE_WINDOW:
+            return None
+
+        closes = np.array(self.closes)
+        sma_5 = float(closes[-SHORT_WINDOW:].mean())
+        sma_25 = float(closes[-LONG_WINDOW:].mean())
+        previous_sma_5 = float(closes[-SHORT_WINDOW - 1 : -1].mean())
+        previous_sma_25 = float(closes[-LONG_WINDOW - 1 : -1].mean())
+        if self.avg_loss == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + self.avg_gain / self.avg_loss))
+
+        return {
+            "sma_5": sma_5,
+            "sma_25": sma_25,
+            "rsi": rsi,
+            "current_price": self.closes[-1],
+            "previous_sma_5": previous_sma_5,
+            "previous_sma_25": previous_sma_25,
+            "golden_cross": previous_sma_5 <= previous_sma_25 and sma_5 > sma_25,
+            "dead_cross": previous_sma_5 >= previous_sma_25 and sma_5 < sma_25,
+        }
+
+
+def _wilder_step(average: float, value: float) -> float:
+    """Wilderの平滑化を1本分進める（technical_analysis.wilder_average() と同じ式）"""
+    if average == value:
+        return average
+    alpha = 1 / RSI_WINDOW
+    old_weight = 1 - alpha
+    return (old_weight * average + alpha * value) / (old_weight + alpha)
+
+
+def update_state(
+    state: Optional[IndicatorState], history: PriceSeries
+) -> Tuple[IndicatorState, bool]:
+    """
+    保存済みの状態を株価履歴の新しいバーの分だけ進める
+
+    Args:
+        state: 保存済みの状態（ない場合はNone）
+        history: 日付順の株価履歴（保存済みバーと新規取得バーを結合したもの）
+
+    Returns:
+        Tuple: (最新バーまで進めた状態, 全体から計算し直したか)
+    """
+    if state is None or state.last_date is None or not len(history):
+        return IndicatorState.from_history(history), True
+
+    # 状態の最新バーが株価履歴のどこにあるか
+    known = int(np.searchsorted(history.dates, np.datetime64(state.last_date), "right"))
+    if not known or history.date_at(known - 1) != state.last_date:
+        return IndicatorState.from_history(history), True
+
+    # 最新バーより前の終値が変わっていれば遡及調整されているので計算し直す
+    count = min(len(state.closes), known) - 1
+    if count > 0 and not np.allclose(
+        history.close[known - 1 - count : known - 1],
+        state.closes[-1 - count : -1],
+        rtol=RECONCILE_TOLERANCE,
+        atol=0.0,
+    ):
+        return IndicatorState.from_history(history), True
+
+    for position in range(known - 1, len(history)):
+        close = float(history.close[position])
+        if position == known - 1 and close == state.closes[-1]:
+            continue
+        state.advance(history.date_at(position), close)
+    return state, False
+
+
+def load_indicator_states(conn, stock_ids: List[str]) -> Dict[str, IndicatorState]:
+    """
+    保存済みの状態を全銘柄分まとめて取得（1クエリ）
+
+    Args:
+        conn: データベース接続
+        stock_ids: 銘柄IDのリスト
+
+    Returns:
+        Dict: 銘柄IDをキーとした状態
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT stock_id, last_date, bars, closes,
+                   avg_gain, avg_loss, prev_avg_gain, prev_avg_loss
+            FROM indicator_states
+            WHERE stock_id = ANY(%s)
+            """,
+            (stock_ids,),
+        )
+        rows = cur.fetchall()
+    conn.commit()
+
+    return {
+        row["stock_id"]: IndicatorState(
+            last_date=row["last_date"],
+            bars=row["bars"],
+            closes=row["closes"],
+            avg_gain=row["avg_gain"],
+            avg_loss=row["avg_loss"],
+            prev_avg_gain=row["prev_avg_gain"],
+            prev_avg_loss=row["prev_avg_loss"],
+        )
+        for row in rows
+    }
+
+
+def save_indicator_states(conn, states: Dict[str, IndicatorState]):
+    """
+    状態を全銘柄分まとめて保存（1クエリ）
+
+    Args:
+        conn: データベース接続
+        states: 銘柄IDをキーとした状態
+    """
+    from psycopg2.extras import execute_values
+
+    values = [
+        (
+            stock_id,
+            state.last_date,
+            state.bars,
+            state.closes,
+            state.avg_gain,
+            state.avg_loss,
+            state.prev_avg_gain,
+            state.prev_avg_loss,
+        )
+        for stock_id, state in states.items()
+        if state.last_date is not None
+    ]
+    if not values:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO indicator_states (
+                    stock_id, last_date, bars, closes,
+                    avg_gain, avg_loss, prev_avg_gain, prev_avg_loss, updated_at
+                ) VALUES %s
+                ON CONFLICT (stock_id) DO UPDATE SET
+                    last_date = EXCLUDED.last_date,
+                    bars = EXCLUDED.bars,
+                    closes = EXCLUDED.closes,
+                    avg_gain = EXCLUDED.avg_gain,
+                    avg_loss = EXCLUDED.avg_loss,
+                    prev_avg_gain = EXCLUDED.prev_avg_gain,
+                    prev_avg_loss = EXCLUDED.prev_avg_loss,
+                    updated_at = EXCLUDED.updated_at
+                """,
+                values,
+                template=(
+                    "(%s, %s, %s, %s::float8[], %s::float8, %s::float8,"
+                    " %s::float8, %s::float8, NOW())"
+                ),
+            )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ テクニカル指標の状態の保存に失敗: {e}")
+
+
+def update_indicator_states(
+    conn, stocks: List[Dict[str, Any]], histories: Dict[str, PriceSeries]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    保存済みの状態を読み込んで進め、保存し直して指標を返す
+
+    Args:
+        conn: データベース接続
+        stocks: 銘柄データのリスト（id, ticker）
+        histories: DBのティッカーをキーとした株価履歴
+
+    Returns:
+        Dict: ティッカーをキーとした指標（indicators() の戻り値、26本未満の銘柄は含まない）
+    """
+    targets = [stock for stock in stocks if stock["ticker"] in histories]
+    saved = load_indicator_states(conn, [stock["id"] for stock in targets])
+
+    states: Dict[str, IndicatorState] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    recomputed = 0
+    for stock in targets:
+        state, rebuilt = update_state(
+            saved.get(stock["id"]), histories[stock["ticker"]]
+        )
+        recomputed += rebuilt
+        states[stock["id"]] = state
+        indicators = state.indicators()
+        if indicators is not None:
+            results[stock["ticker"]] = indicators
+
+    save_indicator_states(conn, states)
+    print(
+        f"   🔁 テクニカル指標の逐次更新: {len(targets) - recomputed}銘柄 / "
+        f"全体から計算 {recomputed}銘柄"
+    )
+    return results
@@ -0,0 +1,233 @@
+"""
+OpenAI Batch API クライアント
+
+全銘柄分のチャットリクエストをJSONLファイルにまとめて Batch API に投入し、
+完了までポーリングして custom_id ごとの結果を返す。
+同期呼び出しに比べてトークン単価が半額になり、リクエストごとのレート制限も受けない。
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+# Batch APIで呼び出すエンドポイント
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# 完了までの期限（Batch APIは24hのみ対応）
+BATCH_COMPLETION_WINDOW = "24h"
+
+# 完了確認の間隔（秒）
+DEFAULT_POLL_INTERVAL = 30.0
+
+# 完了を待つ上限（秒）
+DEFAULT_BATCH_TIMEOUT = 7200.0
+
+# キャンセルの完了を待つ上限（秒、Batch APIはキャンセル完了まで最大10分程度かかる）
+DEFAULT_CANCEL_TIMEOUT = 600.0
+
+# これ以上状態が変わらないステータス
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchTimeoutError(Exception):
+    """待機上限までにバッチが終了せず、キャンセルも完了しなかった"""
+
+
+def build_batch_file(requests: List[Dict[str, Any]]) -> bytes:
+    """
+    リクエストをBatch APIの入力ファイル（JSONL）に変換
+
+    Args:
+        requests: custom_id と body（chat.completions.createの引数）を持つ辞書のリスト
+
+    Returns:
+        bytes: JSONLファイルの内容
+    """
+    lines = []
+    for request in requests:
+        lines.append(
+            json.dumps(
+                {
+                    "custom_id": request["custom_id"],
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": request["body"],
+                },
+                ensure_ascii=False,
+            )
+        )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def parse_batch_output(text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Batch APIの出力ファイル（JSONL）を custom_id ごとの結果に変換
+
+    Args:
+        text: 出力ファイル・エラーファイルの内容
+
+    Returns:
+        Dict: custom_idをキーとした結果
+            （content: 応答本文、usage: トークン使用量、error: エラー内容）
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+
+        record = json.loads(line)
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        error = record.get("error")
+
+        content = None
+        if not error and response.get("status_code") == 200:
+            choices = body.get("choices") or []
+            if choices:
+                content = choices[0]["message"]["content"]
+        if content is None and not error:
+            error = body.get("error") or f"status {response.get('status_code')}"
+
+        results[record["custom_id"]] = {
+            "content": content,
+            "usage": body.get("usage"),
+            "error": error,
+        }
+    return results
+
+
+def submit_batch(client, requests: List[Dict[str, Any]]) -> str:
+    """
+    入力ファイルをアップロードしてバッチを作成
+
+    Args:
+        client: OpenAIクライアント
+        requests: custom_id と body を持つ辞書のリスト
+
+    Returns:
+        str: バッチID
+    """
+    input_file = client.files.create(
+        file=("analysis_batch.jsonl", build_batch_file(requests)),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    return batch.id
+
+
+def wait_for_batch(
+    client,
+    batch_id: str,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    timeout: Optional[float] = DEFAULT_BATCH_TIMEOUT,
+    cancel_timeout: float = DEFAULT_CANCEL_TIMEOUT,
+):
+    """
+    バッチが終了するまでポーリング
+
+    待機上限を超えたらバッチをキャンセルし、cancelled になるまで待つ
+    （キャンセルまでに処理済みのリクエストは課金済みなので、出力ファイルから読み込めるように）。
+
+    Args:
+        client: OpenAIクライアント
+        batch_id: バッチID
+        poll_interval: 完了確認の間隔（秒）
+        timeout: 待機上限（秒）。Noneの場合は無制限
+        cancel_timeout: キャンセルの完了を待つ上限（秒）
+
+    Returns:
+        終了したバッチ（Batchオブジェクト、待機上限を超えた場合は cancelled）
+
+    Raises:
+        BatchTimeoutError: 待機上限を超え、キャンセルも完了しなかった場合
+    """
+    started = time.monotonic()
+    cancelled_at: Optional[float] = None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+
+        counts = batch.request_counts
+        if counts:
+            print(
+                f"⏳ バッチ処理中 ({batch.status}): "
+                f"{counts.completed + counts.failed}/{counts.total}件"
+            )
+
+        now = time.monotonic()
+        if cancelled_at is None:
+            if timeout is not None and now - started >= timeout:
+                print(
+                    f"⏹️  バッチ {batch_id} が{timeout:.0f}秒以内に終了しないため"
+                    "キャンセルします（処理済みの結果は読み込みます）"
+                )
+                client.batches.cancel(batch_id)
+                cancelled_at = now
+        elif now - cancelled_at >= cancel_timeout:
+            raise BatchTimeoutError(
+                f"バッチ {batch_id} のキャンセルが{cancel_timeout:.0f}秒以内に"
+                "完了しませんでした"
+            )
+
+        time.sleep(poll_interval)
+
+
+def fetch_batch_results(client, batch) -> Dict[str, Dict[str, Any]]:
+    """
+    終了したバッチの出力ファイル・エラーファイルを読み込む
+
+    Args:
+        client: OpenAIクライアント
+        batch: wait_for_batch()が返したバッチ
+
+    Returns:
+        Dict: custom_idをキーとした結果（parse_batch_output()参照）
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for file_id in (batch.error_file_id, batch.output_file_id):
+        if file_id:
+            results.update(parse_batch_output(client.files.content(file_id).text))
+    return results
+
+
+def run_batch(
+    client,
+    requests: List[Dict[str, Any]],
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    timeout: Optional[float] = DEFAULT_BATCH_TIMEOUT,
+    cancel_timeout: float = DEFAULT_CANCEL_TIMEOUT,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    リクエストをバッチで実行し、custom_id ごとの結果を返す
+
+    期限切れ・失敗・待機上限でキャンセルしたバッチでも、処理済みのリクエストの結果は返す。
+    結果に含まれないcustom_idは呼び出し側で個別に再実行する。
+
+    Args:
+        client: OpenAIクライアント
+        requests: custom_id と body を持つ辞書のリスト
+        poll_interval: 完了確認の間隔（秒）
+        timeout: 待機上限（秒）
+        cancel_timeout: 待機上限でキャンセルした場合に、キャンセルの完了を待つ上限（秒）
+
+    Returns:
+        Dict: custom_idをキーとした結果（parse_batch_output()参照）
+    """
+    if not requests:
+        return {}
+
+    batch_id = submit_batch(client, requests)
+    print(f"📤 バッチ投入: {batch_id} ({len(requests)}件)")
+
+    batch = wait_for_batch(client, batch_id, poll_interval, timeout, cancel_timeout)
+    if batch.status != "completed":
+        print(f"⚠️ バッチ {batch_id} が {batch.status} で終了しました")
+
+    results = fetch_batch_results(client, batch)
+    print(f"📥 バッチ結果: {len(results)}/{len(requests)}件")
+    return results
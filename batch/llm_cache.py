@@ -0,0 +1,225 @@
+"""
+LLM応答キャッシュ
+
+モデル名・システムメッセージ・プロンプトのハッシュをキーに、OpenAIの応答をSQLiteに保存する。
+DB障害などで --force 再実行した場合も、入力が同じ銘柄は再課金せずに応答を再利用できる。
+期限切れ（TTL）と件数上限（古く使われていない順）で削除する。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# デフォルトの保存先（batch/.cache/）
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_cache.sqlite3"
+)
+
+# キャッシュの有効期間（秒）
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+# 保持する最大件数（超えた分は最終利用が古い順に削除）
+DEFAULT_MAX_ENTRIES = 50_000
+
+
+def request_fingerprint(request: Dict[str, Any], variant: Optional[str] = None) -> str:
+    """
+    チャットリクエストのキャッシュキーを作成
+
+    モデル名・メッセージ（システムメッセージとプロンプト）・応答形式が
+    1文字でも違えば別のキーになる。
+
+    Args:
+        request: chat.completions.createの引数
+        variant: 実際に送ったリクエストが異なる場合の区別
+            （まとめて分析した結果を1銘柄分のリクエストのキーで保存する場合など）
+
+    Returns:
+        str: SHA-256のハッシュ値（16進数）
+    """
+    key = {
+        "model": request.get("model"),
+        "messages": request.get("messages"),
+        "response_format": request.get("response_format"),
+    }
+    if variant is not None:
+        key["variant"] = variant
+    payload = json.dumps(key, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLiteに保存するLLM応答キャッシュ（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        """
+        Args:
+            path: SQLiteファイルのパス（":memory:"でメモリ上のみ）
+            ttl_seconds: キャッシュの有効期間（秒）
+            max_entries: 保持する最大件数
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        # メトリクス
+        self.hits = 0
+        self.misses = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+
+        self.evict()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        キャッシュ済みの応答を取得
+
+        Args:
+            key: request_fingerprint()のキー
+
+        Returns:
+            str: 応答本文（未保存・期限切れの場合はNone）
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                """
+                SELECT content, input_tokens, output_tokens FROM responses
+                WHERE key = ? AND created_at >= ?
+                """,
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute(
+                "UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+
+            content, input_tokens, output_tokens = row
+            self.hits += 1
+            self.saved_input_tokens += input_tokens
+            self.saved_output_tokens += output_tokens
+            return content
+
+    def put(self, key: str, content: str, input_tokens: int, output_tokens: int):
+        """
+        応答を保存
+
+        Args:
+            key: request_fingerprint()のキー
+            content: 応答本文
+            input_tokens: この応答の入力トークン数（ヒット時の節約量として計上）
+            output_tokens: この応答の出力トークン数
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO responses (
+                    key, content, input_tokens, output_tokens,
+                    created_at, last_used_at
+                ) VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, content, input_tokens, output_tokens, now, now),
+            )
+            self.conn.commit()
+
+    def evict(self) -> int:
+        """
+        期限切れの応答と、件数上限を超えた古い応答を削除
+
+        Returns:
+            int: 削除した件数
+        """
+        with self.lock:
+            expired = self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            ).rowcount
+            overflow = self.conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses
+                    ORDER BY last_used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+            self.conn.commit()
+        return expired + overflow
+
+    def get_stats(self) -> Dict[str, Any]:
+        """メトリクスを取得"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                "saved_input_tokens": self.saved_input_tokens,
+                "saved_output_tokens": self.saved_output_tokens,
+            }
+
+    def print_summary(self, pricing: Optional[Dict[str, float]] = None):
+        """
+        キャッシュのサマリーを表示
+
+        Args:
+            pricing: 料金表（input_per_1m_tokens / output_per_1m_tokens）。
+                指定時は節約できた費用も表示する
+        """
+        stats = self.get_stats()
+        print("\n" + "=" * 50)
+        print("🗃️  LLM応答キャッシュサマリー")
+        print("=" * 50)
+        print(
+            f"🎯 ヒット: {stats['hits']:,} / ミス: {stats['misses']:,} "
+            f"(ヒット率 {stats['hit_rate']}%)"
+        )
+        print(f"📥 節約した入力トークン数: {stats['saved_input_tokens']:,} tokens")
+        print(f"📤 節約した出力トークン数: {stats['saved_output_tokens']:,} tokens")
+        if pricing:
+            saved_cost = (
+                stats["saved_input_tokens"] / 1_000_000 * pricing["input_per_1m_tokens"]
+                + stats["saved_output_tokens"]
+                / 1_000_000
+                * pricing["output_per_1m_tokens"]
+            )
+            print(f"💰 節約した費用: ${saved_cost:.4f}")
+        print("=" * 50)
+
+    def close(self):
+        """古い応答を削除して閉じる"""
+        self.evict()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,193 @@
+"""
+複数銘柄をまとめたAI分析
+
+同じセクターの銘柄を K 件ずつまとめて1回のチャットで分析し、共通の指示文・回答形式・
+セクター情報を銘柄ごとに繰り返し送らずに済ませる（入力トークン数とリクエスト数の削減）。
+応答はティッカーごとの分析結果の配列で受け取り、欠けている・形式が不正な銘柄は
+呼び出し側で1銘柄ずつ分析し直す。
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# 推奨の選択肢
+RECOMMENDATIONS = ("Buy", "Sell", "Hold")
+
+# 推奨理由として短すぎる文字数（これ未満は不正な応答とみなす）
+MIN_REASON_LENGTH = 10
+
+# まとめて分析した結果をLLM応答キャッシュに保存する際の区別
+# （1銘柄ずつの分析・Batch API が、送っていないプロンプトの応答を再利用しないように）
+CACHE_VARIANT = "group"
+
+# まとめて分析する呼び出しのタイムアウト（基本の秒数 + 1銘柄あたりの秒数）
+BASE_TIMEOUT = 30.0
+TIMEOUT_PER_STOCK = 10.0
+
+
+class SectorGrouper:
+    """銘柄をセクターごとにためて K 件ずつ取り出す（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        group_size: int,
+        key: Optional[Callable[[Dict[str, Any]], str]] = None,
+    ):
+        """
+        Args:
+            group_size: 1回にまとめる銘柄数
+            key: まとめる単位を返す関数（省略時は item["stock"]["sector"]）
+        """
+        if group_size < 1:
+            raise ValueError("group_sizeは1以上を指定してください")
+
+        self.group_size = group_size
+        self.key = key or (lambda item: item["stock"].get("sector") or "")
+        self.lock = threading.Lock()
+        self.pending: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add(self, item: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        銘柄を追加
+
+        Args:
+            item: 銘柄（stock, stock_data, trend_info を持つ辞書）
+
+        Returns:
+            List: 同じセクターが K 件たまった場合はそのまとまり（それ以外はNone）
+        """
+        key = self.key(item)
+        with self.lock:
+            group = self.pending.setdefault(key, [])
+            group.append(item)
+            if len(group) < self.group_size:
+                return None
+            del self.pending[key]
+            return group
+
+    def flush(self) -> List[List[Dict[str, Any]]]:
+        """
+        K 件に満たないまま残っているまとまりをすべて取り出す
+
+        Returns:
+            List: セクターごとのまとまり
+        """
+        with self.lock:
+            groups = list(self.pending.values())
+            self.pending.clear()
+        return groups
+
+
+def group_request_timeout(count: int) -> float:
+    """
+    まとめて分析する呼び出しのタイムアウト（応答が銘柄数に比例して長くなるため）
+
+    Args:
+        count: まとめる銘柄数
+
+    Returns:
+        float: タイムアウト（秒）
+    """
+    return BASE_TIMEOUT + TIMEOUT_PER_STOCK * count
+
+
+def validate_analysis(entry: Any) -> Optional[Dict[str, Any]]:
+    """
+    1銘柄分の分析結果を検証して正規化
+
+    Args:
+        entry: 応答に含まれる1銘柄分の値
+
+    Returns:
+        Dict: recommendation, confidence_score, reason（不正な場合はNone）
+    """
+    if not isinstance(entry, dict):
+        return None
+
+    recommendation = entry.get("recommendation")
+    if recommendation not in RECOMMENDATIONS:
+        return None
+
+    score = entry.get("confidence_score")
+    if isinstance(score, bool):
+        return None
+    try:
+        score = int(score)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= score <= 100:
+        return None
+
+    reason = entry.get("reason")
+    if not isinstance(reason, str) or len(reason.strip()) < MIN_REASON_LENGTH:
+        return None
+
+    return {
+        "recommendation": recommendation,
+        "confidence_score": score,
+        "reason": reason.strip(),
+    }
+
+
+def parse_group_response(content: str, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    まとめて分析した応答をティッカーごとの分析結果に分解
+
+    {"analyses": [{"ticker": ..., ...}, ...]} の形式を基本とし、
+    ティッカーをキーにした {"7203": {...}} の形式も受け付ける。
+
+    Args:
+        content: 応答本文（JSON）
+        tickers: 分析を依頼したティッカー
+
+    Returns:
+        Dict: ティッカーをキーとした分析結果（依頼していない・不正な銘柄は含まず、重複は先のものを使う）
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+
+    if isinstance(data, dict) and isinstance(data.get("analyses"), list):
+        entries = [
+            (str(entry.get("ticker", "")), entry)
+            for entry in data["analyses"]
+            if isinstance(entry, dict)
+        ]
+    elif isinstance(data, dict):
+        entries = [(str(ticker), entry) for ticker, entry in data.items()]
+    else:
+        return {}
+
+    requested = set(tickers)
+    results: Dict[str, Dict[str, Any]] = {}
+    for ticker, entry in entries:
+        ticker = ticker.strip()
+        if ticker not in requested or ticker in results:
+            continue
+        analysis = validate_analysis(entry)
+        if analysis is not None:
+            results[ticker] = analysis
+    return results
+
+
+def print_group_summary(llm_stage: Dict[str, Any]):
+    """
+    まとめて分析した呼び出しの1銘柄あたりのトークン数・処理時間を表示
+
+    Args:
+        llm_stage: metrics のAI分析ステージの集計（MetricsRegistry.snapshot()参照）
+    """
+    tickers = llm_stage.get("tickers")
+    if not tickers or not tickers.get("count"):
+        return
+
+    input_tokens = llm_stage["input_tokens_per_ticker"]
+    output_tokens = llm_stage["output_tokens_per_ticker"]
+    seconds = llm_stage["seconds_per_ticker"]
+    print(
+        f"📦 まとめて分析: {tickers['count']}回 / 平均{tickers['mean']}銘柄 / "
+        f"1銘柄あたり 入力{input_tokens['mean']:.0f}・出力{output_tokens['mean']:.0f} "
+        f"tokens / {seconds['p50']:.2f}秒 (p95 {seconds['p95']:.2f}秒)"
+    )
@@ -0,0 +1,317 @@
+"""
+株価データ一括取得モジュール
+
+yf.download で複数銘柄のOHLCVをまとめて取得し、銘柄ごとの株価履歴（PriceSeries）に
+分解する。1銘柄ずつ yf.Ticker().history() を呼ぶ場合に比べてHTTPリクエスト数を
+大幅に削減できる。
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from price_series import PriceSeries
+from rate_limiter import report_error, wait_before_retry, yahoo_limiter
+
+# 1リクエストあたりの銘柄数（大きすぎるとYahoo側でタイムアウトしやすい）
+DEFAULT_CHUNK_SIZE = 100
+
+# 差分取得時に取り直して照合する保存済みバー数
+DEFAULT_OVERLAP_BARS = 5
+
+# 照合時に許容する終値のずれ（0.1%を超えたら株式分割・配当調整とみなす）
+DEFAULT_ADJUSTMENT_TOLERANCE = 0.001
+
+# 市場ごとの取引所タイムゾーン（日足の日付判定に使用）
+MARKET_TIMEZONES = {"JP": "Asia/Tokyo", "US": "America/New_York"}
+
+# price_history.idを銘柄ID+日付から決定的に生成するための名前空間
+PRICE_HISTORY_ID_NAMESPACE = uuid.uuid5(
+    uuid.NAMESPACE_URL, "stock-analyzer/price_history"
+)
+
+
+def to_yahoo_ticker(ticker: str, market: str) -> str:
+    """
+    DBのティッカーをYahoo Financeのシンボルに変換
+
+    Args:
+        ticker: ティッカーシンボル
+        market: 市場（JP/US）
+
+    Returns:
+        str: Yahoo Financeのシンボル（日本株は.Tサフィックス付き）
+    """
+    if market == "JP" and not ticker.endswith(".T"):
+        return f"{ticker}.T"
+    return ticker
+
+
+def to_utc_naive(date) -> datetime:
+    """
+    日時をタイムゾーンなしのUTC日時に変換（price_history.dateの保存形式）
+
+    Args:
+        date: datetime / pandas.Timestamp（タイムゾーンなしはUTCとみなす）
+
+    Returns:
+        datetime: タイムゾーンなしのUTC日時
+    """
+    timestamp = pd.Timestamp(date)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.to_pydatetime()
+
+
+def price_history_id(stock_id: str, date) -> str:
+    """
+    株価履歴の行IDを銘柄IDと日付から決定的に生成（uuid5）
+
+    同じバーは何度保存しても同じIDになるため、再実行時も行を作り直さずに済む。
+
+    Args:
+        stock_id: 銘柄ID
+        date: バーの日時（タイムゾーン付きはUTCに変換して扱う）
+
+    Returns:
+        str: UUID文字列
+    """
+    key = f"{stock_id}:{to_utc_naive(date).isoformat()}"
+    return str(uuid.uuid5(PRICE_HISTORY_ID_NAMESPACE, key))
+
+
+def market_date(date, market: str) -> str:
+    """
+    保存済みの日時（UTC）を取引所ローカルの日付文字列に変換
+
+    Args:
+        date: タイムゾーンなしのUTC日時
+        market: 市場（JP/US）
+
+    Returns:
+        str: 取引所ローカルの日付（YYYY-MM-DD）
+    """
+    market_tz = MARKET_TIMEZONES.get(market, "UTC")
+    timestamp = pd.Timestamp(date).tz_localize("UTC").tz_convert(market_tz)
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def merge_price_histories(
+    stored: PriceSeries,
+    fetched: PriceSeries,
+    since: Optional[datetime] = None,
+) -> PriceSeries:
+    """
+    保存済みの株価履歴に新規取得分を重ねて1本の履歴にする
+
+    日付が重なるバーは新規取得分で上書きする（前回実行時の場中バーなどを更新）。
+    保存済みのバーは stored を True にし、DBへの書き込み対象から外せるようにする。
+
+    Args:
+        stored: DBに保存済みの株価履歴
+        fetched: 新規取得した株価履歴
+        since: これより古いバーは除外（トレンド分析の入力期間に揃える）
+
+    Returns:
+        PriceSeries: 日付順に並んだ株価履歴
+    """
+    stored = stored[:]
+    stored.stored[:] = True
+    fetched = fetched[:]
+    fetched.stored[:] = False
+    combined = PriceSeries.concat([stored, fetched])
+
+    # 同じ日付は後ろ（新規取得分）を残す（np.uniqueは最初の出現位置を返すので逆順で探す）
+    last = len(combined) - 1
+    _, first_in_reversed = np.unique(combined.dates[::-1], return_index=True)
+    merged = combined[last - first_in_reversed]
+    if since is not None:
+        merged = merged[merged.dates >= np.datetime64(since)]
+    return merged
+
+
+def detect_adjustment(
+    stored: PriceSeries,
+    fetched: PriceSeries,
+    tolerance: float = DEFAULT_ADJUSTMENT_TOLERANCE,
+    skip_latest: bool = True,
+) -> Optional[float]:
+    """
+    重複期間の終値を照合し、株式分割・配当による遡及調整を検出
+
+    Args:
+        stored: DBに保存済みの株価履歴（日付順）
+        fetched: 新規取得した株価履歴
+        tolerance: 許容する終値のずれ（比率）
+        skip_latest: 保存済みの最新バーを照合から外す
+            （前回実行時の場中値の可能性があるため）
+
+    Returns:
+        float: 調整係数（保存済み終値 / 新規取得終値の中央値）。調整なしはNone
+    """
+    if skip_latest:
+        stored = stored[:-1]
+
+    _, stored_index, fetched_index = np.intersect1d(
+        stored.dates, fetched.dates, return_indices=True
+    )
+    stored_closes = stored.close[stored_index]
+    fetched_closes = fetched.close[fetched_index]
+    usable = (fetched_closes != 0) & ~np.isnan(fetched_closes)
+    ratios = stored_closes[usable] / fetched_closes[usable]
+
+    if not len(ratios) or np.all(np.abs(ratios - 1) <= tolerance):
+        return None
+
+    return float(np.median(ratios))
+
+
+def is_split_factor(factor: float) -> bool:
+    """
+    調整係数が株式分割（出来高も調整が必要）によるものか判定
+
+    配当による調整は数%程度なので、20%以上のずれを分割とみなす。
+
+    Args:
+        factor: detect_adjustment()の調整係数
+
+    Returns:
+        bool: 株式分割とみなせるか
+    """
+    return factor >= 1.2 or factor <= 1 / 1.2
+
+
+def history_window_start(period_days: int = 90) -> datetime:
+    """
+    トレンド分析に使う履歴の開始日時（タイムゾーンなしのUTC）
+
+    Args:
+        period_days: 遡る日数
+
+    Returns:
+        datetime: 開始日時
+    """
+    today = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0, tzinfo=None
+    )
+    return today - timedelta(days=period_days)
+
+
+def _split_download(data: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """yf.downloadの結果を銘柄ごとのデータフレームに分解"""
+    frames: Dict[str, pd.DataFrame] = {}
+    if data is None or data.empty:
+        return frames
+
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker in available:
+                frames[ticker] = data[ticker]
+    elif len(tickers) == 1:
+        frames[tickers[0]] = data
+
+    return frames
+
+
+def download_price_histories(
+    yahoo_tickers: List[str],
+    period: str = "3mo",
+    start: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_retries: int = 3,
+) -> Dict[str, PriceSeries]:
+    """
+    複数銘柄の株価履歴をチャンク単位で一括取得
+
+    Args:
+        yahoo_tickers: Yahoo Financeのシンボルのリスト
+        period: 取得期間（startを指定しない場合）
+        start: 取得開始日（YYYY-MM-DD、指定時はperiodより優先）
+        chunk_size: 1リクエストあたりの銘柄数
+        max_retries: チャンクごとの最大リトライ回数
+
+    Returns:
+        Dict: シンボルをキーとした株価履歴。取得できなかった銘柄は含まれない
+    """
+    results: Dict[str, PriceSeries] = {}
+
+    for offset in range(0, len(yahoo_tickers), chunk_size):
+        chunk = yahoo_tickers[offset : offset + chunk_size]
+
+        for attempt in range(max_retries + 1):
+            try:
+                yahoo_limiter.acquire()
+                data = yf.download(
+                    tickers=chunk,
+                    period=None if start else period,
+                    start=start,
+                    interval="1d",
+                    group_by="ticker",
+                    auto_adjust=True,  # Ticker.history()と同じ調整後価格
+                    ignore_tz=False,  # 既存データと同じタイムゾーン付き日時で保持
+                    threads=True,
+                    progress=False,
+                )
+                for ticker, frame in _split_download(data, chunk).items():
+                    history = PriceSeries.from_frame(frame)
+                    if history:
+                        results[ticker] = history
+                yahoo_limiter.on_success()
+                break
+
+            except Exception as e:
+                # リトライ上限到達（このチャンクは個別取得にフォールバック）
+                if attempt == max_retries:
+                    print(f"⚠️ 一括取得失敗 ({len(chunk)}銘柄): {e}")
+                    break
+
+                # 429の場合はレートを下げて共有のバケットで待機、それ以外はバックオフ
+                rate_limited = wait_before_retry(e, attempt, yahoo_limiter)
+                print(
+                    f"⚠️ 一括取得エラー "
+                    f"(リトライ {attempt+1}/{max_retries}"
+                    f"{' - レート制限' if rate_limited else ''}): {e}"
+                )
+
+    return results
+
+
+def fetch_fundamentals(yahoo_ticker: str, max_retries: int = 3) -> Dict[str, Any]:
+    """
+    財務指標などの銘柄情報（Ticker.info）を取得
+
+    Args:
+        yahoo_ticker: Yahoo Financeのシンボル
+        max_retries: 最大リトライ回数
+
+    Returns:
+        Dict: Ticker.infoの内容
+
+    Raises:
+        Exception: リトライ上限まで失敗した場合は最後の例外
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            yahoo_limiter.acquire()
+            info = yf.Ticker(yahoo_ticker).info
+            yahoo_limiter.on_success()
+            return info
+        except Exception as e:
+            if attempt == max_retries:
+                report_error(e, yahoo_limiter)
+                raise
+
+            # 429の場合はレートを下げて共有のバケットで待機、それ以外はバックオフ
+            rate_limited = wait_before_retry(e, attempt, yahoo_limiter)
+            print(
+                f"⚠️ {yahoo_ticker}: 銘柄情報取得エラー "
+                f"(リトライ {attempt+1}/{max_retries}"
+                f"{' - レート制限' if rate_limited else ''}): {e}"
+            )
+
+    return {}
@@ -0,0 +1,168 @@
+"""
+AI再分析の要否判定（マテリアリティゲート）
+
+前回AI分析した時点の株価・財務指標・テクニカル指標と今日の値を比べ、
+どれも閾値未満の変化なら前回の推奨・理由を再利用する。
+静かな相場では大半の銘柄でOpenAIの呼び出しを省略できる。
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+# 変化率の閾値（前回比、比率）
+DEFAULT_PRICE_THRESHOLD = 0.02  # 株価 2%
+DEFAULT_RATIO_THRESHOLD = 0.05  # PER / PBR / ROE 5%
+
+# RSIの変化の閾値（ポイント）
+DEFAULT_RSI_THRESHOLD = 5.0
+
+# 前回のAI分析からこの日数が経過したら変化に関係なく再分析する
+DEFAULT_MAX_AGE_DAYS = 7
+
+
+def relative_change(previous: Optional[float], current: Optional[float]) -> float:
+    """
+    前回値からの変化率（絶対値）
+
+    Args:
+        previous: 前回値
+        current: 今回値
+
+    Returns:
+        float: 変化率。片方だけ欠損している場合は無限大、両方欠損は0
+    """
+    if previous is None and current is None:
+        return 0.0
+    if previous is None or current is None:
+        return float("inf")
+    if previous == 0:
+        return 0.0 if current == 0 else float("inf")
+    return abs(float(current) - float(previous)) / abs(float(previous))
+
+
+class MaterialityGate:
+    """前回のAI分析を再利用できるか判定する（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        previous_analyses: Dict[str, Dict[str, Any]],
+        price_threshold: float = DEFAULT_PRICE_THRESHOLD,
+        ratio_threshold: float = DEFAULT_RATIO_THRESHOLD,
+        rsi_threshold: float = DEFAULT_RSI_THRESHOLD,
+        max_age: timedelta = timedelta(days=DEFAULT_MAX_AGE_DAYS),
+    ):
+        """
+        Args:
+            previous_analyses: 銘柄IDをキーとした最新の分析データ
+                （current_price, pe_ratio, pb_ratio, roe, technical_indicators,
+                llm_analyzed_at を持つ辞書）
+            price_threshold: 株価の変化率の閾値
+            ratio_threshold: PER / PBR / ROE の変化率の閾値
+            rsi_threshold: RSIの変化の閾値（ポイント）
+            max_age: 前回のAI分析からの最大経過時間
+        """
+        self.previous_analyses = previous_analyses
+        self.price_threshold = price_threshold
+        self.ratio_threshold = ratio_threshold
+        self.rsi_threshold = rsi_threshold
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+        # メトリクス
+        self.reused = 0
+        self.refreshed = 0
+        self.refresh_reasons: Dict[str, int] = {}
+
+    def refresh_reason(
+        self,
+        previous: Optional[Dict[str, Any]],
+        current: Dict[str, Any],
+        now: datetime,
+    ) -> Optional[str]:
+        """
+        再分析が必要な理由を判定
+
+        Args:
+            previous: 前回の分析データ
+            current: 今日の値（current_price, pe_ratio, pb_ratio, roe,
+                technical_indicators を持つ辞書）
+            now: 現在時刻（タイムゾーンなしのUTC）
+
+        Returns:
+            str: 再分析が必要な理由（前回の分析を再利用できる場合はNone）
+        """
+        if previous is None:
+            return "前回分析なし"
+
+        analyzed_at = previous.get("llm_analyzed_at")
+        if analyzed_at is None or now - analyzed_at >= self.max_age:
+            return "期限切れ"
+
+        if relative_change(previous["current_price"], current["current_price"]) >= (
+            self.price_threshold
+        ):
+            return "株価"
+
+        for key in ("pe_ratio", "pb_ratio", "roe"):
+            if relative_change(previous[key], current[key]) >= self.ratio_threshold:
+                return "財務指標"
+
+        previous_indicators = previous.get("technical_indicators")
+        current_indicators = current.get("technical_indicators")
+        if not previous_indicators or not current_indicators:
+            # 片方でもトレンドが計算できていなければ比較できない
+            if previous_indicators or current_indicators:
+                return "テクニカル指標"
+            return None
+
+        if previous_indicators.get("trend") != current_indicators.get("trend"):
+            return "トレンド"
+        if abs(current_indicators["rsi"] - previous_indicators["rsi"]) >= (
+            self.rsi_threshold
+        ):
+            return "RSI"
+
+        return None
+
+    def check(
+        self, stock_id: str, current: Dict[str, Any], now: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """
+        前回の分析を再利用できるか判定して結果を記録
+
+        Args:
+            stock_id: 銘柄ID
+            current: 今日の値（refresh_reason()参照）
+            now: 現在時刻（タイムゾーンなしのUTC）
+
+        Returns:
+            Dict: 再利用できる前回の分析データ（再分析が必要な場合はNone）
+        """
+        previous = self.previous_analyses.get(stock_id)
+        reason = self.refresh_reason(previous, current, now)
+
+        with self.lock:
+            if reason is None:
+                self.reused += 1
+            else:
+                self.refreshed += 1
+                self.refresh_reasons[reason] = self.refresh_reasons.get(reason, 0) + 1
+
+        return previous if reason is None else None
+
+    def print_summary(self):
+        """判定結果のサマリーを表示"""
+        with self.lock:
+            total = self.reused + self.refreshed
+            rate = self.reused / total * 100 if total else 0.0
+            print("\n" + "=" * 50)
+            print("🚦 AI再分析ゲートサマリー")
+            print("=" * 50)
+            print(f"♻️  前回の分析を再利用: {self.reused:,}件 ({rate:.1f}%)")
+            print(f"🤖 AI分析を実行: {self.refreshed:,}件")
+            for reason, count in sorted(
+                self.refresh_reasons.items(), key=lambda x: -x[1]
+            ):
+                print(f"   - {reason}: {count:,}件")
+            print("=" * 50)
@@ -0,0 +1,288 @@
+"""
+処理ステージごとの計測
+
+株価取得・テクニカル分析・AI分析・DB書き込みの各ステージについて、処理時間の
+ヒストグラム（p50/p95/p99）・呼び出し回数・エラー数・リトライ数と、受信バイト数や
+トークン数などの量を集計する。ヒストグラムは対数間隔の固定バケットで数えるため、
+銘柄数に関係なくメモリは一定で、計測値の追加はロック1回とカウンタ加算だけで済む。
+集計結果は batch_job_logs.metrics（JSON）に保存し、--metrics-json でファイルにも出力できる。
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# ステージ名
+FETCH = "fetch"  # 株価・財務指標の取得（Yahoo Finance）
+TA = "ta"  # テクニカル指標の計算
+LLM = "llm"  # AI分析（OpenAI APIの1呼び出し）
+DB_ANALYSES = "db_analyses"  # 分析結果の書き込み
+DB_PRICE_HISTORY = "db_price_history"  # 株価履歴の書き込み
+
+# ヒストグラムのバケット（1バケットあたり値が2^(1/8)倍 = 約9%の誤差）
+BUCKETS_PER_DOUBLING = 8
+
+# 0として扱う値の上限（これ以下の値は最初のバケットに入れる）
+MIN_VALUE = 1e-6
+
+# 出力するパーセンタイル
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """対数間隔の固定バケットで値の分布を数えるヒストグラム（スレッドセーフではない）"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    @staticmethod
+    def _bucket(value: float) -> int:
+        """値を入れるバケット番号"""
+        return math.ceil(math.log2(max(value, MIN_VALUE)) * BUCKETS_PER_DOUBLING)
+
+    @staticmethod
+    def _upper_bound(bucket: int) -> float:
+        """バケットの上限値"""
+        return 2 ** (bucket / BUCKETS_PER_DOUBLING)
+
+    def add(self, value: float):
+        """値を追加"""
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        """別のヒストグラムの値を合算（シャードごとの集計をまとめる場合など）"""
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        パーセンタイル値（バケットの上限値。最小値・最大値の範囲に収める）
+
+        Args:
+            pct: パーセンタイル（0〜100）
+
+        Returns:
+            float: 値（データがない場合はNone）
+        """
+        if not self.count:
+            return None
+
+        rank = max(math.ceil(self.count * pct / 100), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self._upper_bound(bucket), self.min), self.max)
+        return self.max
+
+    def summary(self, digits: int = 4) -> Dict[str, Any]:
+        """
+        集計結果
+
+        Args:
+            digits: 小数点以下の桁数
+
+        Returns:
+            Dict: count, mean, min, max, p50, p95, p99
+        """
+        result: Dict[str, Any] = {"count": self.count}
+        if not self.count:
+            return result
+
+        result["mean"] = round(self.total / self.count, digits)
+        result["min"] = round(self.min, digits)
+        result["max"] = round(self.max, digits)
+        for pct in PERCENTILES:
+            result[f"p{pct}"] = round(self.percentile(pct), digits)
+        return result
+
+
+class StageMetrics:
+    """1ステージ分の計測値"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = Histogram()  # 処理時間（秒）
+        self.errors = 0
+        self.retries = 0
+        self.amounts: Dict[str, Histogram] = {}  # 1呼び出しあたりの量（バイト数など）
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """
+        集計結果
+
+        Args:
+            elapsed: 計測開始からの経過秒数（スループットの計算用）
+
+        Returns:
+            Dict: calls, errors, retries, per_second, busy_seconds, latency, 量ごとの集計
+        """
+        calls = self.latency.count
+        result: Dict[str, Any] = {
+            "calls": calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "per_second": round(calls / elapsed, 3) if elapsed > 0 else None,
+            "busy_seconds": round(self.latency.total, 3),
+            "latency": self.latency.summary(),
+        }
+        for name, histogram in sorted(self.amounts.items()):
+            amount = histogram.summary(digits=3)
+            amount["total"] = round(histogram.total, 3)
+            result[name] = amount
+        return result
+
+
+class MetricsRegistry:
+    """ステージごとの計測値を集める（スレッドセーフ）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """計測値を消去し、経過時間の計測を始め直す"""
+        with self.lock:
+            self.stages: Dict[str, StageMetrics] = {}
+            self.started_at = time.monotonic()
+
+    def _stage(self, name: str) -> StageMetrics:
+        """ステージの計測値（ロック取得済みで呼ぶ）"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageMetrics(name)
+        return stage
+
+    def observe(
+        self, stage: str, seconds: float, error: bool = False, **amounts: float
+    ):
+        """
+        1回分の処理を記録
+
+        Args:
+            stage: ステージ名
+            seconds: 処理時間（秒）
+            error: 失敗した場合はTrue
+            **amounts: 量（例: bytes=1234, input_tokens=500）
+        """
+        with self.lock:
+            metrics = self._stage(stage)
+            metrics.latency.add(seconds)
+            if error:
+                metrics.errors += 1
+            for name, value in amounts.items():
+                if value is None:
+                    continue
+                histogram = metrics.amounts.get(name)
+                if histogram is None:
+                    histogram = metrics.amounts[name] = Histogram()
+                histogram.add(value)
+
+    def retry(self, stage: str, count: int = 1):
+        """
+        リトライを記録
+
+        Args:
+            stage: ステージ名
+            count: リトライ回数
+        """
+        with self.lock:
+            self._stage(stage).retries += count
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[Dict[str, float]]:
+        """
+        with ブロックの処理時間を記録（例外が出た場合はエラーとして数える）
+
+        ブロック内で返された辞書に量を入れると一緒に記録する。
+
+        Args:
+            stage: ステージ名
+
+        Yields:
+            Dict: 量を入れる辞書（例: amounts["rows"] = 50）
+        """
+        amounts: Dict[str, float] = {}
+        started = time.perf_counter()
+        try:
+            yield amounts
+        except BaseException:
+            self.observe(stage, time.perf_counter() - started, error=True, **amounts)
+            raise
+        self.observe(stage, time.perf_counter() - started, **amounts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        集計結果（JSONに変換できる形）
+
+        Returns:
+            Dict: elapsed_seconds とステージごとの集計（StageMetrics.summary()参照）
+        """
+        with self.lock:
+            elapsed = time.monotonic() - self.started_at
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "stages": {
+                    name: stage.summary(elapsed)
+                    for name, stage in sorted(self.stages.items())
+                },
+            }
+
+    def print_summary(self):
+        """ステージごとの処理時間を表示"""
+        snapshot = self.snapshot()
+        if not snapshot["stages"]:
+            return
+
+        print("\n" + "=" * 50)
+        print("⏱️  ステージ別の処理時間")
+        print("=" * 50)
+        for name, stage in snapshot["stages"].items():
+            latency = stage["latency"]
+            line = f"{name}: {stage['calls']}回"
+            if latency["count"]:
+                line += (
+                    f" / p50 {latency['p50']:.3f}s"
+                    f" / p95 {latency['p95']:.3f}s"
+                    f" / p99 {latency['p99']:.3f}s"
+                    f" / 合計 {stage['busy_seconds']:.1f}s"
+                )
+            if stage["errors"] or stage["retries"]:
+                line += f" / エラー {stage['errors']} / リトライ {stage['retries']}"
+            print(line)
+        print("=" * 50)
+
+
+def payload_size(value: Any) -> int:
+    """
+    受信データ量の目安（JSONに変換したときのバイト数）
+
+    Args:
+        value: 受信したデータ（辞書・リストなど）
+
+    Returns:
+        int: バイト数
+    """
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+# 全スレッドで共有する計測値
+metrics = MetricsRegistry()
@@ -0,0 +1,175 @@
+"""
+ステージ型パイプライン実行エンジン
+
+各ステージを独立したスレッド群として動かし、ステージ間を上限付きキューで接続する。
+下流が詰まるとキューが満杯になり上流がブロックされる（バックプレッシャー）ため、
+処理対象の件数に関係なくメモリ上に滞留するアイテム数は一定に保たれる。
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, List, Optional
+
+# ステージの終了を下流に伝える番兵
+_END = object()
+
+
+class Stage:
+    """パイプラインの1ステージ"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any, Any], Optional[Any]],
+        workers: int = 1,
+        setup: Optional[Callable[[], Any]] = None,
+        teardown: Optional[Callable[[Any], None]] = None,
+        flush: Optional[Callable[[Any], Iterable[Any]]] = None,
+    ):
+        """
+        Args:
+            name: ステージ名（ログ・エラー通知用）
+            func: 処理関数 func(item, state)。次ステージに渡す値を返す。
+                Noneを返すとそのアイテムはここで打ち切る
+            workers: 同時実行数（ワーカースレッド数）
+            setup: ワーカーごとの初期化関数（DB接続など）。戻り値がstateになる
+            teardown: ワーカー終了時にstateを受け取る後処理関数
+            flush: 入力の終了時にstateを受け取り、ためていた残りを返す関数
+                （複数件をまとめて次ステージに渡すステージ用）
+        """
+        if workers < 1:
+            raise ValueError(f"{name}: workersは1以上を指定してください")
+
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.setup = setup
+        self.teardown = teardown
+        self.flush = flush
+
+
+class Pipeline:
+    """上限付きキューで接続されたステージ群を実行する"""
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = 10,
+        on_complete: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Any, str, Exception], None]] = None,
+    ):
+        """
+        Args:
+            stages: 実行順に並べたステージ
+            queue_size: ステージ間キューの上限（バックプレッシャーの閾値）
+            on_complete: 最終ステージを通過したアイテムを受け取るコールバック
+            on_error: ステージで例外が発生した際のコールバック(item, stage名, 例外)
+        """
+        if not stages:
+            raise ValueError("ステージが1つ以上必要です")
+
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_complete = on_complete
+        self.on_error = on_error
+
+    def run(self, source: Iterable[Any]):
+        """
+        sourceのアイテムをすべて処理し終えるまでブロックする
+
+        Args:
+            source: 先頭ステージに投入するアイテム列
+        """
+        # queues[i]はstages[i]の入力キュー
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        active = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(index, queues, active, lock),
+                    name=f"{stage.name}-worker",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in source:
+                queues[0].put(item)
+        finally:
+            queues[0].put(_END)
+
+        for thread in threads:
+            thread.join()
+
+    def _worker(self, index: int, queues: List[queue.Queue], active, lock):
+        """ステージのワーカースレッド本体"""
+        stage = self.stages[index]
+        in_queue = queues[index]
+        out_queue = queues[index + 1] if index + 1 < len(queues) else None
+
+        state = None
+        setup_error: Optional[Exception] = None
+        if stage.setup:
+            try:
+                state = stage.setup()
+            except Exception as e:
+                # 初期化に失敗しても上流を詰まらせないよう、受け取ったアイテムは
+                # エラーとして通知しながら消化する
+                setup_error = e
+
+        try:
+            while True:
+                item = in_queue.get()
+                if item is _END:
+                    # 同じステージの他ワーカーにも終了を伝える
+                    in_queue.put(_END)
+                    if stage.flush and setup_error is None:
+                        for result in stage.flush(state):
+                            self._emit(result, out_queue)
+                    break
+
+                if setup_error is not None:
+                    self._notify_error(item, stage.name, setup_error)
+                    continue
+
+                try:
+                    result = stage.func(item, state)
+                except Exception as e:
+                    self._notify_error(item, stage.name, e)
+                    continue
+
+                if result is not None:
+                    self._emit(result, out_queue)
+        finally:
+            if stage.teardown and setup_error is None:
+                try:
+                    stage.teardown(state)
+                except Exception:
+                    pass
+
+            # ステージ最後のワーカーが下流に終了を伝える
+            with lock:
+                active[index] -= 1
+                is_last = active[index] == 0
+            if is_last and out_queue is not None:
+                out_queue.put(_END)
+
+    def _emit(self, result: Any, out_queue: Optional[queue.Queue]):
+        """次ステージ（最終ステージの場合は完了コールバック）に渡す"""
+        if out_queue is not None:
+            out_queue.put(result)
+        elif self.on_complete:
+            self.on_complete(result)
+
+    def _notify_error(self, item: Any, stage_name: str, error: Exception):
+        """エラーコールバックを呼び出す（コールバックの例外でワーカーを止めない）"""
+        if self.on_error:
+            try:
+                self.on_error(item, stage_name, error)
+            except Exception as e:
+                print(f"⚠️ {stage_name}: エラー通知に失敗 - {e}")
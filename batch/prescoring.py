@@ -0,0 +1,437 @@
+"""
+ルールによる事前判定（AI分析の要否の振り分け）
+
+セクター平均と比べた割安度（PER・PBR）・収益性（ROE）と、トレンド・クロス・RSIから
+暫定の推奨・信頼度を計算する。全銘柄分を配列にまとめて一度に計算するため、
+数千銘柄でも数ミリ秒で終わる。
+
+次の銘柄だけをAI分析に回し、それ以外はルールによる判定結果をそのまま保存する。
+- 判定境界に近い銘柄（Buy / Hold / Sell のどちらにも転びうる）
+- analysis_requests でユーザーから分析をリクエストされた銘柄
+- 前回のAI分析から一定日数が経過した銘柄（AI分析したことがない銘柄を含む）
+
+財務指標もトレンドも取れない銘柄は、判定材料がないことを示す低い信頼度の Hold になる。
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 推奨の閾値（スコアは -1〜1）
+BUY_THRESHOLD = 0.25
+SELL_THRESHOLD = -0.25
+
+# 閾値からこの幅以内のスコアは判定境界とみなしてAI分析する
+DEFAULT_BOUNDARY_MARGIN = 0.1
+
+# 前回のAI分析からこの日数が経過したらAI分析する
+DEFAULT_REFRESH_DAYS = 14
+
+# セクター平均がない場合に比べる基準値（ROEは%）
+BASELINE_PER = 15.0
+BASELINE_PBR = 1.5
+BASELINE_ROE = 8.0
+
+# 各要素の重み（取れない要素は除いて残りで按分する）
+WEIGHTS = {
+    "per": 0.2,
+    "pbr": 0.15,
+    "roe": 0.2,
+    "trend": 0.25,
+    "cross": 0.1,
+    "rsi": 0.1,
+}
+
+# ルール判定の推奨理由の接頭辞
+RULE_REASON_PREFIX = "【簡易判定】"
+
+# AI分析に回す理由
+REASON_REQUESTED = "リクエスト"
+REASON_REFRESH = "定期更新"
+REASON_BOUNDARY = "判定境界"
+
+TREND_CODES = {"上昇": 1.0, "下降": -1.0, "横ばい": 0.0}
+
+
+def _to_float(value: Any) -> float:
+    """Decimal・None を float（欠損は NaN）に変換"""
+    return float(value) if value is not None else np.nan
+
+
+def score_universe(
+    rows: List[Dict[str, Any]], sector_stats: Optional[Dict[str, Dict]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    全銘柄のスコアをまとめて計算
+
+    Args:
+        rows: sector, pe_ratio, pb_ratio, roe, trend_info（calculate_stock_trend()の
+            結果、Noneの場合はトレンドなし）を持つ辞書のリスト
+        sector_stats: セクター統計情報（calculate_sector_statistics()の戻り値）
+
+    Returns:
+        Dict: 銘柄順に並んだ配列
+            score: 総合スコア（-1〜1）
+            coverage: 判定に使えた要素の重みの合計（0〜1）
+            components: 要素ごとのスコア（要素名 → 配列、取れない要素は NaN）
+    """
+    sector_stats = sector_stats or {}
+    count = len(rows)
+
+    def sector_average(key: str, baseline: float) -> np.ndarray:
+        values = [(sector_stats.get(row["sector"]) or {}).get(key) for row in rows]
+        return np.array(
+            [baseline if value is None else value for value in values], dtype=float
+        )
+
+    per = np.array([_to_float(row["pe_ratio"]) for row in rows], dtype=float)
+    pbr = np.array([_to_float(row["pb_ratio"]) for row in rows], dtype=float)
+    roe = np.array([_to_float(row["roe"]) for row in rows], dtype=float)
+    avg_per = sector_average("avg_per", BASELINE_PER)
+    avg_pbr = sector_average("avg_pbr", BASELINE_PBR)
+    avg_roe = sector_average("avg_roe", BASELINE_ROE)
+
+    trends = [row["trend_info"] or {} for row in rows]
+    trend = np.array(
+        [TREND_CODES.get(info.get("trend"), np.nan) for info in trends], dtype=float
+    )
+    rsi = np.array([_to_float(info.get("rsi")) for info in trends], dtype=float)
+    golden = np.array(
+        ["ゴールデンクロス発生" in (info.get("signals") or []) for info in trends],
+        dtype=bool,
+    )
+    dead = np.array(
+        ["デッドクロス発生" in (info.get("signals") or []) for info in trends],
+        dtype=bool,
+    )
+    cross = np.where(np.isnan(trend), np.nan, golden.astype(float) - dead)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        components = {
+            # 平均より低いほど割安（赤字のPERは割高側の最大値）
+            "per": np.where(
+                per <= 0, -1.0, np.clip((avg_per - per) / np.abs(avg_per), -1, 1)
+            ),
+            "pbr": np.clip((avg_pbr - pbr) / np.abs(avg_pbr), -1, 1),
+            "roe": np.clip((roe - avg_roe) / np.abs(avg_roe), -1, 1),
+            "trend": trend,
+            "cross": cross,
+            # 買われすぎは売り寄り、売られすぎは買い寄り
+            "rsi": np.select(
+                [rsi > 70, rsi < 30], [-(rsi - 70) / 30, (30 - rsi) / 30], 0.0
+            ),
+        }
+    # 欠損値（NaN）は比較・計算結果も NaN のまま残す
+    components["per"] = np.where(np.isnan(per), np.nan, components["per"])
+    components["rsi"] = np.where(np.isnan(rsi), np.nan, components["rsi"])
+
+    weighted = np.zeros(count)
+    coverage = np.zeros(count)
+    for name, weight in WEIGHTS.items():
+        values = components[name]
+        available = ~np.isnan(values)
+        weighted += np.where(available, values * weight, 0.0)
+        coverage += np.where(available, weight, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(coverage > 0, weighted / coverage, 0.0)
+
+    return {
+        "score": score,
+        "coverage": coverage / sum(WEIGHTS.values()),
+        "components": components,
+    }
+
+
+def recommendation_for(score: float) -> str:
+    """
+    スコアから推奨を決める
+
+    Args:
+        score: 総合スコア（-1〜1）
+
+    Returns:
+        str: Buy / Sell / Hold
+    """
+    if score >= BUY_THRESHOLD:
+        return "Buy"
+    if score <= SELL_THRESHOLD:
+        return "Sell"
+    return "Hold"
+
+
+def confidence_for(score: float, coverage: float) -> int:
+    """
+    スコアの強さと判定材料の多さから信頼度を決める
+
+    Args:
+        score: 総合スコア（-1〜1）
+        coverage: 判定に使えた要素の割合（0〜1）
+
+    Returns:
+        int: 信頼度（0〜100、判定材料がなければ0）
+    """
+    strength = min(abs(score) / 0.5, 1.0)
+    return int(round((30 + 50 * strength) * coverage))
+
+
+def build_reason(components: Dict[str, float], row: Dict[str, Any]) -> str:
+    """
+    ルール判定の推奨理由を作成
+
+    Args:
+        components: 要素ごとのスコア（NaNは取れなかった要素）
+        row: score_universe()に渡した1銘柄分の辞書
+
+    Returns:
+        str: 推奨理由
+    """
+    parts = []
+    labels = [("pbr", "PBR")]
+    if row["pe_ratio"] is not None and row["pe_ratio"] <= 0:
+        # 赤字でPERがマイナスの場合は割安・割高で評価しない
+        parts.append("最終損益が赤字のため、PERはマイナスです。")
+    else:
+        labels.insert(0, ("per", "PER"))
+    valuation = [
+        f"{label}は基準より{'割安' if components[key] > 0 else '割高'}"
+        for key, label in labels
+        if not np.isnan(components[key]) and abs(components[key]) >= 0.1
+    ]
+    if valuation:
+        parts.append("、".join(valuation) + "な水準です。")
+    if not np.isnan(components["roe"]):
+        if components["roe"] >= 0.1:
+            parts.append("ROEは基準を上回り、収益性は良好です。")
+        elif components["roe"] <= -0.1:
+            parts.append("ROEは基準を下回り、収益性に課題があります。")
+
+    trend_info = row["trend_info"]
+    if trend_info:
+        parts.append(
+            f"株価は{trend_info['trend']}トレンドで、"
+            f"RSIは{trend_info['rsi']}（{trend_info['rsi_signal']}）です。"
+        )
+        crosses = [
+            signal.removesuffix("発生")
+            for signal in trend_info.get("signals", [])
+            if signal != "シグナルなし"
+        ]
+        if crosses:
+            parts.append(f"{'・'.join(crosses)}が発生しています。")
+
+    missing = [
+        label
+        for key, label in (("pe_ratio", "PER"), ("pb_ratio", "PBR"), ("roe", "ROE"))
+        if row[key] is None
+    ]
+    if missing:
+        parts.append(f"{'・'.join(missing)}が取得できないため、判断材料は限られています。")
+    if not trend_info:
+        parts.append("株価履歴が不足しているため、トレンドは考慮していません。")
+
+    return RULE_REASON_PREFIX + "".join(parts)
+
+
+class PreScorer:
+    """ルールで判定できる銘柄を振り分ける（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        sector_stats: Optional[Dict[str, Dict]],
+        previous_analyses: Dict[str, Dict[str, Any]],
+        requested_at: Optional[Dict[str, datetime]] = None,
+        boundary_margin: float = DEFAULT_BOUNDARY_MARGIN,
+        refresh_age: timedelta = timedelta(days=DEFAULT_REFRESH_DAYS),
+    ):
+        """
+        Args:
+            sector_stats: セクター統計情報
+            previous_analyses: 銘柄IDをキーとした最新の分析データ
+                （load_previous_analyses()の戻り値、llm_analyzed_at を使う）
+            requested_at: 銘柄IDをキーとした分析リクエストの最終更新日時
+                （前回のAI分析より後のリクエストがある銘柄はAI分析する）
+            boundary_margin: 判定境界とみなすスコアの幅
+            refresh_age: 前回のAI分析からの最大経過時間
+        """
+        self.sector_stats = sector_stats or {}
+        self.previous_analyses = previous_analyses
+        self.requested_at = requested_at or {}
+        self.boundary_margin = boundary_margin
+        self.refresh_age = refresh_age
+        self.lock = threading.Lock()
+
+        # メトリクス
+        self.rule_scored = 0
+        self.escalated = 0
+        self.escalation_reasons: Dict[str, int] = {}
+        self.recommendations: Dict[str, int] = {}
+        self.seconds = 0.0
+
+    def escalation_reason(
+        self, stock_id: str, score: float, now: datetime
+    ) -> Optional[str]:
+        """
+        AI分析に回す理由を判定
+
+        Args:
+            stock_id: 銘柄ID
+            score: 総合スコア
+            now: 現在時刻（タイムゾーンなしのUTC）
+
+        Returns:
+            str: AI分析に回す理由（ルールの判定で済む場合はNone）
+        """
+        previous = self.previous_analyses.get(stock_id)
+        analyzed_at = previous.get("llm_analyzed_at") if previous else None
+
+        requested_at = self.requested_at.get(stock_id)
+        if requested_at is not None and (
+            analyzed_at is None or requested_at > analyzed_at
+        ):
+            return REASON_REQUESTED
+
+        if analyzed_at is None or now - analyzed_at >= self.refresh_age:
+            return REASON_REFRESH
+
+        if min(abs(score - BUY_THRESHOLD), abs(score - SELL_THRESHOLD)) < (
+            self.boundary_margin
+        ):
+            return REASON_BOUNDARY
+
+        return None
+
+    def triage(
+        self, items: List[Dict[str, Any]], now: datetime
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        銘柄をまとめて判定し、ルールで済む銘柄の分析結果を作成
+
+        Args:
+            items: stock, stock_data, trend_info を持つ辞書のリスト
+            now: 現在時刻（タイムゾーンなしのUTC）
+
+        Returns:
+            List: 銘柄順の分析結果（recommendation, confidence_score, reason と、
+                引き継ぐ llm_analyzed_at を持つ辞書。AI分析に回す銘柄はNone）
+        """
+        started = time.perf_counter()
+        rows = [
+            {
+                "sector": item["stock_data"].sector,
+                "pe_ratio": item["stock_data"].pe_ratio,
+                "pb_ratio": item["stock_data"].pb_ratio,
+                "roe": item["stock_data"].roe,
+                "trend_info": item["trend_info"],
+            }
+            for item in items
+        ]
+        scored = score_universe(rows, self.sector_stats)
+
+        results: List[Optional[Dict[str, Any]]] = []
+        reasons: List[str] = []
+        for index, item in enumerate(items):
+            stock_id = item["stock"]["id"]
+            score = float(scored["score"][index])
+            reason = self.escalation_reason(stock_id, score, now)
+            if reason is not None:
+                reasons.append(reason)
+                results.append(None)
+                continue
+
+            components = {
+                name: float(values[index])
+                for name, values in scored["components"].items()
+            }
+            results.append(
+                {
+                    "recommendation": recommendation_for(score),
+                    "confidence_score": confidence_for(
+                        score, float(scored["coverage"][index])
+                    ),
+                    "reason": build_reason(components, rows[index]),
+                    # 次回の定期更新の判定のため、前回のAI分析日時を引き継ぐ
+                    "llm_analyzed_at": self.previous_analyses[stock_id][
+                        "llm_analyzed_at"
+                    ],
+                }
+            )
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.seconds += elapsed
+            self.escalated += len(reasons)
+            for reason in reasons:
+                self.escalation_reasons[reason] = (
+                    self.escalation_reasons.get(reason, 0) + 1
+                )
+            for result in results:
+                if result is not None:
+                    self.rule_scored += 1
+                    recommendation = result["recommendation"]
+                    self.recommendations[recommendation] = (
+                        self.recommendations.get(recommendation, 0) + 1
+                    )
+
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        振り分けの集計を取得
+
+        Returns:
+            Dict: rule_scored, escalated, escalation_reasons, recommendations, seconds
+        """
+        with self.lock:
+            return {
+                "rule_scored": self.rule_scored,
+                "escalated": self.escalated,
+                "escalation_reasons": dict(self.escalation_reasons),
+                "recommendations": dict(self.recommendations),
+                "seconds": round(self.seconds, 4),
+            }
+
+    def print_summary(
+        self,
+        llm_seconds_per_call: Optional[float] = None,
+        llm_cost_per_call: Optional[float] = None,
+    ):
+        """
+        振り分け結果と、ルールの判定で省略できたAI分析の時間・費用の目安を表示
+
+        Args:
+            llm_seconds_per_call: AI分析1回あたりの処理時間（秒、今回の実測値）
+            llm_cost_per_call: AI分析1回あたりの費用（USD、今回の実測値）
+        """
+        stats = self.get_stats()
+        total = stats["rule_scored"] + stats["escalated"]
+        rate = stats["rule_scored"] / total * 100 if total else 0.0
+
+        print("\n" + "=" * 50)
+        print("📐 ルールによる事前判定サマリー")
+        print("=" * 50)
+        print(
+            f"📐 ルールで判定: {stats['rule_scored']:,}件 ({rate:.1f}%) "
+            f"/ 判定時間 {stats['seconds'] * 1000:.1f}ms"
+        )
+        for recommendation, count in sorted(stats["recommendations"].items()):
+            print(f"   - {recommendation}: {count:,}件")
+        print(f"🤖 AI分析に回した銘柄: {stats['escalated']:,}件")
+        for reason, count in sorted(
+            stats["escalation_reasons"].items(), key=lambda x: -x[1]
+        ):
+            print(f"   - {reason}: {count:,}件")
+        if stats["rule_scored"] and llm_seconds_per_call is not None:
+            print(
+                f"⏱️  省略したAI分析の処理時間（目安）: "
+                f"{stats['rule_scored'] * llm_seconds_per_call:.1f}秒"
+            )
+        if stats["rule_scored"] and llm_cost_per_call is not None:
+            print(
+                f"💵 省略したAI分析の費用（目安）: "
+                f"${stats['rule_scored'] * llm_cost_per_call:.4f}"
+            )
+        print("=" * 50)
@@ -0,0 +1,185 @@
+"""
+列指向の株価履歴
+
+日付・OHLCVを銘柄ごとに NumPy 配列で保持する。バーごとの辞書のリストに比べて
+メモリが小さく、yfinance のデータフレームから行ごとのループなしで作れるため、
+テクニカル指標の計算（technical_analysis）や DB への書き込みにそのまま使える。
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 日付の型（タイムゾーンなしのUTC）
+DATE_DTYPE = "datetime64[ns]"
+
+
+class PriceSeries:
+    """日付順に並んだ1銘柄分の株価履歴（日付はタイムゾーンなしのUTC）"""
+
+    __slots__ = ("dates", "open", "high", "low", "close", "volume", "stored")
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        stored: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            dates: 日時（datetime64[ns]、タイムゾーンなしのUTC、昇順）
+            open: 始値
+            high: 高値
+            low: 安値
+            close: 終値
+            volume: 出来高
+            stored: DBに保存済みのバーはTrue（省略時はすべてFalse）
+        """
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.stored = stored if stored is not None else np.zeros(len(dates), bool)
+
+    @classmethod
+    def empty(cls) -> "PriceSeries":
+        """空の株価履歴"""
+        return cls.from_records([])
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "PriceSeries":
+        """
+        yfinanceのOHLCVデータフレームから作成
+
+        Args:
+            frame: Open/High/Low/Close/Volume列と日時インデックスを持つデータフレーム
+                （一括取得で混ざる他銘柄の営業日のNaN行は除く）
+
+        Returns:
+            PriceSeries: 株価履歴
+        """
+        frame = frame.dropna(subset=["Close"])
+        index = pd.DatetimeIndex(frame.index)
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        dates = index.to_numpy(dtype=DATE_DTYPE)
+        order = np.argsort(dates, kind="stable")
+
+        def column(name: str) -> np.ndarray:
+            return frame[name].to_numpy(dtype=float)[order]
+
+        return cls(
+            dates[order],
+            column("Open"),
+            column("High"),
+            column("Low"),
+            column("Close"),
+            np.nan_to_num(column("Volume")).astype(np.int64),
+        )
+
+    @classmethod
+    def from_records(
+        cls, records: List[Dict[str, Any]], stored: bool = False
+    ) -> "PriceSeries":
+        """
+        バーごとの辞書（date, open, high, low, close, volume）のリストから作成
+
+        Args:
+            records: 株価履歴（date以外の欠けている値は NaN / 0 とみなす）
+            stored: DBに保存済みのバーとして扱うか
+
+        Returns:
+            PriceSeries: 日付順に並べ替えた株価履歴
+        """
+        dates = pd.DatetimeIndex([pd.Timestamp(r["date"]) for r in records])
+        if dates.tz is not None:
+            dates = dates.tz_convert("UTC").tz_localize(None)
+        dates = dates.to_numpy(dtype=DATE_DTYPE)
+        order = np.argsort(dates, kind="stable")
+
+        def column(name: str, dtype: Any, missing: Any) -> np.ndarray:
+            values = [r.get(name) for r in records]
+            return np.array(
+                [missing if v is None else v for v in values], dtype=dtype
+            )[order]
+
+        return cls(
+            dates[order],
+            column("open", float, np.nan),
+            column("high", float, np.nan),
+            column("low", float, np.nan),
+            column("close", float, np.nan),
+            column("volume", np.int64, 0),
+            np.full(len(records), stored, dtype=bool),
+        )
+
+    @classmethod
+    def concat(cls, series: List["PriceSeries"]) -> "PriceSeries":
+        """複数の株価履歴を順に連結（並べ替えはしない）"""
+        return cls(
+            *(
+                np.concatenate([getattr(s, name) for s in series])
+                for name in cls.__slots__
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, index) -> "PriceSeries":
+        """スライス・真偽値の配列・インデックスの配列で一部のバーを取り出す"""
+        return PriceSeries(*(getattr(self, name)[index] for name in self.__slots__))
+
+    @property
+    def nbytes(self) -> int:
+        """配列の合計バイト数"""
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def date_at(self, position: int) -> datetime:
+        """
+        指定位置のバーの日時
+
+        Args:
+            position: 位置（負の値は末尾から）
+
+        Returns:
+            datetime: タイムゾーンなしのUTC日時
+        """
+        return pd.Timestamp(self.dates[position]).to_pydatetime()
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """
+        バーごとの辞書を順に返す（DBへの書き込み・表示用）
+
+        Yields:
+            Dict: date（datetime）, open, high, low, close, volume, stored
+        """
+        dates = self.dates.astype("datetime64[us]").tolist()
+        yield from (
+            {
+                "date": date,
+                "open": open_,
+                "high": high,
+                "low": low,
+                "close": close,
+                "volume": volume,
+                "stored": stored,
+            }
+            for date, open_, high, low, close, volume, stored in zip(
+                dates,
+                self.open.tolist(),
+                self.high.tolist(),
+                self.low.tolist(),
+                self.close.tolist(),
+                self.volume.tolist(),
+                self.stored.tolist(),
+            )
+        )
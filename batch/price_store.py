@@ -0,0 +1,323 @@
+"""
+株価履歴の保存（price_history テーブル）
+
+保存済みの株価履歴の読み込み・差分取得・株式分割や配当による遡及調整・一括書き込み。
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+from market_data import (
+    DEFAULT_ADJUSTMENT_TOLERANCE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_OVERLAP_BARS,
+    detect_adjustment,
+    download_price_histories,
+    history_window_start,
+    is_split_factor,
+    market_date,
+    merge_price_histories,
+    price_history_id,
+    to_yahoo_ticker,
+)
+from price_series import PriceSeries
+
+
+def load_stored_price_histories(
+    conn, stock_ids: List[str], since: datetime
+) -> Dict[str, PriceSeries]:
+    """
+    保存済みの株価履歴を全銘柄分まとめて取得（1クエリ）
+
+    Args:
+        conn: データベース接続
+        stock_ids: 銘柄IDのリスト
+        since: 取得開始日時（タイムゾーンなしのUTC）
+
+    Returns:
+        Dict: 銘柄IDをキーとした日付順の株価履歴（最後のバーが最新の保存済みバー）
+    """
+    rows_by_stock: Dict[str, List[Dict[str, Any]]] = {}
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT stock_id, date, open, high, low, close, volume
+            FROM price_history
+            WHERE stock_id = ANY(%s) AND date >= %s
+            ORDER BY stock_id, date
+            """,
+            (stock_ids, since),
+        )
+        for row in cur.fetchall():
+            rows_by_stock.setdefault(row["stock_id"], []).append(row)
+    conn.commit()
+
+    return {
+        stock_id: PriceSeries.from_records(rows, stored=True)
+        for stock_id, rows in rows_by_stock.items()
+    }
+
+
+def rescale_stored_price_history(conn, adjustments: Dict[str, Dict[str, Any]]):
+    """
+    再取得範囲より古い保存済みバーに調整係数を一括適用（1クエリ、コミットは呼び出し側）
+
+    Args:
+        conn: データベース接続
+        adjustments: 銘柄IDをキーとした {"factor": 係数, "before": この日時より前}
+    """
+    values = [
+        (
+            stock_id,
+            adjustment["factor"],
+            adjustment["factor"] if is_split_factor(adjustment["factor"]) else 1.0,
+            adjustment["before"],
+        )
+        for stock_id, adjustment in adjustments.items()
+        if abs(adjustment["factor"] - 1) > DEFAULT_ADJUSTMENT_TOLERANCE
+    ]
+    if not values:
+        return
+
+    with conn.cursor() as cur:
+        # 価格は係数で割り、株式分割の場合は出来高に係数を掛ける
+        execute_values(
+            cur,
+            """
+            UPDATE price_history AS ph SET
+                open = ph.open / v.factor,
+                high = ph.high / v.factor,
+                low = ph.low / v.factor,
+                close = ph.close / v.factor,
+                volume = ROUND(ph.volume * v.volume_factor)::int,
+                updated_at = NOW()
+            FROM (VALUES %s) AS v(stock_id, factor, volume_factor, before)
+            WHERE ph.stock_id = v.stock_id AND ph.date < v.before
+            """,
+            values,
+            template="(%s, %s::float8, %s::float8, %s::timestamp)",
+        )
+
+
+def upsert_price_histories(conn, histories: Iterable[Tuple[str, PriceSeries]]):
+    """
+    複数銘柄の株価履歴をまとめて保存（コミットは呼び出し側）
+
+    COPYで一時テーブルに流し込み、INSERT ... ON CONFLICT (stock_id, date) で
+    本テーブルにマージする。OHLCVが変わっていないバーは更新しないため、
+    毎日同じバーを DELETE → INSERT して不要行を増やすことがない。
+    新規行のIDは銘柄ID+日付から決定的に生成する。
+
+    Args:
+        conn: データベース接続
+        histories: (銘柄ID, 株価履歴) のリスト（stored が True のバーは書き込まない）
+    """
+    # 差分取得時は保存済みのバーを書き込み対象から外す（同じ日付は後のものを優先）
+    bars: Dict[Tuple[str, datetime], Tuple] = {}
+    for stock_id, history in histories:
+        for price_data in history[~history.stored].records():
+            date = price_data["date"]
+            bars[(stock_id, date)] = (
+                price_history_id(stock_id, date),
+                stock_id,
+                date.isoformat(sep=" "),
+                price_data["open"],
+                price_data["high"],
+                price_data["low"],
+                price_data["close"],
+                price_data["volume"],
+            )
+    if not bars:
+        return
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(bars.values())
+    buffer.seek(0)
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE price_history_staging (
+                id TEXT,
+                stock_id TEXT,
+                date TIMESTAMP(3),
+                open DOUBLE PRECISION,
+                high DOUBLE PRECISION,
+                low DOUBLE PRECISION,
+                close DOUBLE PRECISION,
+                volume INTEGER
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            """
+            COPY price_history_staging (
+                id, stock_id, date, open, high, low, close, volume
+            ) FROM STDIN WITH (FORMAT csv)
+            """,
+            buffer,
+        )
+        cur.execute("""
+            INSERT INTO price_history (
+                id, stock_id, date, open, high, low, close, volume,
+                created_at, updated_at
+            )
+            SELECT
+                id, stock_id, date, open, high, low, close, volume, NOW(), NOW()
+            FROM price_history_staging
+            ON CONFLICT (stock_id, date) DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume,
+                updated_at = EXCLUDED.updated_at
+            WHERE (
+                price_history.open,
+                price_history.high,
+                price_history.low,
+                price_history.close,
+                price_history.volume
+            ) IS DISTINCT FROM (
+                EXCLUDED.open,
+                EXCLUDED.high,
+                EXCLUDED.low,
+                EXCLUDED.close,
+                EXCLUDED.volume
+            )
+        """)
+
+
+def save_adjusted_price_histories(
+    conn,
+    adjustments: Dict[str, Dict[str, Any]],
+    histories: Dict[str, PriceSeries],
+) -> bool:
+    """
+    古いバーへの調整係数の適用と、取り直したバーの書き込みを1トランザクションで行う
+
+    取り直した範囲を分析の保存時（分析に失敗・持ち越した銘柄は書き込まれない）まで
+    遅らせると、次回の差分取得で同じ調整を再び検出し、古いバーに係数を二重に適用してしまう。
+
+    Args:
+        conn: データベース接続
+        adjustments: 銘柄IDをキーとした {"factor": 係数, "before": この日時より前}
+        histories: 銘柄IDをキーとした取り直した株価履歴
+
+    Returns:
+        bool: 書き込めたか（失敗した場合は何も変更せず、次回の差分取得で再び検出する）
+    """
+    try:
+        rescale_stored_price_history(conn, adjustments)
+        upsert_price_histories(conn, histories.items())
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ 株価履歴の遡及調整に失敗: {e}")
+        return False
+
+
+def prefetch_incremental_price_histories(
+    conn,
+    stocks: List[Dict[str, Any]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    overlap_bars: int = DEFAULT_OVERLAP_BARS,
+    tolerance: float = DEFAULT_ADJUSTMENT_TOLERANCE,
+) -> Dict[str, PriceSeries]:
+    """
+    保存済みの最新バー以降のみを取得し、保存済み履歴と結合する（差分取得）
+
+    直近overlap_bars本の保存済みバーも取り直し、終値を照合する。株式分割や配当で
+    Yahoo側の過去データが遡及調整されていた銘柄は、3ヶ月分をまとめて再取得して
+    書き直し、それより古い保存済みバーにも調整係数を適用する。
+    保存済み履歴がない銘柄は従来どおり3ヶ月分を取得する。
+    遡及調整した銘柄の取り直したバーは、古いバーの調整と同じトランザクションで書き込む。
+
+    Args:
+        conn: データベース接続
+        stocks: 銘柄データのリスト
+        chunk_size: 1リクエストあたりの銘柄数
+        overlap_bars: 照合のために取り直す保存済みバー数
+        tolerance: 照合時に許容する終値のずれ（比率）
+
+    Returns:
+        Dict: DBのティッカーをキーとした株価履歴（保存済みバーは stored が True）
+    """
+    since = history_window_start()
+    stored = load_stored_price_histories(conn, [s["id"] for s in stocks], since)
+
+    # 取得開始日ごとにシンボルをグループ化（保存済みなしは None = 3ヶ月分）
+    groups: Dict[Optional[str], List[str]] = {}
+    symbol_to_stock: Dict[str, Dict[str, Any]] = {}
+    for stock in stocks:
+        symbol = to_yahoo_ticker(stock["ticker"], stock["market"])
+        symbol_to_stock[symbol] = stock
+        history = stored.get(stock["id"])
+        start = None
+        if history:
+            overlap_start = history.date_at(-min(overlap_bars, len(history)))
+            start = market_date(overlap_start, stock["market"])
+        groups.setdefault(start, []).append(symbol)
+
+    results: Dict[str, PriceSeries] = {}
+    adjusted_symbols: List[str] = []
+    for start, symbols in groups.items():
+        fetched = download_price_histories(
+            symbols, period="3mo", start=start, chunk_size=chunk_size
+        )
+        for symbol, history in fetched.items():
+            stock = symbol_to_stock[symbol]
+            stored_history = stored.get(stock["id"], PriceSeries.empty())
+
+            if len(stored_history) and detect_adjustment(
+                stored_history[-overlap_bars:], history, tolerance
+            ):
+                adjusted_symbols.append(symbol)
+                continue
+
+            results[stock["ticker"]] = merge_price_histories(
+                stored_history, history, since=since
+            )
+
+    # 遡及調整を検出した銘柄は3ヶ月分を一括で取り直して全バーを書き直す
+    if adjusted_symbols:
+        print(f"   🔧 遡及調整を検出: {len(adjusted_symbols)}銘柄を再取得")
+        refetched = download_price_histories(
+            adjusted_symbols, period="3mo", chunk_size=chunk_size
+        )
+        adjustments: Dict[str, Dict[str, Any]] = {}
+        rewritten: Dict[str, PriceSeries] = {}
+        for symbol, history in refetched.items():
+            stock = symbol_to_stock[symbol]
+            merged = merge_price_histories(
+                PriceSeries.empty(), history, since=since
+            )
+            results[stock["ticker"]] = merged
+            rewritten[stock["id"]] = merged
+
+            # 係数は取り直した3ヶ月分全体との照合で求める
+            factor = detect_adjustment(
+                stored.get(stock["id"], PriceSeries.empty()),
+                merged,
+                tolerance,
+                skip_latest=False,
+            )
+            if factor and len(merged):
+                adjustments[stock["id"]] = {
+                    "factor": factor,
+                    "before": merged.date_at(0),
+                }
+        save_adjusted_price_histories(conn, adjustments, rewritten)
+        # 取り直したバーはここで書き込み済み（失敗した場合も、古いバーと食い違わない
+        # よう分析の保存時には書き込まず、次回の差分取得で再び検出させる）
+        for history in rewritten.values():
+            history.stored[:] = True
+
+    new_bars = sum(int((~history.stored).sum()) for history in results.values())
+    print(f"   📥 差分取得: {len(groups)}グループ / 新規・更新バー {new_bars}件")
+
+    return results
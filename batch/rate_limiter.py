@@ -0,0 +1,406 @@
+"""
+適応型トークンバケットによるレート制限
+
+Yahoo Finance と OpenAI（リクエスト数・トークン数）それぞれにバケットを用意し、
+全ワーカー・全スクリプトで共有する。固定のsleepではなく上流の上限に合わせて流量を制御する。
+429（Too Many Requests）を受けたらレートを半分に下げて Retry-After の間は停止し、
+成功が続くと設定上限まで少しずつ戻す。429以外の一時的なエラー（5xx・接続リセットなど）は
+バケットのレートを変えず、リトライ前にジッター付きの指数バックオフで待つ。
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# 429を受けたときのレートの倍率
+DEFAULT_DECREASE_FACTOR = 0.5
+
+# 成功ごとに戻すレート（上限に対する割合）
+DEFAULT_INCREASE_RATIO = 0.05
+
+# 上限に対する最低レートの割合
+DEFAULT_MIN_RATE_RATIO = 0.05
+
+# Retry-Afterがない429のときに停止する秒数
+DEFAULT_RETRY_AFTER = 5.0
+
+# 429以外のエラーでリトライする前の待機（1回目の基準秒数と上限秒数）
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 10.0
+
+# 例外メッセージ中のHTTPステータス429（"HTTP Error 429" / "status code: 429" など）。
+# "$4293.T: possibly delisted" のような銘柄コード中の数字には一致させない
+HTTP_429_PATTERN = re.compile(r"\b(?:HTTP|status)\b[^0-9]{0,16}\b429\b", re.IGNORECASE)
+
+
+class AdaptiveTokenBucket:
+    """429に応じてレートを上下させるトークンバケット（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        capacity: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        increase_ratio: float = DEFAULT_INCREASE_RATIO,
+    ):
+        """
+        Args:
+            name: バケット名（ログ表示用）
+            rate: 上限レート（1秒あたりのトークン数）
+            capacity: バースト上限（省略時は1秒分、最低1）
+            min_rate: 429が続いたときの下限レート（省略時は上限の5%）
+            decrease_factor: 429を受けたときのレートの倍率
+            increase_ratio: 成功ごとに戻すレート（上限に対する割合）
+        """
+        if rate <= 0:
+            raise ValueError(f"{name}: rateは0より大きい値を指定してください")
+
+        self.name = name
+        self.lock = threading.Lock()
+        self.decrease_factor = decrease_factor
+        self.increase_ratio = increase_ratio
+        self.set_limit(rate, capacity, min_rate)
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+        # メトリクス
+        self.acquired = 0.0
+        self.total_wait = 0.0
+        self.rate_limited = 0
+
+    def set_limit(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        min_rate: Optional[float] = None,
+    ):
+        """
+        上限レートを変更（現在のレートも上限に戻す）
+
+        Args:
+            rate: 上限レート（1秒あたりのトークン数）
+            capacity: バースト上限（省略時は1秒分、最低1）
+            min_rate: 下限レート（省略時は上限の5%）
+        """
+        with self.lock:
+            self.max_rate = rate
+            self.rate = rate
+            self.capacity = capacity if capacity is not None else max(rate, 1.0)
+            self.min_rate = (
+                min_rate if min_rate is not None else rate * DEFAULT_MIN_RATE_RATIO
+            )
+            if hasattr(self, "level"):
+                self.level = min(self.level, self.capacity)
+
+    def _refill(self, now: float):
+        """経過時間分のトークンを補充（ロック取得済みで呼ぶ）"""
+        self.level = min(
+            self.capacity, self.level + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        トークンが貯まるまで待って消費
+
+        バースト上限より大きい要求は、満杯まで待ってから消費する（残量は負になり、
+        その分だけ後続が待たされる）。
+
+        Args:
+            tokens: 消費するトークン数
+
+        Returns:
+            float: 待機した秒数
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                needed = min(tokens, self.capacity)
+                if now >= self.blocked_until and self.level >= needed:
+                    self.level -= tokens
+                    self.acquired += tokens
+                    self.total_wait += waited
+                    return waited
+
+                wait = max(
+                    self.blocked_until - now, (needed - self.level) / self.rate
+                )
+
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, tokens: float):
+        """
+        見積もりとの差分を消費（負の値で返却）
+
+        Args:
+            tokens: 追加で消費するトークン数
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - tokens)
+            self.acquired += tokens
+
+    def on_success(self):
+        """成功を記録してレートを少し戻す"""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate * self.increase_ratio
+                )
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        429を記録してレートを下げ、Retry-Afterの間は払い出しを止める
+
+        Args:
+            retry_after: 上流から指定された待機秒数（Noneの場合はデフォルト）
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.blocked_until = max(
+                self.blocked_until,
+                now + (retry_after if retry_after is not None else DEFAULT_RETRY_AFTER),
+            )
+            self.rate_limited += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """メトリクスを取得"""
+        with self.lock:
+            return {
+                "name": self.name,
+                "rate": round(self.rate, 3),
+                "max_rate": round(self.max_rate, 3),
+                "acquired": round(self.acquired),
+                "total_wait_seconds": round(self.total_wait, 2),
+                "rate_limited": self.rate_limited,
+            }
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    上流のレート制限（429）による例外か判定
+
+    ステータスコード・例外の型で判定し、メッセージは "Too Many Requests" か
+    HTTPステータスとしての429のみを見る（銘柄コードに含まれる429は対象外）。
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        bool: レート制限によるエラーか
+    """
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if getattr(getattr(error, "response", None), "status_code", None) == 429:
+        return True
+    if type(error).__name__ in ("RateLimitError", "YFRateLimitError"):
+        return True
+    message = str(error)
+    return "Too Many Requests" in message or bool(HTTP_429_PATTERN.search(message))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    例外のレスポンスヘッダーから Retry-After の秒数を取得
+
+    Args:
+        error: 発生した例外（OpenAIのAPIStatusErrorなど）
+
+    Returns:
+        float: 待機秒数（ヘッダーがない場合はNone）
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        # HTTP日付形式などは扱わずデフォルトの待機にする
+        return None
+    return None
+
+
+def report_error(error: Exception, *buckets: AdaptiveTokenBucket) -> bool:
+    """
+    例外がレート制限によるものならバケットのレートを下げる
+
+    Args:
+        error: 発生した例外
+        buckets: 対象のバケット
+
+    Returns:
+        bool: レート制限によるエラーだったか
+    """
+    if not is_rate_limit_error(error):
+        return False
+
+    retry_after = retry_after_seconds(error)
+    for bucket in buckets:
+        bucket.on_rate_limited(retry_after)
+    return True
+
+
+def backoff_seconds(
+    attempt: int,
+    base: float = DEFAULT_BACKOFF_BASE,
+    cap: float = DEFAULT_BACKOFF_MAX,
+) -> float:
+    """
+    429以外のエラーでリトライする前の待機秒数
+
+    試行ごとに倍に伸ばし（上限あり）、複数のワーカーが同時に再試行しないよう
+    0.5〜1倍のジッターをかける。
+
+    Args:
+        attempt: 失敗した試行の番号（0始まり）
+        base: 1回目の基準秒数
+        cap: 上限秒数
+
+    Returns:
+        float: 待機秒数
+    """
+    return min(cap, base * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def wait_before_retry(
+    error: Exception, attempt: int, *buckets: AdaptiveTokenBucket
+) -> bool:
+    """
+    リトライ前の待機
+
+    429ならバケットのレートを下げ、Retry-Afterまでの待機は次の acquire() に任せる。
+    それ以外のエラーは backoff_seconds() の間待つ。
+
+    Args:
+        error: 発生した例外
+        attempt: 失敗した試行の番号（0始まり）
+        buckets: 429のときにレートを下げるバケット
+
+    Returns:
+        bool: レート制限によるエラーだったか
+    """
+    if report_error(error, *buckets):
+        return True
+    time.sleep(backoff_seconds(attempt))
+    return False
+
+
+def estimate_tokens(request: Dict[str, Any], completion_tokens: int = 500) -> int:
+    """
+    チャットリクエストの消費トークン数を見積もる（1文字1トークンとみなす）
+
+    Args:
+        request: chat.completions.createの引数
+        completion_tokens: 応答のトークン数の見積もり
+
+    Returns:
+        int: 見積もりトークン数
+    """
+    prompt_chars = sum(
+        len(message.get("content") or "") for message in request.get("messages", [])
+    )
+    return prompt_chars + request.get("max_tokens", completion_tokens)
+
+
+def _env_float(name: str, default: float) -> float:
+    """環境変数を数値として取得"""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Yahoo Finance（1秒あたりのリクエスト数）
+yahoo_limiter = AdaptiveTokenBucket(
+    "Yahoo Finance",
+    rate=_env_float("YAHOO_REQUESTS_PER_SECOND", 2.0),
+)
+
+# OpenAI（1分あたりのリクエスト数・トークン数を1秒あたりに換算）
+openai_request_limiter = AdaptiveTokenBucket(
+    "OpenAI requests",
+    rate=_env_float("OPENAI_REQUESTS_PER_MINUTE", 500) / 60,
+)
+openai_token_limiter = AdaptiveTokenBucket(
+    "OpenAI tokens",
+    rate=_env_float("OPENAI_TOKENS_PER_MINUTE", 200_000) / 60,
+    capacity=_env_float("OPENAI_TOKENS_PER_MINUTE", 200_000) / 60 * 10,
+)
+
+
+def acquire_openai(request: Dict[str, Any]) -> int:
+    """
+    OpenAIへのリクエスト前にリクエスト数・トークン数の枠を確保
+
+    Args:
+        request: chat.completions.createの引数
+
+    Returns:
+        int: 確保したトークン数の見積もり（settle_openai()に渡す）
+    """
+    estimated = estimate_tokens(request)
+    openai_request_limiter.acquire()
+    openai_token_limiter.acquire(estimated)
+    return estimated
+
+
+def settle_openai(estimated: int, usage: Optional[Any] = None):
+    """
+    OpenAIの応答後に実際のトークン数で枠を精算し、レートを戻す
+
+    Args:
+        estimated: acquire_openai()の見積もり
+        usage: 応答のトークン使用量（total_tokens）
+    """
+    if usage is not None and getattr(usage, "total_tokens", None):
+        openai_token_limiter.adjust(usage.total_tokens - estimated)
+    openai_request_limiter.on_success()
+    openai_token_limiter.on_success()
+
+
+def report_openai_error(error: Exception) -> bool:
+    """
+    OpenAIのエラーを記録（429ならリクエスト数・トークン数の両方のレートを下げる）
+
+    Args:
+        error: 発生した例外
+
+    Returns:
+        bool: レート制限によるエラーだったか
+    """
+    return report_error(error, openai_request_limiter, openai_token_limiter)
+
+
+def all_limiters() -> List[AdaptiveTokenBucket]:
+    """共有のバケットの一覧"""
+    return [yahoo_limiter, openai_request_limiter, openai_token_limiter]
+
+
+def print_summary():
+    """レート制限のサマリーを表示"""
+    print("\n" + "=" * 50)
+    print("🚥 レート制限サマリー")
+    print("=" * 50)
+    for limiter in all_limiters():
+        stats = limiter.get_stats()
+        print(
+            f"{stats['name']}: 待機 {stats['total_wait_seconds']}秒 / "
+            f"429 {stats['rate_limited']}回 / "
+            f"レート {stats['rate']}/{stats['max_rate']} per sec"
+        )
+    print("=" * 50)
@@ -0,0 +1,305 @@
+"""
+バッチ実行マニフェスト
+
+実行IDごとに対象銘柄の状態（pending → running → succeeded / failed）・試行回数・
+直近のエラー・処理時刻を batch_runs / batch_run_items に記録する。
+状態の変化は書き込みバッファでまとめて書き込む。中断した実行は --resume <実行ID> で
+未完了（pending / running / failed / deferred）の銘柄だけを再開できる。
+"""
+
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+
+# 銘柄ごとの状態
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+# --shard で制限時間・費用上限に達した、または Batch API の完了待ちで期限を過ぎたため
+# 次回に持ち越し
+DEFERRED = "deferred"
+
+# --resume で再開する状態（running は処理中に中断されたもの）
+RESUMABLE_STATES = [PENDING, RUNNING, FAILED, DEFERRED]
+
+# 実行の状態
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_INCOMPLETE = "incomplete"
+
+
+def _utc_now() -> datetime:
+    """タイムゾーンなしのUTC現在時刻（TIMESTAMP(3)列の保存形式）"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def create_run(
+    conn, stocks: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    実行を作成し、対象銘柄を処理順に pending として登録
+
+    Args:
+        conn: データベース接続
+        stocks: 処理順に並べた銘柄データのリスト（id, ticker）
+        options: 実行時のオプション（記録用）
+
+    Returns:
+        str: 実行ID
+    """
+    from psycopg2.extras import execute_values
+
+    run_id = str(uuid.uuid4())
+    now = _utc_now()
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO batch_runs (id, status, options, started_at)
+            VALUES (%s, %s, %s, %s)
+            """,
+            (
+                run_id,
+                RUN_RUNNING,
+                json.dumps(options, ensure_ascii=False) if options else None,
+                now,
+            ),
+        )
+        execute_values(
+            cur,
+            """
+            INSERT INTO batch_run_items (
+                id, run_id, stock_id, ticker, position, state, attempts, updated_at
+            ) VALUES %s
+            """,
+            [
+                (
+                    str(uuid.uuid4()),
+                    run_id,
+                    stock["id"],
+                    stock["ticker"],
+                    position,
+                    PENDING,
+                    0,
+                    now,
+                )
+                for position, stock in enumerate(stocks)
+            ],
+            page_size=1000,
+        )
+    conn.commit()
+
+    return run_id
+
+
+def resume_run(conn, run_id: str) -> List[Dict[str, Any]]:
+    """
+    中断した実行の未完了の銘柄を処理順に取得し、実行を再開状態にする
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+
+    Returns:
+        List: 未完了の銘柄データ（id, ticker, market, sector）
+
+    Raises:
+        ValueError: 実行IDが見つからない場合
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            UPDATE batch_runs SET status = %s, finished_at = NULL
+            WHERE id = %s
+            RETURNING id
+            """,
+            (RUN_RUNNING, run_id),
+        )
+        if cur.fetchone() is None:
+            conn.rollback()
+            raise ValueError(f"実行ID {run_id} が見つかりません")
+
+        cur.execute(
+            """
+            SELECT s.id, s.ticker, s.market, s.sector
+            FROM batch_run_items i
+            JOIN stocks s ON s.id = i.stock_id
+            WHERE i.run_id = %s
+              AND i.state = ANY(%s)
+            ORDER BY i.position
+            """,
+            (run_id, RESUMABLE_STATES),
+        )
+        stocks = cur.fetchall()
+    conn.commit()
+
+    return stocks
+
+
+def finish_run(conn, run_id: str) -> Dict[str, int]:
+    """
+    実行を終了し、銘柄の状態ごとの件数を返す
+
+    未完了の銘柄が残っていれば incomplete、すべて成功していれば completed とする。
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+
+    Returns:
+        Dict: 状態をキーとした銘柄数
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT state, COUNT(*) FROM batch_run_items
+            WHERE run_id = %s
+            GROUP BY state
+            """,
+            (run_id,),
+        )
+        counts = {state: count for state, count in cur.fetchall()}
+
+        remaining = sum(counts.get(state, 0) for state in RESUMABLE_STATES)
+        cur.execute(
+            "UPDATE batch_runs SET status = %s, finished_at = %s WHERE id = %s",
+            (RUN_INCOMPLETE if remaining else RUN_COMPLETED, _utc_now(), run_id),
+        )
+    conn.commit()
+
+    return counts
+
+
+def collapse_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    同じ銘柄の状態変化を1行にまとめる（発生順に適用）
+
+    Args:
+        events: run_id, stock_id, state, error, at を持つ状態変化のリスト
+
+    Returns:
+        List: 銘柄ごとの最終状態（attempts は running になった回数）
+    """
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for event in events:
+        key = (event["run_id"], event["stock_id"])
+        row = rows.setdefault(
+            key,
+            {
+                "run_id": event["run_id"],
+                "stock_id": event["stock_id"],
+                "attempts": 0,
+                "last_error": None,
+                "started_at": None,
+                "finished_at": None,
+            },
+        )
+        row["state"] = event["state"]
+        if event["state"] == RUNNING:
+            row["attempts"] += 1
+            row["started_at"] = event["at"]
+            row["finished_at"] = None
+        else:
+            row["finished_at"] = event["at"]
+        if event.get("error"):
+            row["last_error"] = event["error"]
+    return list(rows.values())
+
+
+def write_events(conn, events: List[Dict[str, Any]]):
+    """
+    状態変化をまとめて反映（BatchWriterの書き込み関数、コミットは呼び出し側）
+
+    Args:
+        conn: データベース接続
+        events: 状態変化のリスト（collapse_events()参照）
+    """
+    from psycopg2.extras import execute_values
+
+    rows = collapse_events(events)
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            UPDATE batch_run_items AS i SET
+                state = v.state,
+                attempts = i.attempts + v.attempts,
+                last_error = COALESCE(v.last_error, i.last_error),
+                started_at = COALESCE(v.started_at, i.started_at),
+                finished_at = v.finished_at,
+                updated_at = NOW()
+            FROM (VALUES %s) AS v (
+                run_id, stock_id, state, attempts, last_error, started_at, finished_at
+            )
+            WHERE i.run_id = v.run_id AND i.stock_id = v.stock_id
+            """,
+            [
+                (
+                    row["run_id"],
+                    row["stock_id"],
+                    row["state"],
+                    row["attempts"],
+                    row["last_error"],
+                    row["started_at"],
+                    row["finished_at"],
+                )
+                for row in rows
+            ],
+            template="(%s, %s, %s, %s, %s, %s::timestamp, %s::timestamp)",
+        )
+
+
+class RunManifest:
+    """銘柄ごとの状態変化を書き込みバッファに追加する"""
+
+    def __init__(self, run_id: str, writer):
+        """
+        Args:
+            run_id: 実行ID
+            writer: write_events() を書き込み関数とする書き込みバッファ
+        """
+        self.run_id = run_id
+        self.writer = writer
+
+    def _record(self, stock_id: str, state: str, error: Optional[str] = None):
+        self.writer.add(
+            {
+                "run_id": self.run_id,
+                "stock_id": stock_id,
+                "state": state,
+                "error": error[:1000] if error else None,
+                "at": _utc_now(),
+            }
+        )
+
+    def start(self, stock_id: str):
+        """処理開始を記録（試行回数を1増やす）"""
+        self._record(stock_id, RUNNING)
+
+    def succeed(self, stock_id: str):
+        """成功を記録"""
+        self._record(stock_id, SUCCEEDED)
+
+    def fail(self, stock_id: str, error: str):
+        """
+        失敗を記録
+
+        Args:
+            stock_id: 銘柄ID
+            error: エラー内容
+        """
+        self._record(stock_id, FAILED, error)
+
+    def defer(self, stock_id: str, reason: str):
+        """
+        次回への持ち越しを記録
+
+        Args:
+            stock_id: 銘柄ID
+            reason: 持ち越した理由
+        """
+        self._record(stock_id, DEFERRED, reason)
@@ -0,0 +1,181 @@
+"""
+分析対象のスケジューリング
+
+ユーザーのリクエスト数・前回分析からの経過日数・ボラティリティから優先度を計算し、
+優先度の高い銘柄から処理する。制限時間・費用上限を指定した場合は、
+観測した1銘柄あたりの処理時間・費用から上限に達する前に新しい銘柄の受け付けを止める。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# 優先度の重み
+REQUEST_WEIGHT = 1.0  # log(1 + リクエスト数)
+STALENESS_WEIGHT = 1.0  # 経過日数（上限で正規化）
+VOLATILITY_WEIGHT = 0.5  # 日次リターンの標準偏差（上限で正規化）
+
+# 経過日数はこの日数で頭打ち（未分析の銘柄もこの日数として扱う）
+MAX_STALENESS_DAYS = 14
+
+# 日次リターンの標準偏差はこの値で頭打ち
+MAX_VOLATILITY = 0.05
+
+# 処理時間の移動平均の重み（新しい観測値の割合）
+LATENCY_SMOOTHING = 0.2
+
+# 見積もりに掛ける安全率
+DEFAULT_SAFETY_MARGIN = 1.5
+
+
+def priority_score(inputs: Optional[Dict[str, Any]], now: datetime) -> float:
+    """
+    銘柄の優先度を計算
+
+    Args:
+        inputs: request_count, last_analyzed_at, volatility を持つ辞書
+            （Noneの場合はリクエストなし・未分析・ボラティリティ不明）
+        now: 現在時刻（タイムゾーンなしのUTC）
+
+    Returns:
+        float: 優先度（大きいほど先に処理する）
+    """
+    inputs = inputs or {}
+
+    requests = inputs.get("request_count") or 0
+    score = REQUEST_WEIGHT * math.log1p(requests)
+
+    last_analyzed_at = inputs.get("last_analyzed_at")
+    if last_analyzed_at is None:
+        days = MAX_STALENESS_DAYS
+    else:
+        days = min((now - last_analyzed_at).total_seconds() / 86400, MAX_STALENESS_DAYS)
+    score += STALENESS_WEIGHT * max(days, 0) / MAX_STALENESS_DAYS
+
+    volatility = inputs.get("volatility")
+    if volatility is not None:
+        score += VOLATILITY_WEIGHT * min(float(volatility), MAX_VOLATILITY) / (
+            MAX_VOLATILITY
+        )
+
+    return score
+
+
+def prioritize(
+    stocks: List[Dict[str, Any]],
+    schedule_inputs: Dict[str, Dict[str, Any]],
+    now: datetime,
+) -> List[Dict[str, Any]]:
+    """
+    銘柄を優先度の高い順に並べ替え（同じ優先度はティッカー順）
+
+    Args:
+        stocks: 銘柄データのリスト
+        schedule_inputs: 銘柄IDをキーとした優先度の入力（priority_score()参照）
+        now: 現在時刻（タイムゾーンなしのUTC）
+
+    Returns:
+        List: 並べ替えた銘柄データのリスト
+    """
+    return sorted(
+        stocks,
+        key=lambda stock: (
+            -priority_score(schedule_inputs.get(stock["id"]), now),
+            stock["ticker"],
+        ),
+    )
+
+
+class AdmissionController:
+    """制限時間・費用上限に達する前に新しい銘柄の受け付けを止める（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        deadline: Optional[float] = None,
+        max_cost_usd: Optional[float] = None,
+        cost_func: Optional[Callable[[], float]] = None,
+        safety_margin: float = DEFAULT_SAFETY_MARGIN,
+    ):
+        """
+        Args:
+            deadline: 受け付けを終える期限（time.monotonic()の時刻、Noneの場合は無制限）
+            max_cost_usd: 費用の上限（USD、Noneの場合は無制限）
+            cost_func: 現在までの費用（USD）を返す関数
+            safety_margin: 1銘柄あたりの処理時間・費用の見積もりに掛ける安全率
+        """
+        self.deadline = deadline
+        self.max_cost_usd = max_cost_usd
+        self.cost_func = cost_func or (lambda: 0.0)
+        self.safety_margin = safety_margin
+        self.lock = threading.Lock()
+
+        self.started_at: Deque[float] = deque()  # 処理中の銘柄の受け付け時刻
+        self.admitted = 0
+        self.finished = 0
+        self.latency: Optional[float] = None  # 1銘柄あたりの処理時間（秒）
+        self.stop_reason: Optional[str] = None
+
+    def admit(self) -> bool:
+        """
+        次の銘柄を受け付けるか判定
+
+        一度止めたら以降は受け付けない。
+
+        Returns:
+            bool: 受け付ける場合はTrue
+        """
+        with self.lock:
+            if self.stop_reason is None:
+                self.stop_reason = self._check_limits()
+                if self.stop_reason is not None:
+                    print(f"⏹️  新しい銘柄の受け付けを終了: {self.stop_reason}")
+            if self.stop_reason is not None:
+                return False
+
+            self.started_at.append(time.monotonic())
+            self.admitted += 1
+            return True
+
+    def _check_limits(self) -> Optional[str]:
+        """上限に達しそうなら理由を返す（ロック取得済みで呼ぶ）"""
+        if self.deadline is not None:
+            expected = (self.latency or 0.0) * self.safety_margin
+            if time.monotonic() + expected >= self.deadline:
+                return "制限時間"
+
+        if self.max_cost_usd is not None:
+            cost = self.cost_func()
+            in_flight = len(self.started_at)
+            per_stock = cost / self.finished if self.finished else 0.0
+            projected = cost + per_stock * (in_flight + 1) * self.safety_margin
+            if projected >= self.max_cost_usd:
+                return f"費用上限 (${cost:.4f} / ${self.max_cost_usd:.4f})"
+
+        return None
+
+    def finish(self):
+        """銘柄の処理完了を記録（受け付け順に完了したとみなして処理時間を更新）"""
+        with self.lock:
+            self.finished += 1
+            if not self.started_at:
+                return
+
+            elapsed = time.monotonic() - self.started_at.popleft()
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def remaining_seconds(self) -> Optional[float]:
+        """
+        期限までの残り秒数
+
+        Returns:
+            float: 残り秒数（期限なしの場合はNone）
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
@@ -1,21 +1,135 @@
 """
 株価テクニカル分析モジュール
 
-taライブラリを使用してテクニカル指標を計算し、トレンドを判定する
+移動平均（SMA）・RSIを NumPy で計算し、トレンドを判定する。
+計算方法は taライブラリ（SMAIndicator / RSIIndicator）と同じで、同じ値になる。
+
+calculate_trend_indicators() は1銘柄ずつ、calculate_universe_indicators() は
+全銘柄の終値を（銘柄×日）の行列に並べて一度に計算する（結果は同じ）。
 """
 
-from typing import Dict, List
-import pandas as pd
-from ta.trend import SMAIndicator
-from ta.momentum import RSIIndicator
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from price_series import PriceSeries
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    単純移動平均（最後の軸に沿って計算、ta.trend.SMAIndicator と同じ）
+
+    Args:
+        values: 終値（1次元、または銘柄×日の2次元配列）
+        window: 期間
+
+    Returns:
+        np.ndarray: 同じ形の配列（期間に満たない位置・NaNを含む期間は NaN）
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] >= window:
+        windows = sliding_window_view(values, window, axis=-1)
+        result[..., window - 1 :] = windows.mean(axis=-1)
+    return result
+
+
+def wilder_average(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Wilderの平滑化（alpha=1/window の指数移動平均、adjust=False）
+
+    pandas の ewm(alpha=1/window, min_periods=window, adjust=False).mean() と
+    同じ順序で計算する（NaNを含まない入力のみ）。
 
+    Args:
+        values: 値（1次元、または銘柄×日の2次元配列。最後の軸が日付）
+        window: 期間
 
-def calculate_trend_indicators(price_history: List[Dict]) -> Dict:
+    Returns:
+        np.ndarray: 同じ形の配列（最初の window-1 個は NaN）
+    """
+    values = np.asarray(values, dtype=float)
+    alpha = 1 / window
+    old_weight = 1 - alpha
+    if values.ndim == 1:
+        return _wilder_average_1d(values.tolist(), window, alpha, old_weight)
+
+    result = np.empty(values.shape)
+    if values.shape[-1] == 0:
+        return result
+
+    weighted = values[..., 0]
+    result[..., 0] = weighted
+    for position in range(1, values.shape[-1]):
+        current = values[..., position]
+        # 同じ値が続く場合は丸め誤差を出さないようにそのまま（pandasと同じ）
+        weighted = np.where(
+            weighted != current,
+            (old_weight * weighted + alpha * current) / (old_weight + alpha),
+            weighted,
+        )
+        result[..., position] = weighted
+    result[..., : window - 1] = np.nan
+    return result
+
+
+def _wilder_average_1d(
+    values: List[float], window: int, alpha: float, old_weight: float
+) -> np.ndarray:
+    """wilder_average() の1銘柄分（要素ごとのNumPy呼び出しを避けてfloatで計算）"""
+    result = np.empty(len(values))
+    if not values:
+        return result
+
+    weighted = values[0]
+    result[0] = weighted
+    for position in range(1, len(values)):
+        current = values[position]
+        if weighted != current:
+            weighted = (old_weight * weighted + alpha * current) / (
+                old_weight + alpha
+            )
+        result[position] = weighted
+    result[: window - 1] = np.nan
+    return result
+
+
+def rsi(values: np.ndarray, window: int = 14) -> np.ndarray:
+    """
+    RSI（最後の軸に沿って計算、ta.momentum.RSIIndicator と同じ）
+
+    Args:
+        values: 終値（1次元、または銘柄×日の2次元配列）
+        window: 期間
+
+    Returns:
+        np.ndarray: 同じ形の配列（最初の window-1 個は NaN、下落がなければ100）
+    """
+    values = np.asarray(values, dtype=float)
+    prepend = np.full(values.shape[:-1] + (1,), np.nan)
+    diff = np.diff(values, axis=-1, prepend=prepend)
+    # 前日比が取れない位置（先頭・欠損）は上昇・下落とも0とみなす（taと同じ）
+    up = np.where(diff > 0, diff, 0.0)
+    down = np.where(diff < 0, -diff, 0.0)
+
+    average_up = wilder_average(up, window)
+    average_down = wilder_average(down, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_strength = average_up / average_down
+        return np.where(
+            average_down == 0, 100.0, 100 - (100 / (1 + relative_strength))
+        )
+
+
+def calculate_trend_indicators(
+    price_history: Union[PriceSeries, List[Dict]],
+) -> Dict:
     """
     テクニカル指標を計算
 
     Args:
-        price_history: 株価履歴（date, close, open, high, low, volume）
+        price_history: 株価履歴（PriceSeries、または date, close を持つ辞書のリスト）
 
     Returns:
         Dict: {
@@ -31,7 +145,7 @@ def calculate_trend_indicators(price_history: List[Dict]) -> Dict:
         ValueError: データが不足している場合
     """
     # 空データのチェック
-    if not price_history:
+    if not len(price_history):
         raise ValueError("株価履歴が空です")
 
     if len(price_history) < 25:
@@ -41,42 +155,41 @@ def calculate_trend_indicators(price_history: List[Dict]) -> Dict:
         )
 
     try:
-        # DataFrameに変換
-        df = pd.DataFrame(price_history)
-
-        # 必須カラムのチェック
-        required_columns = ["date", "close"]
-        missing = [col for col in required_columns if col not in df.columns]
-        if missing:
-            raise ValueError(f"必須カラムが不足: {missing}")
-
-        df["date"] = pd.to_datetime(df["date"])
-        df = df.sort_values("date")
-
-        # テクニカル指標を計算（taライブラリを使用）
-        sma_5 = SMAIndicator(close=df["close"], window=5)
-        df["SMA_5"] = sma_5.sma_indicator()
+        if not isinstance(price_history, PriceSeries):
+            # 必須カラムのチェック
+            required_columns = ["date", "close"]
+            missing = [
+                col
+                for col in required_columns
+                if not any(col in bar for bar in price_history)
+            ]
+            if missing:
+                raise ValueError(f"必須カラムが不足: {missing}")
+            price_history = PriceSeries.from_records(price_history)
 
-        sma_25 = SMAIndicator(close=df["close"], window=25)
-        df["SMA_25"] = sma_25.sma_indicator()
+        # テクニカル指標を計算（日付順に並んだ終値から）
+        close = price_history.close
+        sma_5 = sma(close, 5)
+        sma_25 = sma(close, 25)
+        rsi_14 = rsi(close, 14)
 
-        rsi = RSIIndicator(close=df["close"], window=14)
-        df["RSI_14"] = rsi.rsi()
-
-        # NaNを除去（移動平均の計算初期にNaNが発生）
-        df = df.dropna()
+        # 移動平均の計算初期（NaN）を除いた行
+        rows = np.flatnonzero(
+            ~(np.isnan(close) | np.isnan(sma_5) | np.isnan(sma_25) | np.isnan(rsi_14))
+        )
 
-        if len(df) < 2:
-            raise ValueError(f"計算後のデータが不足（{len(df)}行、最低2行必要）")
+        if len(rows) < 2:
+            raise ValueError(f"計算後のデータが不足（{len(rows)}行、最低2行必要）")
 
         # 最新値を返す
+        latest, previous = rows[-1], rows[-2]
         return {
-            "sma_5": float(df["SMA_5"].iloc[-1]),
-            "sma_25": float(df["SMA_25"].iloc[-1]),
-            "rsi": float(df["RSI_14"].iloc[-1]),
-            "current_price": float(df["close"].iloc[-1]),
-            "previous_sma_5": float(df["SMA_5"].iloc[-2]),
-            "previous_sma_25": float(df["SMA_25"].iloc[-2]),
+            "sma_5": float(sma_5[latest]),
+            "sma_25": float(sma_25[latest]),
+            "rsi": float(rsi_14[latest]),
+            "current_price": float(close[latest]),
+            "previous_sma_5": float(sma_5[previous]),
+            "previous_sma_25": float(sma_25[previous]),
         }
     except KeyError as e:
         raise ValueError(f"データ形式エラー: {e}")
@@ -84,6 +197,118 @@ def calculate_trend_indicators(price_history: List[Dict]) -> Dict:
         raise ValueError(f"計算エラー: {e}")
 
 
+def build_close_matrix(
+    histories: Dict[str, PriceSeries],
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    銘柄ごとの株価履歴を（銘柄×日）の終値行列に並べる
+
+    日付は全銘柄の営業日の和集合とし、その銘柄にバーがない日（休場・売買停止、
+    他市場のみの営業日）は NaN にする。
+
+    Args:
+        histories: ティッカーをキーとした株価履歴
+
+    Returns:
+        Tuple: (ティッカーのリスト, 日付の配列, 終値の行列)
+    """
+    tickers = list(histories)
+    if not tickers:
+        return tickers, np.empty(0, "datetime64[ns]"), np.empty((0, 0))
+
+    dates = np.unique(np.concatenate([histories[t].dates for t in tickers]))
+    closes = np.full((len(tickers), len(dates)), np.nan)
+    for row, ticker in enumerate(tickers):
+        history = histories[ticker]
+        closes[row, np.searchsorted(dates, history.dates)] = history.close
+    return tickers, dates, closes
+
+
+def calculate_matrix_indicators(closes: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    終値行列の全銘柄のテクニカル指標をまとめて計算
+
+    各行のNaNを除いた終値を左に詰めてから計算するため、欠損日を飛ばして
+    1銘柄ずつ calculate_trend_indicators() を呼んだ場合と同じ値になる。
+
+    Args:
+        closes: 終値の行列（銘柄×日、日付順、欠損は NaN）
+
+    Returns:
+        Dict: 銘柄ごとの配列 {
+            'sma_5', 'sma_25', 'rsi', 'current_price',
+            'previous_sma_5', 'previous_sma_25',
+            'golden_cross', 'dead_cross': 5日線が25日線を上抜け・下抜けしたか,
+            'valid': 計算できたか（欠損を除いて26日以上）
+        }
+    """
+    closes = np.asarray(closes, dtype=float)
+    if not closes.shape[-1]:
+        closes = np.full((len(closes), 1), np.nan)
+    present = ~np.isnan(closes)
+    counts = present.sum(axis=1)
+    # 詰めた後の右側は欠損だけになるため、最も長い銘柄の日数までに切り詰める
+    order = np.argsort(~present, axis=1, kind="stable")[:, : counts.max(initial=0)]
+    packed = np.take_along_axis(closes, order, axis=1)
+
+    sma_5 = sma(packed, 5)
+    sma_25 = sma(packed, 25)
+    rsi_14 = rsi(packed, 14)
+
+    # 最新と前日の位置（25日移動平均が前日にも必要なため26日以上）
+    rows = np.arange(len(packed))
+    latest = np.maximum(counts - 1, 0)
+    previous = np.maximum(counts - 2, 0)
+    result = {
+        "sma_5": sma_5[rows, latest],
+        "sma_25": sma_25[rows, latest],
+        "rsi": rsi_14[rows, latest],
+        "current_price": packed[rows, latest],
+        "previous_sma_5": sma_5[rows, previous],
+        "previous_sma_25": sma_25[rows, previous],
+    }
+    result["valid"] = (counts >= 26) & ~np.isnan(result["rsi"])
+
+    # ゴールデンクロス・デッドクロス（analyze_trend() と同じ条件）
+    with np.errstate(invalid="ignore"):
+        result["golden_cross"] = (
+            result["previous_sma_5"] <= result["previous_sma_25"]
+        ) & (result["sma_5"] > result["sma_25"])
+        result["dead_cross"] = (
+            result["previous_sma_5"] >= result["previous_sma_25"]
+        ) & (result["sma_5"] < result["sma_25"])
+    return result
+
+
+def calculate_universe_indicators(
+    histories: Dict[str, PriceSeries],
+) -> Dict[str, Dict]:
+    """
+    全銘柄のテクニカル指標を（銘柄×日）の行列でまとめて計算
+
+    Args:
+        histories: ティッカーをキーとした株価履歴
+
+    Returns:
+        Dict: ティッカーをキーとした calculate_trend_indicators() と同じ形の辞書
+            （golden_cross / dead_cross を追加。計算できない銘柄は含まない）
+    """
+    tickers, _, closes = build_close_matrix(histories)
+    if not tickers:
+        return {}
+
+    columns = {
+        name: values.tolist()
+        for name, values in calculate_matrix_indicators(closes).items()
+    }
+    valid = columns.pop("valid")
+    return {
+        ticker: {name: values[row] for name, values in columns.items()}
+        for row, ticker in enumerate(tickers)
+        if valid[row]
+    }
+
+
 def analyze_trend(indicators: Dict) -> Dict:
     """
     トレンドを判定
@@ -0,0 +1,22 @@
+"""analysis_prompt.pyのテスト"""
+
+
+def test_static_prefix_comes_first_and_is_shared():
+    """固定部分が先頭にあり、1銘柄ずつ・まとめての両方で同じ書き出しになる"""
+    from analysis_prompt import (
+        ANALYSIS_INSTRUCTIONS,
+        GROUP_SYSTEM_PROMPT,
+        SINGLE_SYSTEM_PROMPT,
+        chat_request,
+    )
+
+    first = chat_request(SINGLE_SYSTEM_PROMPT, "【銘柄情報】\n- ティッカー: 7203\n")
+    second = chat_request(SINGLE_SYSTEM_PROMPT, "【銘柄情報】\n- ティッカー: 6758\n")
+
+    assert first["messages"][0] == second["messages"][0]
+    assert first["messages"][0]["role"] == "system"
+    assert first["messages"][1]["content"].endswith("7203\n")
+    assert SINGLE_SYSTEM_PROMPT.startswith(ANALYSIS_INSTRUCTIONS)
+    assert GROUP_SYSTEM_PROMPT.startswith(ANALYSIS_INSTRUCTIONS)
+    # json_object モードはメッセージに「JSON」を含む必要がある
+    assert "JSON" in ANALYSIS_INSTRUCTIONS
@@ -0,0 +1,61 @@
+"""benchmarks（オフラインベンチマーク）のテスト"""
+
+
+def test_fake_yahoo_feeds_bulk_download_and_injects_rate_limits():
+    """代役のyfinanceは一括取得の形式で返し、429はレート制限として扱われる"""
+    import pytest
+
+    from benchmarks.fakes import FakeYahoo, YFRateLimitError
+    from market_data import download_price_histories
+    from rate_limiter import is_rate_limit_error
+
+    yahoo = FakeYahoo()
+    yahoo.install()
+    try:
+        histories = download_price_histories(["1000.T", "B0001"], max_retries=0)
+        assert set(histories) == {"1000.T", "B0001"}
+        assert len(histories["1000.T"]) == 63
+        # 同じシンボルは毎回同じデータ
+        again = download_price_histories(["1000.T"], max_retries=0)
+        assert list(again["1000.T"].records()) == list(histories["1000.T"].records())
+
+        yahoo.rate_limit_ratio = 1.0
+        import yfinance
+
+        with pytest.raises(YFRateLimitError) as excinfo:
+            yfinance.Ticker("1000.T").info
+        assert is_rate_limit_error(excinfo.value)
+    finally:
+        yahoo.uninstall()
+
+
+def test_compare_flags_throughput_and_round_trip_regressions():
+    """スループットの低下・DB往復の増加が許容幅を超えたら劣化とする"""
+    from benchmarks.run_benchmark import compare
+
+    baseline = [
+        {"size": 100, "tickers_per_second": 40.0, "db_round_trips_per_ticker": 0.5},
+        {"size": 1600, "tickers_per_second": 40.0, "db_round_trips_per_ticker": 0.5},
+    ]
+    results = [
+        {"size": 100, "tickers_per_second": 35.0, "db_round_trips_per_ticker": 0.6},
+        {"size": 1600, "tickers_per_second": 20.0, "db_round_trips_per_ticker": 1.0},
+        {"size": 4000, "tickers_per_second": 1.0, "db_round_trips_per_ticker": 9.0},
+    ]
+
+    regressions = compare(results, baseline, max_regression=0.25)
+
+    assert len(regressions) == 2
+    assert all(regression.startswith("1600銘柄") for regression in regressions)
+
+
+def test_ta_benchmark_compares_per_ticker_and_universe_paths():
+    """テクニカル指標のベンチマークは両方の計算を計測し、結果の一致を確かめる"""
+    from benchmarks.ta_benchmark import run
+
+    result = run(tickers=6, days=40, repeat=1)
+
+    assert result["tickers"] == 6
+    assert result["per_ticker_seconds"] > 0
+    assert result["universe_seconds"] > 0
+    assert result["mismatched"] == []
@@ -0,0 +1,51 @@
+"""circuit_breaker.pyのテスト"""
+
+import pytest
+
+
+def test_breaker_opens_on_failure_rate_and_recovers_after_probes():
+    """失敗率が閾値を超えたら開き、クールダウン後の試行が成功したら閉じる"""
+    from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+    breaker = CircuitBreaker(
+        "test", window_size=4, min_calls=4, cooldown=0.05, half_open_probes=2
+    )
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    # クールダウンが終わるまで待機してから半開で通す
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    breaker.record_success()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+    outage = breaker.outages[0]
+    assert outage["ended_at"] >= outage["started_at"]
+    assert breaker.describe_outages().startswith("test障害 ")
+
+
+def test_breaker_fails_fast_after_max_outage():
+    """試行が失敗し続けて障害が上限時間を超えたら以降は即時失敗する"""
+    from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+    breaker = CircuitBreaker(
+        "test", window_size=2, min_calls=2, cooldown=0.02, max_outage=0.1
+    )
+    breaker.record_failure()
+    breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        while True:
+            breaker.before_call()
+            breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.get_stats()["aborted"]
+    assert breaker.get_stats()["rejected"] == 2
+    assert "（中止）" in breaker.describe_outages()
@@ -0,0 +1,224 @@
+"""db_pool.pyのテスト
+
+psycopg2.connect を偽の接続に置き換えるため、データベースは不要。
+"""
+
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeConnection:
+    """疎通確認・ロールバック・切断を記録する接続"""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.queries = 0
+        self.rollbacks = 0
+        # psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.info = SimpleNamespace(transaction_status=0)
+
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, query):
+        import psycopg2
+
+        if self.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.queries += 1
+
+    def rollback(self):
+        import psycopg2
+
+        if self.broken:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """psycopg2.connect が作成した偽の接続のリスト"""
+    import psycopg2
+
+    created = []
+
+    def connect(*args, **kwargs):
+        created.append(FakeConnection())
+        return created[-1]
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return created
+
+
+def test_get_database_url_strips_pgbouncer_param(monkeypatch):
+    """Prisma用のpgbouncerパラメータを削除し、その他のパラメータは残す"""
+    from db_pool import get_database_url
+
+    monkeypatch.setenv(
+        "DATABASE_URL",
+        "postgresql://user:pw@db.example.com:6543/postgres"
+        "?pgbouncer=true&sslmode=require",
+    )
+
+    assert get_database_url() == (
+        "postgresql://user:pw@db.example.com:6543/postgres?sslmode=require"
+    )
+
+
+def test_get_database_url_uses_default(monkeypatch):
+    """環境変数が未設定の場合はデフォルト値を使う"""
+    from db_pool import get_database_url
+
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+
+    assert get_database_url("postgresql://localhost/dev") == (
+        "postgresql://localhost/dev"
+    )
+    assert get_database_url() is None
+
+
+def test_connection_waits_for_free_slot_at_maxconn(connections):
+    """上限に達した場合は PoolError にせず、空きが出るまで待つ（待ち時間を記録）"""
+    import threading
+
+    from db_pool import ConnectionPool
+
+    pool = ConnectionPool("postgresql://fake", maxconn=1)
+    checked_out = threading.Event()
+    release = threading.Event()
+    acquired = []
+
+    def hold():
+        with pool.connection():
+            checked_out.set()
+            release.wait(5)
+
+    def wait():
+        with pool.connection() as conn:
+            acquired.append(conn)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert checked_out.wait(5)
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    assert acquired == []
+
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert acquired == connections
+    assert len(connections) == 1
+
+    stats = pool.get_stats()
+    assert stats["checkouts"] == 2
+    assert stats["max_wait_ms"] >= 200
+    assert stats["avg_wait_ms"] >= stats["max_wait_ms"] / 2
+    assert stats["reconnects"] == 0
+
+
+def test_idle_broken_connection_is_replaced_on_checkout(connections):
+    """アイドルだった接続のみ疎通確認し、切断されていれば張り直す"""
+    from db_pool import ConnectionPool
+
+    pool = ConnectionPool("postgresql://fake", maxconn=2, health_check_interval=30)
+    first = connections[0]
+    first.broken = True
+
+    # 一度も使っていない接続は疎通確認する
+    with pool.connection() as conn:
+        assert conn is not first
+    assert first.closed
+    assert pool.get_stats()["reconnects"] == 1
+
+    # 直近に使った接続は確認を省略
+    with pool.connection() as again:
+        assert again is conn
+    assert conn.queries == 0
+
+    # 一定時間アイドルだった接続は確認する
+    pool.health_check_interval = 0
+    with pool.connection() as again:
+        assert again is conn
+    assert conn.queries == 1
+
+    conn.broken = True
+    with pool.connection() as replaced:
+        assert replaced is connections[-1]
+    assert conn.closed
+    assert len(connections) == 3
+    assert pool.get_stats()["reconnects"] == 2
+
+
+def test_checkin_rolls_back_and_discards_broken_connection(connections):
+    """返却時にロールバックし、ロールバックできない接続は破棄する"""
+    from db_pool import ConnectionPool
+
+    pool = ConnectionPool("postgresql://fake", maxconn=1)
+
+    with pool.connection() as conn:
+        rollbacks = conn.rollbacks
+    assert conn.rollbacks == rollbacks + 1
+
+    # 例外で抜けた場合もロールバックして返却する（上限1でも次を借りられる）
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            rollbacks = conn.rollbacks
+            raise RuntimeError("query failed")
+    assert conn.rollbacks == rollbacks + 1
+
+    with pool.connection() as again:
+        assert again is conn
+        conn.broken = True
+    assert conn.closed
+
+    with pool.connection() as replaced:
+        assert replaced is not conn
+    assert len(connections) == 2
+    assert pool.get_stats()["checkouts"] == 4
+
+
+def test_concurrently_returned_connections_are_kept_open(connections):
+    """同時に借りた接続は返却後も閉じずに再利用する（maxconn本まで保持）"""
+    from db_pool import ConnectionPool
+
+    pool = ConnectionPool("postgresql://fake", maxconn=3)
+
+    with pool.connection():
+        for _ in range(5):
+            with pool.connection() as first, pool.connection() as second:
+                assert first is not second
+
+    assert len(connections) == 3
+    assert not any(conn.closed for conn in connections)
+    stats = pool.get_stats()
+    assert stats["opened_connections"] == 3
+    assert stats["closed_connections"] == 0
+
+
+def test_closed_connection_is_forgotten(connections):
+    """閉じた接続の最終使用時刻を残さず、開閉回数を記録する"""
+    from db_pool import ConnectionPool
+
+    pool = ConnectionPool("postgresql://fake", maxconn=1)
+
+    with pool.connection() as conn:
+        conn.broken = True
+    assert conn.closed
+    assert id(conn) not in pool._last_used
+
+    with pool.connection() as replaced:
+        assert replaced is not conn
+    stats = pool.get_stats()
+    assert stats["opened_connections"] == 2
+    assert stats["closed_connections"] == 1
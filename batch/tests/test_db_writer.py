@@ -0,0 +1,95 @@
+"""db_writer.pyのテスト"""
+
+from contextlib import contextmanager
+
+
+class FakeConnection:
+    """コミット・ロールバック回数を記録する接続"""
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    """常に同じ接続を貸し出すプール"""
+
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def test_batch_writer_flushes_every_batch_size_items():
+    """batch_size件たまるごとに1トランザクションで書き込む"""
+    from db_writer import BatchWriter
+
+    pool = FakePool()
+    batches = []
+    writer = BatchWriter(
+        pool, lambda conn, items: batches.append(list(items)), batch_size=2
+    )
+
+    for item in range(5):
+        writer.add(item)
+    assert batches == [[0, 1], [2, 3]]
+
+    writer.close()
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert pool.conn.commits == 3
+    assert writer.get_stats()["written"] == 5
+
+
+def test_batch_writer_isolates_bad_row():
+    """一括書き込みが失敗したら1件ずつ書き直し、失敗した行だけを通知する"""
+    from db_writer import BatchWriter
+
+    def write(conn, items):
+        if "bad" in items:
+            raise ValueError("invalid row")
+
+    pool = FakePool()
+    results = {}
+    writer = BatchWriter(pool, write, batch_size=3)
+
+    for item in ("a", "bad", "b"):
+        writer.add(item, lambda ok, item=item: results.__setitem__(item, ok))
+
+    assert results == {"a": True, "bad": False, "b": True}
+    stats = writer.get_stats()
+    assert stats["fallbacks"] == 1
+    assert stats["written"] == 2
+    assert stats["failed"] == 1
+    # 一括1回 + 1件ずつの不正行でロールバック
+    assert pool.conn.rollbacks == 2
+
+
+def test_batch_writer_flushes_on_interval():
+    """件数がたまらなくても一定間隔で書き込む"""
+    import time
+
+    from db_writer import BatchWriter
+
+    pool = FakePool()
+    batches = []
+    with BatchWriter(
+        pool,
+        lambda conn, items: batches.append(list(items)),
+        batch_size=100,
+        flush_interval=0.05,
+    ) as writer:
+        writer.add("a")
+        deadline = time.monotonic() + 2
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert batches == [["a"]]
+
+    assert batches == [["a"]]
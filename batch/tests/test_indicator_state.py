@@ -0,0 +1,131 @@
+"""indicator_state.pyのテスト
+
+データベースを使うテストは TEST_DATABASE_URL が設定されている場合のみ実行する。
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+requires_db = pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"),
+    reason="TEST_DATABASE_URL が未設定",
+)
+
+
+def _history(days, seed=0, start=datetime(2026, 1, 5, 15)):
+    import numpy as np
+
+    from price_series import PriceSeries
+
+    rng = np.random.default_rng(seed)
+    closes = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    return PriceSeries.from_records(
+        [
+            {"date": start + timedelta(days=i), "close": float(close)}
+            for i, close in enumerate(closes)
+        ]
+    )
+
+
+def test_state_matches_full_recompute_when_advanced_bar_by_bar():
+    """1本ずつ進めた状態の指標が、株価履歴全体からの計算と一致する"""
+    from indicator_state import IndicatorState, update_state
+    from technical_analysis import calculate_trend_indicators
+
+    history = _history(90)
+
+    state, recomputed = update_state(None, history[:30])
+    assert recomputed
+    for end in range(31, 91):
+        state, recomputed = update_state(state, history[:end])
+        assert not recomputed
+
+    expected = calculate_trend_indicators(history)
+    indicators = state.indicators()
+    assert {name: indicators[name] for name in expected} == expected
+    assert state.bars == 90
+    assert len(state.closes) == 26
+    assert indicators == IndicatorState.from_history(history).indicators()
+
+    # 26本未満は指標を出さない
+    assert IndicatorState.from_history(history[:25]).indicators() is None
+
+
+def test_state_replaces_latest_bar_on_intraday_refresh():
+    """最新バーと同じ日時のバーは置き換え、何度更新しても全体からの計算と一致する"""
+    from indicator_state import IndicatorState, update_state
+    from price_series import PriceSeries
+
+    history = _history(40)
+    state = IndicatorState.from_history(history[:-1])
+
+    # 場中の値 → 終値 の順に同じ日のバーを取り込む
+    for close in (history.close[-1] * 1.05, history.close[-1] * 0.97):
+        refreshed = PriceSeries.concat([history[:-1], history[-1:]])
+        refreshed.close[-1] = close
+        state, recomputed = update_state(state, refreshed)
+        assert not recomputed
+        assert state.bars == 40
+        assert state.indicators() == IndicatorState.from_history(refreshed).indicators()
+
+    # 最新バーより古いバーは進められない
+    with pytest.raises(ValueError):
+        state.advance(history.date_at(0), 100.0)
+
+
+def test_state_recomputes_after_adjustment_or_gap():
+    """保存済みの終値が遡及調整された場合・最新バーが履歴にない場合は全体から計算し直す"""
+    from indicator_state import IndicatorState, update_state
+
+    history = _history(60, seed=1)
+    state = IndicatorState.from_history(history[:50])
+
+    # 1:2の株式分割で過去の終値が半分になった
+    adjusted = history[:]
+    adjusted.close = adjusted.close / 2
+    rebuilt, recomputed = update_state(state, adjusted)
+    assert recomputed
+    assert rebuilt.indicators() == IndicatorState.from_history(adjusted).indicators()
+
+    # 状態の最新バーが株価履歴の範囲外
+    state = IndicatorState.from_history(history[:50])
+    _, recomputed = update_state(state, history[50:])
+    assert recomputed
+
+
+@requires_db
+def test_states_round_trip_through_database():
+    """保存した状態を読み込むと同じ指標になる"""
+    import psycopg2
+
+    from benchmarks.database import temporary_schema
+    from indicator_state import (
+        IndicatorState,
+        load_indicator_states,
+        save_indicator_states,
+    )
+
+    history = _history(40)
+    state = IndicatorState.from_history(history)
+
+    with temporary_schema(os.environ["TEST_DATABASE_URL"]) as url:
+        conn = psycopg2.connect(url)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO stocks (id, ticker, name, market, updated_at)
+                VALUES ('s1', 'T001', 'テスト', 'JP', NOW())
+                """
+            )
+        conn.commit()
+
+        save_indicator_states(conn, {"s1": state})
+        save_indicator_states(conn, {"s1": state})  # 2回目は上書き
+        loaded = load_indicator_states(conn, ["s1", "s2"])
+        conn.close()
+
+    assert set(loaded) == {"s1"}
+    assert loaded["s1"].last_date == state.last_date
+    assert loaded["s1"].indicators() == state.indicators()
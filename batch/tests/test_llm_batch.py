@@ -0,0 +1,287 @@
+"""llm_batch.pyのテスト（files / batches エンドポイントを模したローカルサーバー）"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeBatchServer(ThreadingHTTPServer):
+    """OpenAIのfiles / batchesエンドポイントを模したサーバー"""
+
+    def __init__(
+        self, polls_until_complete: int = 1, failed_ids=(), cancelled_ids=None
+    ):
+        super().__init__(("127.0.0.1", 0), FakeBatchHandler)
+        self.polls_until_complete = polls_until_complete
+        self.failed_ids = set(failed_ids)
+        # キャンセルまでに処理済みの custom_id（None の場合はキャンセルが完了しない）
+        self.cancelled_ids = cancelled_ids
+        self.files = {}
+        self.batches = {}
+        self.cancelled = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def complete(self, batch_id: str, status: str = "completed", only=None):
+        """入力ファイルの各リクエスト（only を指定した場合はその分）に応答して出力ファイルを作る"""
+        batch = self.batches[batch_id]
+        outputs, errors = [], []
+        for line in self.files[batch["input_file_id"]].splitlines():
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            if only is not None and custom_id not in only:
+                continue
+            if custom_id in self.failed_ids:
+                errors.append(
+                    {
+                        "custom_id": custom_id,
+                        "response": None,
+                        "error": {"code": "server_error", "message": "boom"},
+                    }
+                )
+                continue
+
+            prompt = request["body"]["messages"][-1]["content"]
+            content = json.dumps(
+                {"recommendation": "Buy", "confidence_score": 70, "reason": prompt}
+            )
+            outputs.append(
+                {
+                    "custom_id": custom_id,
+                    "response": {
+                        "status_code": 200,
+                        "body": {
+                            "choices": [{"message": {"content": content}}],
+                            "usage": {"prompt_tokens": 100, "completion_tokens": 20},
+                        },
+                    },
+                    "error": None,
+                }
+            )
+
+        for key, records in (("output_file_id", outputs), ("error_file_id", errors)):
+            if records:
+                file_id = f"file-{key}-{batch_id}"
+                self.files[file_id] = "\n".join(json.dumps(r) for r in records)
+                batch[key] = file_id
+        batch["status"] = status
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers["Content-Length"]))
+
+    def do_POST(self):
+        server = self.server
+        if self.path == "/v1/files":
+            boundary = self.headers["Content-Type"].split("boundary=")[1].encode()
+            content = b""
+            for part in self._read_body().split(b"--" + boundary):
+                if b'name="file"' in part:
+                    content = part.split(b"\r\n\r\n", 1)[1].rstrip(b"\r\n")
+            file_id = f"file-{len(server.files)}"
+            server.files[file_id] = content.decode()
+            self._send({"id": file_id, "object": "file", "purpose": "batch"})
+        elif self.path == "/v1/batches":
+            request = json.loads(self._read_body())
+            batch_id = f"batch-{len(server.batches)}"
+            server.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "status": "validating",
+                "polls": 0,
+                "output_file_id": None,
+                "error_file_id": None,
+            }
+            self._send(server.batches[batch_id])
+        elif self.path.endswith("/cancel"):
+            batch_id = self.path.split("/")[-2]
+            server.cancelled.append(batch_id)
+            server.batches[batch_id]["status"] = "cancelling"
+            self._send(server.batches[batch_id])
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        server = self.server
+        if self.path.startswith("/v1/batches/"):
+            batch = server.batches[self.path.split("/")[-1]]
+            batch["polls"] += 1
+            if batch["status"] in ("validating", "in_progress"):
+                if batch["polls"] > server.polls_until_complete:
+                    server.complete(batch["id"])
+                else:
+                    batch["status"] = "in_progress"
+            elif batch["status"] == "cancelling" and server.cancelled_ids is not None:
+                server.complete(batch["id"], "cancelled", server.cancelled_ids)
+            self._send(batch)
+        elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+            data = server.files[self.path.split("/")[-2]].encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def batch_server():
+    servers = []
+
+    def start(**kwargs):
+        server = FakeBatchServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _client(server):
+    from openai import OpenAI
+
+    return OpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+
+def _requests(custom_ids):
+    return [
+        {
+            "custom_id": custom_id,
+            "body": {
+                "model": "gpt-4o-mini",
+                "messages": [{"role": "user", "content": f"analyze {custom_id}"}],
+            },
+        }
+        for custom_id in custom_ids
+    ]
+
+
+def test_run_batch_returns_results_keyed_by_custom_id(batch_server):
+    """投入 → ポーリング → 出力ファイル取得 の結果をcustom_idで引ける"""
+    from llm_batch import run_batch
+
+    server = batch_server(polls_until_complete=2, failed_ids={"stock-2"})
+    results = run_batch(
+        _client(server), _requests(["stock-1", "stock-2"]), poll_interval=0.01
+    )
+
+    assert json.loads(results["stock-1"]["content"])["reason"] == "analyze stock-1"
+    assert results["stock-1"]["usage"]["prompt_tokens"] == 100
+    assert results["stock-1"]["error"] is None
+    assert results["stock-2"]["content"] is None
+    assert results["stock-2"]["error"]["code"] == "server_error"
+
+    # アップロードされた入力ファイルはBatch APIの形式
+    lines = [json.loads(line) for line in server.files["file-0"].splitlines()]
+    assert [line["custom_id"] for line in lines] == ["stock-1", "stock-2"]
+    assert lines[0]["url"] == "/v1/chat/completions"
+
+
+def test_wait_for_batch_cancels_on_timeout(batch_server):
+    """待機上限を超えたらバッチをキャンセルし、キャンセルも終わらなければ例外を送出する"""
+    from llm_batch import BatchTimeoutError, submit_batch, wait_for_batch
+
+    server = batch_server(polls_until_complete=1000)
+    client = _client(server)
+    batch_id = submit_batch(client, _requests(["stock-1"]))
+
+    with pytest.raises(BatchTimeoutError):
+        wait_for_batch(
+            client, batch_id, poll_interval=0.01, timeout=0.05, cancel_timeout=0.05
+        )
+    assert server.cancelled == [batch_id]
+
+
+def test_run_batch_returns_results_completed_before_cancel(batch_server):
+    """待機上限でキャンセルしたバッチも、処理済みの結果は読み込む"""
+    from llm_batch import run_batch
+
+    server = batch_server(polls_until_complete=1000, cancelled_ids={"stock-1"})
+    results = run_batch(
+        _client(server),
+        _requests(["stock-1", "stock-2"]),
+        poll_interval=0.01,
+        timeout=0.05,
+    )
+
+    assert server.cancelled == ["batch-0"]
+    assert set(results) == {"stock-1"}
+    assert results["stock-1"]["error"] is None
+
+
+def test_run_llm_batch_defers_missing_results_after_deadline(monkeypatch):
+    """制限時間を過ぎてからはバッチ結果のない銘柄を同期呼び出しせず持ち越す"""
+    from types import SimpleNamespace
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import batch_analysis
+    from pipeline import Stage
+
+    deferred = []
+    admission = SimpleNamespace(
+        admit=lambda: True, finish=lambda: None, remaining_seconds=lambda: 0.0
+    )
+
+    def analyze_with_openai(stock_data, trend_info):
+        raise AssertionError("期限後に同期呼び出しした")
+
+    def prepare_stages(force, price_histories, record, fetch_workers, ta_workers):
+        return [
+            Stage(
+                "fetch",
+                lambda stock, state: {
+                    "stock": stock,
+                    "stock_data": None,
+                    "trend_info": None,
+                },
+            )
+        ]
+
+    monkeypatch.setattr(batch_analysis, "prepare_stages", prepare_stages)
+    monkeypatch.setattr(batch_analysis, "analyze_with_openai", analyze_with_openai)
+    monkeypatch.setattr(
+        batch_analysis,
+        "build_chat_request",
+        lambda stock_data, trend_info: {"model": "gpt-4o-mini", "messages": []},
+    )
+    monkeypatch.setattr(batch_analysis, "run_batch", lambda *args, **kwargs: {})
+    monkeypatch.setattr(
+        batch_analysis,
+        "run_manifest",
+        SimpleNamespace(
+            start=lambda stock_id: None,
+            defer=lambda stock_id, reason: deferred.append(stock_id),
+        ),
+    )
+
+    stocks = [{"id": f"s{i}", "ticker": f"T00{i}"} for i in range(3)]
+    stock_queue = batch_analysis.run_llm_batch(
+        stocks, writer=None, admission=admission, poll_interval=0.01
+    )
+
+    assert deferred == ["s0", "s1", "s2"]
+    assert stock_queue.deferred == 3
+    assert stock_queue.success == stock_queue.failed == 0
@@ -0,0 +1,82 @@
+"""llm_cache.pyのテスト"""
+
+
+def _request(prompt, model="gpt-4o-mini"):
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "JSON形式で回答してください。"},
+            {"role": "user", "content": prompt},
+        ],
+        "response_format": {"type": "json_object"},
+    }
+
+
+def test_request_fingerprint_changes_with_any_input():
+    """モデル名・プロンプトが1文字でも違えば別のキーになる"""
+    from llm_cache import request_fingerprint
+
+    base = request_fingerprint(_request("7203 現在価格: 2500円"))
+
+    assert base == request_fingerprint(_request("7203 現在価格: 2500円"))
+    assert base != request_fingerprint(_request("7203 現在価格: 2501円"))
+    assert base != request_fingerprint(_request("7203 現在価格: 2500円", "gpt-4o"))
+
+
+def test_llm_cache_counts_hits_and_saved_tokens(tmp_path):
+    """ヒット時は保存時のトークン数を節約量として計上し、再オープン後も使える"""
+    from llm_cache import LLMCache
+
+    path = str(tmp_path / "cache.sqlite3")
+    cache = LLMCache(path)
+    assert cache.get("key") is None
+    cache.put("key", '{"recommendation": "Buy"}', 120, 30)
+    cache.close()
+
+    cache = LLMCache(path)
+    assert cache.get("key") == '{"recommendation": "Buy"}'
+    assert cache.get("other") is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["saved_input_tokens"] == 120
+    assert stats["saved_output_tokens"] == 30
+    cache.close()
+
+
+def test_llm_cache_evicts_expired_and_least_recently_used(monkeypatch):
+    """期限切れは返さず、件数上限を超えたら最終利用が古いものから削除する"""
+    import llm_cache
+    from llm_cache import LLMCache
+
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+
+    cache = LLMCache(":memory:", ttl_seconds=100, max_entries=2)
+    cache.put("a", "A", 1, 1)
+    now[0] += 1
+    cache.put("b", "B", 1, 1)
+    now[0] += 1
+    cache.get("a")  # aを最近使ったことにする
+    now[0] += 1
+    cache.put("c", "C", 1, 1)
+
+    assert cache.evict() == 1
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+
+    now[0] += 101
+    assert cache.get("c") is None
+
+
+def test_request_fingerprint_separates_variants():
+    """同じリクエストでも区別を付けたキーは別になる（指定しなければ従来どおり）"""
+    from llm_cache import request_fingerprint
+
+    request = _request("7203 現在価格: 2500円")
+
+    assert request_fingerprint(request, variant=None) == request_fingerprint(request)
+    assert request_fingerprint(request, variant="group") != request_fingerprint(
+        request
+    )
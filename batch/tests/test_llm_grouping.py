@@ -0,0 +1,76 @@
+"""llm_grouping.pyのテスト"""
+
+import json
+
+REASON = "業績が安定しており割安感があるため。"
+
+
+def _item(ticker, sector):
+    return {"stock": {"id": ticker, "ticker": ticker, "sector": sector}}
+
+
+def test_sector_grouper_groups_by_sector_and_flushes_rest():
+    """同じセクターが K 件たまったら取り出し、残りはflushで返す"""
+    from llm_grouping import SectorGrouper
+
+    grouper = SectorGrouper(2)
+
+    assert grouper.add(_item("A", "銀行業")) is None
+    assert grouper.add(_item("B", "電気機器")) is None
+    group = grouper.add(_item("C", "銀行業"))
+    assert [item["stock"]["ticker"] for item in group] == ["A", "C"]
+    assert grouper.add(_item("D", None)) is None
+
+    rest = grouper.flush()
+    assert sorted(item["stock"]["ticker"] for g in rest for item in g) == ["B", "D"]
+    assert grouper.flush() == []
+
+
+def test_parse_group_response_keeps_only_valid_requested_entries():
+    """依頼した銘柄の正しい分析だけを返す（不正・重複・依頼外は捨てる）"""
+    from llm_grouping import parse_group_response
+
+    content = json.dumps(
+        {
+            "analyses": [
+                {"ticker": "7203", "recommendation": "Buy",
+                 "confidence_score": "80", "reason": REASON},
+                {"ticker": "7203", "recommendation": "Sell",
+                 "confidence_score": 10, "reason": REASON},
+                {"ticker": "6758", "recommendation": "Strong Buy",
+                 "confidence_score": 70, "reason": REASON},
+                {"ticker": "9984", "recommendation": "Hold",
+                 "confidence_score": 101, "reason": REASON},
+                {"ticker": "8306", "recommendation": "Hold",
+                 "confidence_score": True, "reason": REASON},
+                {"ticker": "6501", "recommendation": "Hold",
+                 "confidence_score": 50, "reason": "短い"},
+                {"ticker": "AAPL", "recommendation": "Buy",
+                 "confidence_score": 90, "reason": REASON},
+                "not an object",
+            ]
+        },
+        ensure_ascii=False,
+    )
+
+    results = parse_group_response(
+        content, ["7203", "6758", "9984", "8306", "6501", "4063"]
+    )
+
+    assert results == {
+        "7203": {"recommendation": "Buy", "confidence_score": 80, "reason": REASON}
+    }
+
+
+def test_parse_group_response_accepts_ticker_keyed_object_and_rejects_garbage():
+    """ティッカーをキーにした形式も受け付け、JSONでない応答は空にする"""
+    from llm_grouping import parse_group_response
+
+    content = json.dumps(
+        {"7203": {"recommendation": "Hold", "confidence_score": 55, "reason": REASON}},
+        ensure_ascii=False,
+    )
+
+    assert parse_group_response(content, ["7203"])["7203"]["confidence_score"] == 55
+    assert parse_group_response("not json", ["7203"]) == {}
+    assert parse_group_response("[1, 2]", ["7203"]) == {}
@@ -0,0 +1,152 @@
+"""market_data.pyのテスト"""
+
+import pandas as pd
+
+
+def _ohlcv(dates, base):
+    return pd.DataFrame(
+        {
+            "Open": [base + i for i in range(len(dates))],
+            "High": [base + i + 1 for i in range(len(dates))],
+            "Low": [base + i - 1 for i in range(len(dates))],
+            "Close": [base + i for i in range(len(dates))],
+            "Volume": [1000] * len(dates),
+        },
+        index=dates,
+    )
+
+
+def test_download_price_histories_splits_chunks_by_ticker(monkeypatch):
+    """複数銘柄の一括取得結果を銘柄ごとの履歴に分解する"""
+    import market_data
+
+    dates = pd.date_range("2026-01-05", periods=3, tz="Asia/Tokyo")
+    calls = []
+
+    def fake_download(tickers, **kwargs):
+        calls.append(list(tickers))
+        frames = {t: _ohlcv(dates, 100 * (i + 1)) for i, t in enumerate(tickers)}
+        data = pd.concat(frames, axis=1)
+        # 1銘柄だけ最終日が欠損（休場・売買停止など）
+        data.loc[dates[-1], (tickers[0], "Close")] = float("nan")
+        return data
+
+    monkeypatch.setattr(market_data.yf, "download", fake_download)
+
+    result = market_data.download_price_histories(
+        ["7203.T", "6758.T", "9984.T"], chunk_size=2
+    )
+
+    assert calls == [["7203.T", "6758.T"], ["9984.T"]]
+    assert set(result) == {"7203.T", "6758.T", "9984.T"}
+    assert len(result["7203.T"]) == 2
+    assert len(result["6758.T"]) == 3
+    assert result["6758.T"].close[-1] == 202.0
+    assert result["6758.T"].date_at(0) == dates[0].tz_convert("UTC").tz_localize(
+        None
+    )
+
+
+def test_to_yahoo_ticker():
+    """日本株のみ.Tサフィックスを付与する"""
+    from market_data import to_yahoo_ticker
+
+    assert to_yahoo_ticker("7203", "JP") == "7203.T"
+    assert to_yahoo_ticker("7203.T", "JP") == "7203.T"
+    assert to_yahoo_ticker("AAPL", "US") == "AAPL"
+
+
+def test_merge_price_histories_overwrites_overlap_and_marks_stored():
+    """保存済み履歴に新規取得分を重ね、重複日は新規取得分で上書きする"""
+    from datetime import datetime
+    from market_data import merge_price_histories
+    from price_series import PriceSeries
+
+    stored = PriceSeries.from_records(
+        [
+            {"date": datetime(2026, 1, 4, 15), "close": 100.0},
+            {"date": datetime(2026, 1, 5, 15), "close": 101.0},  # 前回の場中バー
+        ],
+        stored=True,
+    )
+    fetched_dates = pd.date_range("2026-01-06", periods=2, tz="Asia/Tokyo")
+    fetched = PriceSeries.from_records(
+        [
+            {"date": fetched_dates[0], "close": 102.0},
+            {"date": fetched_dates[1], "close": 103.0},
+        ]
+    )
+
+    merged = merge_price_histories(stored, fetched, since=datetime(2026, 1, 5))
+
+    assert [bar["date"] for bar in merged.records()] == [
+        datetime(2026, 1, 5, 15),
+        datetime(2026, 1, 6, 15),
+    ]
+    assert merged.close.tolist() == [102.0, 103.0]
+    assert merged.stored.tolist() == [False, False]
+
+    merged = merge_price_histories(stored, fetched[1:])
+    assert merged.stored.tolist() == [True, True, False]
+    assert not fetched.stored.any()
+
+
+def test_market_date_converts_utc_to_exchange_date():
+    """保存済みのUTC日時を取引所ローカルの日付に変換する"""
+    from datetime import datetime
+    from market_data import market_date
+
+    assert market_date(datetime(2026, 1, 4, 15), "JP") == "2026-01-05"
+    assert market_date(datetime(2026, 1, 5, 5), "US") == "2026-01-05"
+
+
+def test_detect_adjustment_finds_split_factor():
+    """株式分割で過去の終値が遡及調整された場合、係数を検出する"""
+    from datetime import datetime
+    from market_data import detect_adjustment, is_split_factor
+    from price_series import PriceSeries
+
+    dates = [datetime(2026, 1, d, 15) for d in range(5, 10)]
+    bars = [{"date": d, "close": 200.0 + i} for i, d in enumerate(dates)]
+    stored = PriceSeries.from_records(bars, stored=True)
+
+    # 調整なし（最新バーは場中値なので照合しない）
+    intraday = {"date": dates[-1], "close": 250.0}
+    fetched = PriceSeries.from_records(bars[:-1] + [intraday])
+    assert detect_adjustment(stored, fetched) is None
+
+    # 1:2の株式分割
+    fetched = PriceSeries.from_records(
+        [{"date": bar["date"], "close": bar["close"] / 2} for bar in bars]
+    )
+    factor = detect_adjustment(stored, fetched)
+    assert factor == 2.0
+    assert is_split_factor(factor)
+
+    # 配当による小幅な調整
+    fetched = PriceSeries.from_records(
+        [{"date": bar["date"], "close": bar["close"] * 0.99} for bar in bars]
+    )
+    factor = detect_adjustment(stored, fetched)
+    assert abs(factor - 1 / 0.99) < 1e-9
+    assert not is_split_factor(factor)
+
+
+def test_price_history_id_is_deterministic_per_bar():
+    """同じ銘柄・同じバーは常に同じID、タイムゾーン表現の違いは同一視する"""
+    from datetime import datetime
+
+    from market_data import price_history_id
+
+    jst_bar = pd.Timestamp("2026-01-05 00:00", tz="Asia/Tokyo")
+    utc_bar = datetime(2026, 1, 4, 15, 0)
+
+    assert price_history_id("stock-1", jst_bar) == price_history_id(
+        "stock-1", utc_bar
+    )
+    assert price_history_id("stock-1", utc_bar) != price_history_id(
+        "stock-2", utc_bar
+    )
+    assert price_history_id("stock-1", utc_bar) != price_history_id(
+        "stock-1", datetime(2026, 1, 5, 15, 0)
+    )
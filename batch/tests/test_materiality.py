@@ -0,0 +1,67 @@
+"""materiality.pyのテスト"""
+
+from datetime import datetime, timedelta
+
+NOW = datetime(2026, 10, 18, 9, 0)
+
+
+def _previous(**overrides):
+    previous = {
+        "id": "analysis-1",
+        "recommendation": "Buy",
+        "confidence_score": 80,
+        "reason": "前回の理由",
+        "current_price": 1000.0,
+        "pe_ratio": 15.0,
+        "pb_ratio": 1.2,
+        "roe": 10.0,
+        "technical_indicators": {"trend": "上昇", "rsi": 55.0},
+        "llm_analyzed_at": NOW - timedelta(days=1),
+    }
+    previous.update(overrides)
+    return previous
+
+
+def _current(**overrides):
+    current = {
+        "current_price": 1010.0,
+        "pe_ratio": 15.2,
+        "pb_ratio": 1.21,
+        "roe": 10.0,
+        "technical_indicators": {"trend": "上昇", "rsi": 57.0},
+    }
+    current.update(overrides)
+    return current
+
+
+def test_gate_reuses_previous_analysis_when_inputs_barely_moved():
+    """全項目の変化が閾値未満なら前回の分析を再利用する"""
+    from materiality import MaterialityGate
+
+    gate = MaterialityGate({"stock-1": _previous()})
+
+    assert gate.check("stock-1", _current(), NOW)["id"] == "analysis-1"
+    assert gate.reused == 1
+
+
+def test_gate_refreshes_on_material_change_or_max_age():
+    """閾値以上の変化・期限切れ・前回分析なしは再分析する"""
+    from materiality import MaterialityGate
+
+    gate = MaterialityGate({"stock-1": _previous()}, max_age=timedelta(days=7))
+    reason = gate.refresh_reason
+
+    assert reason(_previous(), _current(current_price=1030.0), NOW) == "株価"
+    assert reason(_previous(), _current(pe_ratio=None), NOW) == "財務指標"
+    downtrend = {"trend": "下降", "rsi": 55.0}
+    assert reason(_previous(), _current(technical_indicators=downtrend), NOW) == (
+        "トレンド"
+    )
+    rsi_jump = {"trend": "上昇", "rsi": 61.0}
+    assert reason(_previous(), _current(technical_indicators=rsi_jump), NOW) == "RSI"
+    assert (
+        reason(_previous(llm_analyzed_at=NOW - timedelta(days=7)), _current(), NOW)
+        == "期限切れ"
+    )
+    assert gate.check("stock-2", _current(), NOW) is None
+    assert gate.refresh_reasons == {"前回分析なし": 1}
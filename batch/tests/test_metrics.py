@@ -0,0 +1,58 @@
+"""metrics.pyのテスト"""
+
+import json
+
+import pytest
+
+
+def test_histogram_percentiles_within_bucket_error():
+    """パーセンタイルはバケット幅（約9%）の誤差で求まる"""
+    from metrics import Histogram
+
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.add(ms / 1000)
+
+    for pct, expected in ((50, 0.5), (95, 0.95), (99, 0.99)):
+        assert histogram.percentile(pct) == pytest.approx(expected, rel=0.1)
+    assert histogram.percentile(100) == 1.0
+    assert histogram.summary()["min"] == 0.001
+
+    # 合算しても分布は変わらない
+    merged = Histogram()
+    merged.merge(histogram)
+    merged.merge(histogram)
+    assert merged.count == 2000
+    assert merged.percentile(50) == histogram.percentile(50)
+
+
+def test_registry_records_latency_errors_retries_and_amounts():
+    """処理時間・エラー・リトライ・量をステージごとに集計する"""
+    from metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    registry.observe("llm", 0.5, input_tokens=400, output_tokens=100)
+    registry.observe("llm", 1.5, input_tokens=600, output_tokens=300)
+    registry.retry("llm")
+
+    with registry.timer("db_analyses") as amounts:
+        amounts["rows"] = 50
+    with pytest.raises(RuntimeError):
+        with registry.timer("db_analyses"):
+            raise RuntimeError("接続エラー")
+
+    snapshot = registry.snapshot()
+    # batch_job_logs.metrics にそのまま保存できる
+    json.dumps(snapshot)
+
+    llm = snapshot["stages"]["llm"]
+    assert llm["calls"] == 2
+    assert llm["retries"] == 1
+    assert llm["busy_seconds"] == 2.0
+    assert llm["input_tokens"]["total"] == 1000
+    assert llm["input_tokens"]["mean"] == 500
+
+    db = snapshot["stages"]["db_analyses"]
+    assert db["calls"] == 2
+    assert db["errors"] == 1
+    assert db["rows"]["total"] == 50
@@ -0,0 +1,223 @@
+"""pipeline.pyのテスト"""
+
+import threading
+import time
+
+
+def test_pipeline_processes_all_items_through_stages():
+    """正常系: 全アイテムが全ステージを通過する"""
+    from pipeline import Pipeline, Stage
+
+    results = []
+    lock = threading.Lock()
+
+    def on_complete(item):
+        with lock:
+            results.append(item)
+
+    pipeline = Pipeline(
+        [
+            Stage("double", lambda item, state: item * 2, workers=3),
+            Stage("increment", lambda item, state: item + 1, workers=2),
+        ],
+        queue_size=2,
+        on_complete=on_complete,
+    )
+    pipeline.run(range(50))
+
+    assert sorted(results) == [i * 2 + 1 for i in range(50)]
+
+
+def test_pipeline_drops_none_and_reports_errors():
+    """Noneは打ち切り、例外はon_errorに通知される"""
+    from pipeline import Pipeline, Stage
+
+    completed = []
+    errors = []
+
+    def check(item, state):
+        if item == 3:
+            raise ValueError("boom")
+        if item % 2 == 0:
+            return None
+        return item
+
+    pipeline = Pipeline(
+        [Stage("check", check, workers=2)],
+        on_complete=completed.append,
+        on_error=lambda item, stage, e: errors.append((item, stage, str(e))),
+    )
+    pipeline.run(range(6))
+
+    assert sorted(completed) == [1, 5]
+    assert errors == [(3, "check", "boom")]
+
+
+def test_pipeline_backpressure_bounds_in_flight_items():
+    """下流が遅い場合、滞留アイテム数はキュー上限で頭打ちになる"""
+    from pipeline import Pipeline, Stage
+
+    produced = []
+    consumed = []
+    max_in_flight = [0]
+    lock = threading.Lock()
+
+    def produce(item, state):
+        with lock:
+            produced.append(item)
+            max_in_flight[0] = max(max_in_flight[0], len(produced) - len(consumed))
+        return item
+
+    def consume(item, state):
+        time.sleep(0.005)
+        with lock:
+            consumed.append(item)
+        return item
+
+    pipeline = Pipeline(
+        [Stage("produce", produce), Stage("consume", consume)], queue_size=2
+    )
+    pipeline.run(range(30))
+
+    assert len(consumed) == 30
+    # キュー上限2 + 処理中1 + 投入直後1 程度に収まる
+    assert max_in_flight[0] <= 5
+
+
+def test_pipeline_setup_and_teardown_per_worker():
+    """ワーカーごとにsetup/teardownが呼ばれ、stateが渡される"""
+    from pipeline import Pipeline, Stage
+
+    setups = []
+    teardowns = []
+    seen_states = set()
+    lock = threading.Lock()
+
+    def setup():
+        with lock:
+            setups.append(1)
+            return {"id": len(setups)}
+
+    def work(item, state):
+        with lock:
+            seen_states.add(state["id"])
+        return item
+
+    pipeline = Pipeline(
+        [Stage("db", work, workers=3, setup=setup, teardown=teardowns.append)]
+    )
+    pipeline.run(range(10))
+
+    assert len(setups) == 3
+    assert len(teardowns) == 3
+    assert seen_states <= {1, 2, 3}
+
+
+def test_pipeline_flush_emits_buffered_items_at_end():
+    """flushは入力の終了時に1回だけ呼ばれ、ためていた残りを下流に流す"""
+    from pipeline import Pipeline, Stage
+
+    completed = []
+
+    def buffer(item, state):
+        state.append(item)
+        if len(state) < 3:
+            return None
+        batch = list(state)
+        state.clear()
+        return batch
+
+    def flush(state):
+        return [list(state)] if state else []
+
+    pipeline = Pipeline(
+        [
+            Stage("buffer", buffer, setup=list, flush=flush),
+            Stage("size", lambda batch, state: len(batch), workers=2),
+        ],
+        on_complete=completed.append,
+    )
+    pipeline.run(range(7))
+
+    assert sorted(completed) == [1, 3, 3]
+
+
+def test_pipeline_keeps_draining_when_error_callback_raises():
+    """on_errorが例外を投げてもワーカーは止まらず、上流がキューで詰まらない"""
+    from pipeline import Pipeline, Stage
+
+    completed = []
+
+    def on_error(item, stage, error):
+        raise TypeError("callback failed")
+
+    def analyze(batch, state):
+        if batch[0] == 0:
+            raise IndexError("list index out of range")
+        return len(batch)
+
+    pipeline = Pipeline(
+        [
+            Stage("group", lambda item, state: [item, item]),
+            Stage("llm", analyze, workers=1),
+        ],
+        queue_size=1,
+        on_complete=completed.append,
+        on_error=on_error,
+    )
+    pipeline.run(range(5))
+
+    assert completed == [2, 2, 2, 2]
+
+
+def test_run_pipeline_falls_back_to_single_calls_when_group_call_raises(
+    monkeypatch,
+):
+    """まとめて分析が想定外の例外を投げたら1銘柄ずつ分析し、全銘柄の成否を記録する"""
+    from contextlib import nullcontext
+    from types import SimpleNamespace
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import batch_analysis
+    from db_writer import BatchWriter
+    from pipeline import Stage
+
+    def analyze_group_with_openai(items, sector_stats=None):
+        raise IndexError("list index out of range")
+
+    def analyze_with_openai(stock_data, trend_info):
+        if stock_data.ticker == "T003":
+            raise RuntimeError("timeout")
+        return {"recommendation": "hold", "confidence_score": 50, "reason": "-"}
+
+    def prepare_stages(force, price_histories, record, fetch_workers, ta_workers):
+        return [
+            Stage(
+                "fetch",
+                lambda stock, state: {
+                    "stock": stock,
+                    "stock_data": SimpleNamespace(ticker=stock["ticker"], sector=""),
+                    "trend_info": None,
+                },
+            )
+        ]
+
+    monkeypatch.setattr(
+        batch_analysis, "analyze_group_with_openai", analyze_group_with_openai
+    )
+    monkeypatch.setattr(batch_analysis, "analyze_with_openai", analyze_with_openai)
+    monkeypatch.setattr(batch_analysis, "prepare_stages", prepare_stages)
+
+    stocks = [
+        {"id": f"s{i}", "ticker": f"T00{i}", "sector": "電気機器"} for i in range(6)
+    ]
+    conn = SimpleNamespace(commit=lambda: None)
+    pool = SimpleNamespace(connection=lambda: nullcontext(conn))
+    writer = BatchWriter(pool, lambda conn, items: None, batch_size=1)
+    with writer:
+        stock_queue = batch_analysis.run_pipeline(
+            stocks, writer, llm_workers=1, queue_size=1, group_size=2
+        )
+
+    assert stock_queue.success == 5
+    assert stock_queue.failed == 1
@@ -0,0 +1,95 @@
+"""prescoring.pyのテスト"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+NOW = datetime(2026, 10, 18)
+SECTOR_STATS = {"銀行業": {"avg_per": 10.0, "avg_pbr": 1.0, "avg_roe": 8.0, "count": 5}}
+
+
+def _trend(trend, rsi, signal="シグナルなし"):
+    rsi_signal = "買われすぎ" if rsi > 70 else "売られすぎ" if rsi < 30 else "中立"
+    return {"trend": trend, "rsi": rsi, "rsi_signal": rsi_signal, "signals": [signal]}
+
+
+def _item(stock_id, per=None, pbr=None, roe=None, trend_info=None):
+    def to_decimal(value):
+        return Decimal(str(value)) if value is not None else None
+
+    return {
+        "stock": {"id": stock_id, "ticker": stock_id},
+        "stock_data": SimpleNamespace(
+            sector="銀行業",
+            pe_ratio=to_decimal(per),
+            pb_ratio=to_decimal(pbr),
+            roe=to_decimal(roe),
+        ),
+        "trend_info": trend_info,
+    }
+
+
+def _previous(*stock_ids, days_ago=1):
+    return {
+        stock_id: {"llm_analyzed_at": NOW - timedelta(days=days_ago)}
+        for stock_id in stock_ids
+    }
+
+
+def test_clear_cases_are_scored_by_rules():
+    """割安・上昇トレンドはBuy、割高・下降トレンドはSell、材料がなければ信頼度0のHold"""
+    from prescoring import RULE_REASON_PREFIX, PreScorer
+
+    items = [
+        _item("cheap", 6, 0.5, 14, _trend("上昇", 55, "ゴールデンクロス発生")),
+        _item("expensive", 25, 2.5, 2, _trend("下降", 78, "デッドクロス発生")),
+        _item("unknown"),
+    ]
+    scorer = PreScorer(SECTOR_STATS, _previous("cheap", "expensive", "unknown"))
+
+    cheap, expensive, unknown = scorer.triage(items, NOW)
+
+    assert cheap["recommendation"] == "Buy"
+    assert expensive["recommendation"] == "Sell"
+    assert cheap["confidence_score"] > 50
+    assert unknown["recommendation"] == "Hold"
+    assert unknown["confidence_score"] == 0
+    assert unknown["reason"].startswith(RULE_REASON_PREFIX)
+    # 次回の定期更新の判定のため、前回のAI分析日時を引き継ぐ
+    assert cheap["llm_analyzed_at"] == NOW - timedelta(days=1)
+    assert scorer.get_stats()["rule_scored"] == 3
+
+
+def test_requested_stale_and_borderline_stocks_are_escalated():
+    """リクエスト・定期更新・判定境界の銘柄はAI分析に回す"""
+    from prescoring import (
+        REASON_BOUNDARY,
+        REASON_REFRESH,
+        REASON_REQUESTED,
+        PreScorer,
+    )
+
+    items = [
+        _item("requested", 6, 0.5, 14, _trend("上昇", 55)),
+        _item("answered", 6, 0.5, 14, _trend("上昇", 55)),
+        _item("stale", 6, 0.5, 14, _trend("上昇", 55)),
+        _item("new", 6, 0.5, 14, _trend("上昇", 55)),
+        _item("borderline", 10, 1.0, 8, _trend("上昇", 50)),
+    ]
+    previous = _previous("requested", "answered", "borderline")
+    previous.update(_previous("stale", days_ago=30))
+    requested_at = {
+        "requested": NOW - timedelta(hours=1),
+        # 前回のAI分析より前のリクエストは対応済み
+        "answered": NOW - timedelta(days=3),
+    }
+    scorer = PreScorer(SECTOR_STATS, previous, requested_at)
+
+    results = scorer.triage(items, NOW)
+
+    assert [result is None for result in results] == [True, False, True, True, True]
+    assert scorer.get_stats()["escalation_reasons"] == {
+        REASON_REQUESTED: 1,
+        REASON_REFRESH: 2,
+        REASON_BOUNDARY: 1,
+    }
@@ -0,0 +1,87 @@
+"""price_store.pyのテスト
+
+データベースを使うテストは TEST_DATABASE_URL が設定されている場合のみ実行する。
+"""
+
+import os
+from datetime import timedelta
+
+import pytest
+
+requires_db = pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"),
+    reason="TEST_DATABASE_URL が未設定",
+)
+
+
+def _bars(dates, close):
+    from price_series import PriceSeries
+
+    return PriceSeries.from_records(
+        [
+            {
+                "date": date,
+                "open": close,
+                "high": close,
+                "low": close,
+                "close": close,
+                "volume": 1000,
+            }
+            for date in dates
+        ]
+    )
+
+
+@requires_db
+def test_split_is_applied_once_even_if_the_ticker_is_never_saved(monkeypatch):
+    """分割を検出した実行で分析結果を保存しなくても、次回に係数を二重に適用しない"""
+    import psycopg2
+
+    import price_store
+    from benchmarks.database import temporary_schema
+    from market_data import history_window_start
+    from price_store import prefetch_incremental_price_histories, upsert_price_histories
+
+    since = history_window_start()
+    old_dates = [since - timedelta(days=i) for i in range(30, 0, -1)]
+    window_dates = [since + timedelta(days=i) for i in range(60)]
+
+    # 分割前の株価で保存済み、Yahoo側は1:2の分割で過去分も半分に調整済み
+    monkeypatch.setattr(
+        price_store,
+        "download_price_histories",
+        lambda symbols, **kwargs: {
+            symbol: _bars(window_dates + [window_dates[-1] + timedelta(days=1)], 50.0)
+            for symbol in symbols
+        },
+    )
+    stocks = [{"id": "s1", "ticker": "T001", "market": "US"}]
+
+    with temporary_schema(os.environ["TEST_DATABASE_URL"]) as url:
+        conn = psycopg2.connect(url)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO stocks (id, ticker, name, market, updated_at)
+                VALUES ('s1', 'T001', 'テスト', 'US', NOW())
+                """
+            )
+        upsert_price_histories(conn, [("s1", _bars(old_dates + window_dates, 100.0))])
+        conn.commit()
+
+        # 2回とも分析結果（取得した株価履歴）は保存しない
+        for _ in range(2):
+            histories = prefetch_incremental_price_histories(conn, stocks)
+            assert set(histories["T001"].close) == {50.0}
+
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT date, close, volume FROM price_history ORDER BY date"
+            )
+            rows = cur.fetchall()
+        conn.close()
+
+    closes = {date: close for date, close, _ in rows}
+    assert [closes[date] for date in old_dates] == [50.0] * len(old_dates)
+    assert [closes[date] for date in window_dates] == [50.0] * len(window_dates)
+    assert {volume for date, _, volume in rows if date < since} == {2000}
@@ -0,0 +1,110 @@
+"""rate_limiter.pyのテスト"""
+
+import time
+
+
+def test_acquire_paces_requests_at_rate():
+    """バースト上限を使い切った後は設定レートで払い出す"""
+    from rate_limiter import AdaptiveTokenBucket
+
+    bucket = AdaptiveTokenBucket("test", rate=50, capacity=1)
+
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+
+    # 1件目はバースト、残り5件は1/50秒ずつ
+    assert elapsed >= 0.09
+    assert bucket.get_stats()["acquired"] == 6
+
+
+def test_rate_limited_halves_rate_and_honours_retry_after():
+    """429でレートを半分に下げてRetry-Afterまで止め、成功が続くと上限まで戻る"""
+    from rate_limiter import AdaptiveTokenBucket
+
+    bucket = AdaptiveTokenBucket("test", rate=100, capacity=100, increase_ratio=0.25)
+    bucket.on_rate_limited(retry_after=0.1)
+    assert bucket.rate == 50
+    assert bucket.get_stats()["rate_limited"] == 1
+
+    # トークンは残っていてもRetry-Afterまでは払い出さない
+    assert bucket.acquire() >= 0.09
+
+    bucket.on_success()
+    assert bucket.rate == 75
+    for _ in range(5):
+        bucket.on_success()
+    assert bucket.rate == 100
+
+
+def test_report_error_reads_retry_after_from_openai_error():
+    """OpenAIの429からRetry-Afterを読み取り、リクエスト数・トークン数の両方を下げる"""
+    import httpx
+    from openai import RateLimitError
+
+    from rate_limiter import (
+        AdaptiveTokenBucket,
+        is_rate_limit_error,
+        report_error,
+        retry_after_seconds,
+    )
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": "3"}, request=request)
+    error = RateLimitError("Rate limit reached", response=response, body=None)
+
+    assert is_rate_limit_error(error)
+    assert retry_after_seconds(error) == 3.0
+
+    requests_bucket = AdaptiveTokenBucket("requests", rate=10)
+    tokens_bucket = AdaptiveTokenBucket("tokens", rate=1000)
+    assert report_error(error, requests_bucket, tokens_bucket)
+    assert requests_bucket.rate == 5
+    assert tokens_bucket.rate == 500
+
+    # 429以外のエラーではレートを変えない
+    assert not report_error(ValueError("boom"), requests_bucket)
+    assert requests_bucket.rate == 5
+
+
+def test_is_rate_limit_error_ignores_ticker_codes_containing_429():
+    """メッセージ中の429はHTTPステータスとしてのみ扱い、銘柄コードの数字では判定しない"""
+    import requests
+
+    from rate_limiter import is_rate_limit_error
+
+    assert is_rate_limit_error(Exception("HTTP Error 429: Too Many Requests"))
+    assert is_rate_limit_error(Exception("Received status code 429"))
+    response = requests.Response()
+    response.status_code = 429
+    assert is_rate_limit_error(requests.HTTPError("rate limited", response=response))
+
+    assert not is_rate_limit_error(
+        Exception("$4293.T: possibly delisted; no timezone found")
+    )
+    assert not is_rate_limit_error(Exception("1429.T: No data found, symbol may be"))
+    assert not is_rate_limit_error(Exception("HTTP Error 404: 1429.T not found"))
+
+
+def test_wait_before_retry_backs_off_only_for_non_rate_limit_errors(monkeypatch):
+    """429はバケットのレートを下げるだけ、それ以外はジッター付きの指数バックオフで待つ"""
+    import rate_limiter
+    from rate_limiter import AdaptiveTokenBucket, backoff_seconds, wait_before_retry
+
+    sleeps = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+    bucket = AdaptiveTokenBucket("yahoo", rate=10)
+
+    assert not wait_before_retry(ConnectionResetError("reset by peer"), 0, bucket)
+    assert not wait_before_retry(Exception("HTTP Error 503"), 2, bucket)
+    assert bucket.rate == 10
+    assert 0.5 <= sleeps[0] <= 1.0
+    assert 2.0 <= sleeps[1] <= 4.0
+
+    assert wait_before_retry(Exception("HTTP Error 429: Too Many Requests"), 0, bucket)
+    assert bucket.rate == 5
+    assert len(sleeps) == 2
+
+    # 上限で頭打ち
+    assert all(backoff_seconds(attempt) <= 10.0 for attempt in range(10))
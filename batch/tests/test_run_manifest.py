@@ -0,0 +1,41 @@
+"""run_manifest.pyのテスト"""
+
+from datetime import datetime, timedelta
+
+
+def test_collapse_events_keeps_final_state_attempts_and_timings():
+    """同じ銘柄の状態変化は発生順に適用して1行にまとめる"""
+    from run_manifest import FAILED, RUNNING, SUCCEEDED, collapse_events
+
+    t0 = datetime(2026, 10, 18, 0, 0)
+    events = [
+        {"run_id": "r", "stock_id": "a", "state": RUNNING, "at": t0},
+        {"run_id": "r", "stock_id": "b", "state": RUNNING, "at": t0},
+        {
+            "run_id": "r",
+            "stock_id": "a",
+            "state": FAILED,
+            "error": "データ取得失敗",
+            "at": t0 + timedelta(seconds=1),
+        },
+        {"run_id": "r", "stock_id": "a", "state": RUNNING, "at": t0 + timedelta(2)},
+        {
+            "run_id": "r",
+            "stock_id": "a",
+            "state": SUCCEEDED,
+            "at": t0 + timedelta(3),
+        },
+    ]
+
+    rows = {row["stock_id"]: row for row in collapse_events(events)}
+
+    assert rows["a"]["state"] == SUCCEEDED
+    assert rows["a"]["attempts"] == 2
+    assert rows["a"]["last_error"] == "データ取得失敗"
+    assert rows["a"]["started_at"] == t0 + timedelta(2)
+    assert rows["a"]["finished_at"] == t0 + timedelta(3)
+
+    # 処理中に中断した銘柄は終了時刻なし（--resumeの対象）
+    assert rows["b"]["state"] == RUNNING
+    assert rows["b"]["attempts"] == 1
+    assert rows["b"]["finished_at"] is None
@@ -0,0 +1,76 @@
+"""scheduler.pyのテスト"""
+
+import time
+from datetime import datetime, timedelta
+
+
+def test_prioritize_orders_by_requests_staleness_and_volatility():
+    """リクエスト数・経過日数・ボラティリティが大きい銘柄ほど先に処理する"""
+    from scheduler import prioritize
+
+    now = datetime(2026, 10, 18, 0, 0)
+    stocks = [
+        {"id": "a", "ticker": "AAA"},
+        {"id": "b", "ticker": "BBB"},
+        {"id": "c", "ticker": "CCC"},
+        {"id": "d", "ticker": "DDD"},
+    ]
+    inputs = {
+        # 昨日分析済み・リクエストなし
+        "a": {"request_count": 0, "last_analyzed_at": now - timedelta(days=1)},
+        # 昨日分析済みだがユーザーのリクエストが多い
+        "b": {"request_count": 20, "last_analyzed_at": now - timedelta(days=1)},
+        # 昨日分析済み・値動きが大きい
+        "c": {
+            "request_count": 0,
+            "last_analyzed_at": now - timedelta(days=1),
+            "volatility": 0.04,
+        },
+        # "d" は未分析
+    }
+
+    ordered = [stock["ticker"] for stock in prioritize(stocks, inputs, now)]
+    assert ordered == ["BBB", "DDD", "CCC", "AAA"]
+
+
+def test_admission_stops_before_cost_limit():
+    """観測した1銘柄あたりの費用から上限を超えそうなら受け付けを止める"""
+    from scheduler import AdmissionController
+
+    cost = {"usd": 0.0}
+    admission = AdmissionController(
+        max_cost_usd=1.0, cost_func=lambda: cost["usd"], safety_margin=1.0
+    )
+
+    assert admission.admit()
+    cost["usd"] = 0.3
+    admission.finish()
+    assert admission.admit()
+    cost["usd"] = 0.6
+    admission.finish()
+
+    # 0.6 + 0.3 * 1件 = 0.9 < 1.0
+    assert admission.admit()
+    # 処理中1件 + 次の1件で 0.6 + 0.3 * 2 = 1.2 >= 1.0
+    assert not admission.admit()
+    assert admission.stop_reason.startswith("費用上限")
+
+    # 一度止めたら再開しない
+    cost["usd"] = 0.0
+    assert not admission.admit()
+
+
+def test_admission_stops_before_deadline():
+    """観測した1銘柄あたりの処理時間では期限に間に合わない銘柄は受け付けない"""
+    from scheduler import AdmissionController
+
+    admission = AdmissionController(deadline=time.monotonic() + 0.3, safety_margin=1.0)
+
+    assert admission.admit()
+    time.sleep(0.2)
+    admission.finish()
+
+    # 残り約0.1秒に対して1銘柄あたり約0.2秒かかる
+    assert not admission.admit()
+    assert admission.stop_reason == "制限時間"
+    assert admission.remaining_seconds() < 0.2
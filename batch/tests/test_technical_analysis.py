@@ -203,3 +203,92 @@ def test_integration_with_trend_analysis():
     assert "トレンド: 上昇" in prompt_section
     assert "5日移動平均:" in prompt_section
     assert "RSI(14日):" in prompt_section
+
+
+def test_kernels_match_ta_library():
+    """NumPy版のSMA・RSIがtaライブラリと同じ値になる（1銘柄・複数銘柄とも）"""
+    import numpy as np
+    import pandas as pd
+    from ta.momentum import RSIIndicator
+    from ta.trend import SMAIndicator
+    from technical_analysis import rsi, sma
+
+    rng = np.random.default_rng(0)
+    closes = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, (3, 90)), axis=1))
+    closes[1, 40:45] = closes[1, 39]  # 値動きのない期間
+
+    for row in range(len(closes)):
+        series = pd.Series(closes[row])
+        expected_sma = SMAIndicator(close=series, window=25).sma_indicator()
+        expected_rsi = RSIIndicator(close=series, window=14).rsi()
+
+        np.testing.assert_allclose(
+            sma(closes[row], 25), expected_sma.to_numpy(), rtol=1e-12
+        )
+        np.testing.assert_allclose(sma(closes, 25)[row], expected_sma, rtol=1e-12)
+        np.testing.assert_array_equal(rsi(closes[row], 14), expected_rsi)
+        np.testing.assert_array_equal(rsi(closes, 14)[row], expected_rsi)
+
+
+def test_calculate_trend_indicators_accepts_price_series():
+    """PriceSeriesと辞書のリストで同じ指標になる"""
+    from price_series import PriceSeries
+    from technical_analysis import calculate_trend_indicators
+
+    base_date = datetime(2026, 1, 1)
+    price_history = [
+        {"date": base_date + timedelta(days=i), "close": 1000 + (i % 7) * 10}
+        for i in range(30)
+    ]
+
+    assert calculate_trend_indicators(
+        PriceSeries.from_records(price_history)
+    ) == calculate_trend_indicators(price_history)
+
+
+def test_universe_indicators_match_per_ticker_path():
+    """行列でまとめて計算した結果が1銘柄ずつの計算と一致する（欠損・データ不足を含む）"""
+    import numpy as np
+    import pandas as pd
+    from price_series import PriceSeries
+    from technical_analysis import (
+        analyze_trend,
+        build_close_matrix,
+        calculate_trend_indicators,
+        calculate_universe_indicators,
+    )
+
+    rng = np.random.default_rng(1)
+
+    def history(tz, days, step=1):
+        dates = pd.bdate_range("2026-01-05", periods=days, tz=tz)[::step]
+        close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        return PriceSeries.from_records(
+            [{"date": d, "close": c} for d, c in zip(dates, close)]
+        )
+
+    histories = {
+        "7203": history("Asia/Tokyo", 60),
+        "AAPL": history("America/New_York", 60),
+        "6758": history("Asia/Tokyo", 90, step=2),  # 欠損日あり
+        "9984": history("Asia/Tokyo", 40),
+        "SHORT": history("Asia/Tokyo", 25),  # 前日の25日移動平均がない
+        "EMPTY": PriceSeries.empty(),
+    }
+
+    tickers, dates, closes = build_close_matrix(histories)
+    assert tickers == list(histories)
+    assert closes.shape == (len(histories), len(dates))
+    assert np.isnan(closes[0]).sum() == len(dates) - 60
+
+    universe = calculate_universe_indicators(histories)
+    assert set(universe) == {"7203", "AAPL", "6758", "9984"}
+    for ticker, indicators in universe.items():
+        expected = calculate_trend_indicators(histories[ticker])
+        assert {name: indicators[name] for name in expected} == expected
+
+        signals = analyze_trend(indicators)["signals"]
+        assert ("ゴールデンクロス発生" in signals) == indicators["golden_cross"]
+        assert ("デッドクロス発生" in signals) == indicators["dead_cross"]
+
+    assert calculate_universe_indicators({}) == {}
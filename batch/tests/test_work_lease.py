@@ -0,0 +1,186 @@
+"""work_lease.pyのテスト
+
+データベースを使うテストは TEST_DATABASE_URL が設定されている場合のみ実行する。
+テストごとに専用のスキーマを作り、prisma/migrations のSQLを適用して使う。
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+requires_db = pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"),
+    reason="TEST_DATABASE_URL が未設定",
+)
+
+
+@pytest.fixture
+def db_url():
+    """マイグレーションを適用した一時スキーマに接続するURL"""
+    import psycopg2
+
+    from benchmarks.database import temporary_schema
+
+    with temporary_schema(os.environ["TEST_DATABASE_URL"]) as url:
+        conn = psycopg2.connect(url)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO stocks (id, ticker, name, market, updated_at)
+                SELECT 's' || i, 'T' || LPAD(i::text, 3, '0'), 'テスト', 'JP', NOW()
+                FROM generate_series(1, 30) AS i
+                """
+            )
+        conn.commit()
+        conn.close()
+        yield url
+
+
+def _stocks(count):
+    return [{"id": f"s{i}", "ticker": f"T{i:03d}"} for i in range(1, count + 1)]
+
+
+def test_daily_run_id_uses_japan_date():
+    """日本時間の日付で実行IDを決める（UTC 15時以降は翌日）"""
+    from work_lease import daily_run_id
+
+    assert daily_run_id(datetime(2026, 10, 18, 14, 59, tzinfo=timezone.utc)) == (
+        "daily-2026-10-18"
+    )
+    assert daily_run_id(datetime(2026, 10, 18, 15, 0, tzinfo=timezone.utc)) == (
+        "daily-2026-10-19"
+    )
+
+
+@requires_db
+def test_concurrent_leases_never_overlap(db_url):
+    """複数の借り手が同時に借りても同じ銘柄を二重に借りない"""
+    import psycopg2
+
+    from work_lease import ensure_run, lease_items
+
+    conn = psycopg2.connect(db_url)
+    assert ensure_run(conn, "run", _stocks(30), succeeded_ids={"s1", "s2"}) == 30
+    # 2回目以降の登録は何もしない
+    assert ensure_run(conn, "run", _stocks(30)) == 0
+    conn.close()
+
+    leased = []
+    lock = threading.Lock()
+
+    def drain(owner):
+        worker_conn = psycopg2.connect(db_url)
+        while True:
+            stocks = lease_items(worker_conn, "run", owner, limit=3)
+            if not stocks:
+                break
+            with lock:
+                leased.extend(stock["id"] for stock in stocks)
+        worker_conn.close()
+
+    threads = [threading.Thread(target=drain, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(leased) == len(set(leased)) == 28
+    assert "s1" not in leased
+
+
+@requires_db
+def test_expired_lease_is_taken_over_and_run_finalized_once(db_url):
+    """リースが切れた銘柄は他の借り手が借り直し、実行の終了は1回だけ"""
+    import psycopg2
+
+    from run_manifest import FAILED, SUCCEEDED, write_events
+    from work_lease import ensure_run, finalize_run, lease_items, release_leases
+
+    conn = psycopg2.connect(db_url)
+    ensure_run(conn, "run", _stocks(3))
+
+    # 落ちたプロセスのリース（期限切れ）
+    crashed = lease_items(conn, "run", "crashed", limit=2, lease_seconds=0)
+    assert [stock["id"] for stock in crashed] == ["s1", "s2"]
+
+    # 生きているプロセスのリースは借り直されない
+    alive = lease_items(conn, "run", "alive", limit=1, lease_seconds=300)
+    assert [stock["id"] for stock in alive] == ["s3"]
+    assert finalize_run(conn, "run") is None
+
+    taken = lease_items(conn, "run", "survivor", limit=5)
+    assert [stock["id"] for stock in taken] == ["s1", "s2"]
+    assert release_leases(conn, "run", "crashed") == 0
+
+    now = datetime(2026, 10, 18)
+    events = [
+        {"run_id": "run", "stock_id": "s1", "state": SUCCEEDED, "at": now},
+        {"run_id": "run", "stock_id": "s2", "state": FAILED, "at": now},
+        {"run_id": "run", "stock_id": "s3", "state": SUCCEEDED, "at": now},
+    ]
+    write_events(conn, events)
+    conn.commit()
+
+    finalized = finalize_run(conn, "run")
+    assert finalized["counts"] == {SUCCEEDED: 2, FAILED: 1}
+    assert finalize_run(conn, "run") is None
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT status FROM batch_runs WHERE id = 'run'")
+        assert cur.fetchone()[0] == "incomplete"
+    conn.close()
+
+
+@requires_db
+def test_deferred_items_let_the_run_finalize_as_incomplete(db_url):
+    """上限で受け付けを止めたシャードが残りを持ち越しにすると、実行は incomplete で終了する"""
+    import psycopg2
+
+    from run_manifest import DEFERRED, RUNNING, SUCCEEDED, write_events
+    from work_lease import defer_remaining, ensure_run, finalize_run, lease_items
+
+    conn = psycopg2.connect(db_url)
+    ensure_run(conn, "run", _stocks(6))
+
+    stopped = lease_items(conn, "run", "stopped", limit=3)
+    other = lease_items(conn, "run", "other", limit=1)
+    write_events(
+        conn,
+        [
+            {
+                "run_id": "run",
+                "stock_id": stopped[0]["id"],
+                "state": SUCCEEDED,
+                "at": datetime(2026, 10, 18),
+            }
+        ],
+    )
+    conn.commit()
+
+    # 借りたまま処理しなかった2件と誰も借りていない2件を持ち越す（他の借り手の分は残す）
+    assert defer_remaining(conn, "run", "stopped", "制限時間") == 4
+    assert finalize_run(conn, "run") is None
+    assert lease_items(conn, "run", "late") == []
+
+    write_events(
+        conn,
+        [
+            {
+                "run_id": "run",
+                "stock_id": other[0]["id"],
+                "state": SUCCEEDED,
+                "at": datetime(2026, 10, 18),
+            }
+        ],
+    )
+    conn.commit()
+
+    finalized = finalize_run(conn, "run")
+    assert finalized["counts"] == {SUCCEEDED: 2, DEFERRED: 4}
+    assert RUNNING not in finalized["counts"]
+    with conn.cursor() as cur:
+        cur.execute("SELECT status FROM batch_runs WHERE id = 'run'")
+        assert cur.fetchone()[0] == "incomplete"
+    conn.close()
@@ -0,0 +1,484 @@
+"""
+複数プロセスでの作業分担（ジョブテーブルのリース）
+
+同じ実行IDの batch_run_items を共有のジョブテーブルとして、各プロセスが
+SELECT ... FOR UPDATE SKIP LOCKED で未処理の銘柄を数件ずつ借りる。
+借りた銘柄には期限（リース）を付けて定期的に延長し、プロセスが落ちて期限が切れた銘柄は
+他のプロセスが借り直す。全銘柄が終わったら、最後に終えたプロセスだけが
+全シャード分をまとめて batch_job_logs に1行記録する。
+"""
+
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+from zoneinfo import ZoneInfo
+
+from psycopg2.extras import RealDictCursor
+
+from run_manifest import (
+    DEFERRED,
+    FAILED,
+    PENDING,
+    RUN_COMPLETED,
+    RUN_INCOMPLETE,
+    RUN_RUNNING,
+    RUNNING,
+    SUCCEEDED,
+)
+
+# リースの有効期間（秒）。延長されないまま過ぎた銘柄は他のプロセスが借り直す
+DEFAULT_LEASE_SECONDS = 300.0
+
+# 1回に借りる銘柄数
+DEFAULT_LEASE_BATCH = 5
+
+
+def daily_run_id(now: Optional[datetime] = None) -> str:
+    """
+    日本時間の日付ごとに共通の実行ID（同じ日のシャードは同じ実行を分担する）
+
+    Args:
+        now: 現在時刻（タイムゾーン付き、省略時は現在）
+
+    Returns:
+        str: 例 "daily-2026-10-18"
+    """
+    now = now or datetime.now(timezone.utc)
+    return f"daily-{now.astimezone(ZoneInfo('Asia/Tokyo')).date().isoformat()}"
+
+
+def default_owner() -> str:
+    """このプロセスを表すリースの借り手名（ホスト名:PID:乱数）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def ensure_run(
+    conn,
+    run_id: str,
+    stocks: List[Dict[str, Any]],
+    succeeded_ids: Optional[Set[str]] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    実行と対象銘柄を登録（既に登録済みなら何もしない。全シャードが呼んでよい）
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+        stocks: 処理順に並べた銘柄データのリスト（id, ticker）
+        succeeded_ids: 登録時点で処理不要な銘柄ID（本日分の分析済みなど）
+        options: 実行時のオプション（記録用）
+
+    Returns:
+        int: 新しく登録した銘柄数
+    """
+    from psycopg2.extras import execute_values
+
+    succeeded_ids = succeeded_ids or set()
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO batch_runs (id, status, options, started_at)
+            VALUES (%s, %s, %s, NOW() AT TIME ZONE 'UTC')
+            ON CONFLICT (id) DO NOTHING
+            """,
+            (
+                run_id,
+                RUN_RUNNING,
+                json.dumps(options, ensure_ascii=False) if options else None,
+            ),
+        )
+        inserted = execute_values(
+            cur,
+            """
+            INSERT INTO batch_run_items (
+                id, run_id, stock_id, ticker, position, state, attempts, updated_at
+            ) VALUES %s
+            ON CONFLICT (run_id, stock_id) DO NOTHING
+            RETURNING id
+            """,
+            [
+                (
+                    str(uuid.uuid4()),
+                    run_id,
+                    stock["id"],
+                    stock["ticker"],
+                    position,
+                    SUCCEEDED if stock["id"] in succeeded_ids else PENDING,
+                    0,
+                )
+                for position, stock in enumerate(stocks)
+            ],
+            template="(%s, %s, %s, %s, %s, %s, %s, NOW() AT TIME ZONE 'UTC')",
+            page_size=1000,
+            fetch=True,
+        )
+
+        # 終了済みの実行に銘柄が追加された場合は再び処理中にする
+        if inserted:
+            cur.execute(
+                """
+                UPDATE batch_runs SET status = %s, finished_at = NULL
+                WHERE id = %s AND status <> %s
+                """,
+                (RUN_RUNNING, run_id, RUN_RUNNING),
+            )
+    conn.commit()
+
+    return len(inserted)
+
+
+def lease_items(
+    conn,
+    run_id: str,
+    owner: str,
+    limit: int = DEFAULT_LEASE_BATCH,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+) -> List[Dict[str, Any]]:
+    """
+    未処理（またはリース切れ）の銘柄を処理順に借りる
+
+    他のプロセスがロック中の行は SKIP LOCKED で飛ばすため、同じ銘柄を二重に借りない。
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+        owner: 借り手名
+        limit: 借りる最大件数
+        lease_seconds: リースの有効期間（秒）
+
+    Returns:
+        List: 借りた銘柄データ（id, ticker, market, sector）
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            WITH leased AS (
+                UPDATE batch_run_items SET
+                    state = %(running)s,
+                    lease_owner = %(owner)s,
+                    lease_expires_at = NOW() AT TIME ZONE 'UTC'
+                        + make_interval(secs => %(lease_seconds)s),
+                    attempts = attempts + 1,
+                    started_at = NOW() AT TIME ZONE 'UTC',
+                    finished_at = NULL,
+                    updated_at = NOW() AT TIME ZONE 'UTC'
+                WHERE id IN (
+                    SELECT id FROM batch_run_items
+                    WHERE run_id = %(run_id)s
+                      AND (
+                          state = %(pending)s
+                          OR (
+                              state = %(running)s
+                              AND lease_expires_at < NOW() AT TIME ZONE 'UTC'
+                          )
+                      )
+                    ORDER BY position
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING stock_id, position
+            )
+            SELECT s.id, s.ticker, s.market, s.sector
+            FROM leased
+            JOIN stocks s ON s.id = leased.stock_id
+            ORDER BY leased.position
+            """,
+            {
+                "run_id": run_id,
+                "owner": owner,
+                "limit": limit,
+                "lease_seconds": lease_seconds,
+                "pending": PENDING,
+                "running": RUNNING,
+            },
+        )
+        stocks = cur.fetchall()
+    conn.commit()
+
+    return stocks
+
+
+def renew_leases(
+    conn, run_id: str, owner: str, lease_seconds: float = DEFAULT_LEASE_SECONDS
+) -> int:
+    """
+    借りている処理中の銘柄のリースを延長
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+        owner: 借り手名
+        lease_seconds: 延長後の有効期間（秒）
+
+    Returns:
+        int: 延長した件数
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE batch_run_items SET
+                lease_expires_at = NOW() AT TIME ZONE 'UTC'
+                    + make_interval(secs => %s)
+            WHERE run_id = %s AND lease_owner = %s AND state = %s
+            """,
+            (lease_seconds, run_id, owner, RUNNING),
+        )
+        renewed = cur.rowcount
+    conn.commit()
+
+    return renewed
+
+
+def release_leases(conn, run_id: str, owner: str) -> int:
+    """
+    借りたまま処理しなかった銘柄を未処理に戻す（他のプロセスがすぐ借りられる）
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+        owner: 借り手名
+
+    Returns:
+        int: 戻した件数
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE batch_run_items SET
+                state = %s,
+                attempts = GREATEST(attempts - 1, 0),
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                updated_at = NOW() AT TIME ZONE 'UTC'
+            WHERE run_id = %s AND lease_owner = %s AND state = %s
+            """,
+            (PENDING, run_id, owner, RUNNING),
+        )
+        released = cur.rowcount
+    conn.commit()
+
+    return released
+
+
+def defer_remaining(conn, run_id: str, owner: str, reason: str) -> int:
+    """
+    制限時間・費用上限で受け付けを止めた場合に、残りの銘柄を持ち越しにする
+
+    借りたまま処理しなかった銘柄と、まだ誰も借りていない銘柄が対象
+    （他のプロセスが処理中の銘柄はそのまま）。持ち越した銘柄は実行の終了を妨げない。
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+        owner: 借り手名
+        reason: 持ち越しの理由（last_errorに記録）
+
+    Returns:
+        int: 持ち越した件数
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE batch_run_items SET
+                state = %(deferred)s,
+                attempts = CASE
+                    WHEN state = %(running)s THEN GREATEST(attempts - 1, 0)
+                    ELSE attempts
+                END,
+                last_error = %(reason)s,
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                updated_at = NOW() AT TIME ZONE 'UTC'
+            WHERE run_id = %(run_id)s
+              AND (
+                  state = %(pending)s
+                  OR (state = %(running)s AND lease_owner = %(owner)s)
+              )
+            """,
+            {
+                "run_id": run_id,
+                "owner": owner,
+                "reason": reason,
+                "deferred": DEFERRED,
+                "pending": PENDING,
+                "running": RUNNING,
+            },
+        )
+        deferred = cur.rowcount
+    conn.commit()
+
+    return deferred
+
+
+def finalize_run(conn, run_id: str) -> Optional[Dict[str, Any]]:
+    """
+    全銘柄が終わっていれば実行を終了する（終了できるのは1プロセスだけ）
+
+    Args:
+        conn: データベース接続
+        run_id: 実行ID
+
+    Returns:
+        Dict: 終了したプロセスには started_at（UTC）と状態ごとの件数（counts）。
+            未処理の銘柄が残っている・他のプロセスが終了済みの場合はNone
+            （失敗・持ち越しの銘柄があれば実行は incomplete で終了する）
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            UPDATE batch_runs SET
+                status = CASE
+                    WHEN EXISTS (
+                        SELECT 1 FROM batch_run_items
+                        WHERE run_id = %(run_id)s
+                          AND state IN (%(failed)s, %(deferred)s)
+                    ) THEN %(incomplete)s
+                    ELSE %(completed)s
+                END,
+                finished_at = NOW() AT TIME ZONE 'UTC'
+            WHERE id = %(run_id)s
+              AND status = %(running)s
+              AND NOT EXISTS (
+                  SELECT 1 FROM batch_run_items
+                  WHERE run_id = %(run_id)s AND state IN (%(pending)s, %(running)s)
+              )
+            RETURNING started_at
+            """,
+            {
+                "run_id": run_id,
+                "failed": FAILED,
+                "deferred": DEFERRED,
+                "incomplete": RUN_INCOMPLETE,
+                "completed": RUN_COMPLETED,
+                "running": RUN_RUNNING,
+                "pending": PENDING,
+            },
+        )
+        row = cur.fetchone()
+        if row is None:
+            conn.commit()
+            return None
+
+        cur.execute(
+            """
+            SELECT state, COUNT(*) AS count FROM batch_run_items
+            WHERE run_id = %s
+            GROUP BY state
+            """,
+            (run_id,),
+        )
+        counts = {r["state"]: r["count"] for r in cur.fetchall()}
+    conn.commit()
+
+    return {"started_at": row["started_at"], "counts": counts}
+
+
+class WorkLease:
+    """銘柄を数件ずつ借り、処理中はリースを延長し続ける（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        db_pool,
+        run_id: str,
+        owner: Optional[str] = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        batch: int = DEFAULT_LEASE_BATCH,
+    ):
+        """
+        Args:
+            db_pool: DB接続プール
+            run_id: 実行ID
+            owner: 借り手名（省略時はホスト名:PID:乱数）
+            lease_seconds: リースの有効期間（秒）
+            batch: 1回に借りる銘柄数
+        """
+        self.db_pool = db_pool
+        self.run_id = run_id
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.batch = batch
+        # 借りる・延長・返却は1本ずつ（接続を1つしか使わない）
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+        # 受け付けを止めた理由（close()で残りの銘柄を持ち越しにする）
+        self.defer_reason: Optional[str] = None
+
+        # メトリクス
+        self.leased = 0
+        self.released = 0
+        self.deferred = 0
+
+    def __enter__(self) -> "WorkLease":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """リースを延長するスレッドを開始"""
+        if self._heartbeat is not None:
+            return
+        self._stop.clear()
+        self._heartbeat = threading.Thread(
+            target=self._run_heartbeat, name="work-lease", daemon=True
+        )
+        self._heartbeat.start()
+
+    def close(self):
+        """
+        延長を止め、借りたまま処理しなかった銘柄を返す
+        （受け付けを止めた場合は未処理の銘柄をすべて持ち越しにする）
+        """
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+        with self.lock, self.db_pool.connection() as conn:
+            if self.defer_reason:
+                self.deferred += defer_remaining(
+                    conn, self.run_id, self.owner, self.defer_reason
+                )
+            else:
+                self.released += release_leases(conn, self.run_id, self.owner)
+
+    def defer(self, reason: str):
+        """
+        受け付けを止めたことを記録（close()で残りの銘柄を持ち越しにする）
+
+        Args:
+            reason: 持ち越しの理由
+        """
+        self.defer_reason = self.defer_reason or reason
+
+    def acquire(self) -> List[Dict[str, Any]]:
+        """
+        未処理の銘柄を借りる
+
+        Returns:
+            List: 借りた銘柄データ（残っていなければ空）
+        """
+        with self.lock, self.db_pool.connection() as conn:
+            stocks = lease_items(
+                conn, self.run_id, self.owner, self.batch, self.lease_seconds
+            )
+        self.leased += len(stocks)
+        return stocks
+
+    def _run_heartbeat(self):
+        """有効期間の1/3ごとにリースを延長"""
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                with self.lock, self.db_pool.connection() as conn:
+                    renew_leases(conn, self.run_id, self.owner, self.lease_seconds)
+            except Exception as e:
+                print(f"⚠️ リース延長エラー: {e}")
@@ -0,0 +1,3 @@
+-- AlterTable
+ALTER TABLE "analyses" ADD COLUMN     "llm_analyzed_at" TIMESTAMP(3),
+ADD COLUMN     "technical_indicators" JSONB;
@@ -0,0 +1,42 @@
+-- CreateTable
+CREATE TABLE "batch_runs" (
+    "id" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "options" JSONB,
+    "started_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "finished_at" TIMESTAMP(3),
+
+    CONSTRAINT "batch_runs_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateTable
+CREATE TABLE "batch_run_items" (
+    "id" TEXT NOT NULL,
+    "run_id" TEXT NOT NULL,
+    "stock_id" TEXT NOT NULL,
+    "ticker" TEXT NOT NULL,
+    "position" INTEGER NOT NULL,
+    "state" TEXT NOT NULL DEFAULT 'pending',
+    "attempts" INTEGER NOT NULL DEFAULT 0,
+    "last_error" TEXT,
+    "started_at" TIMESTAMP(3),
+    "finished_at" TIMESTAMP(3),
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "batch_run_items_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "batch_runs_started_at_idx" ON "batch_runs"("started_at");
+
+-- CreateIndex
+CREATE INDEX "batch_run_items_run_id_state_idx" ON "batch_run_items"("run_id", "state");
+
+-- CreateIndex
+CREATE UNIQUE INDEX "batch_run_items_run_id_stock_id_key" ON "batch_run_items"("run_id", "stock_id");
+
+-- AddForeignKey
+ALTER TABLE "batch_run_items" ADD CONSTRAINT "batch_run_items_run_id_fkey" FOREIGN KEY ("run_id") REFERENCES "batch_runs"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "batch_run_items" ADD CONSTRAINT "batch_run_items_stock_id_fkey" FOREIGN KEY ("stock_id") REFERENCES "stocks"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,6 @@
+-- AlterTable
+ALTER TABLE "batch_run_items" ADD COLUMN     "lease_expires_at" TIMESTAMP(3),
+ADD COLUMN     "lease_owner" TEXT;
+
+-- CreateIndex
+CREATE INDEX "batch_run_items_run_id_state_position_idx" ON "batch_run_items"("run_id", "state", "position");
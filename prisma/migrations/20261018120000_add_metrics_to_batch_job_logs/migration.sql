@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "batch_job_logs" ADD COLUMN     "metrics" JSONB;
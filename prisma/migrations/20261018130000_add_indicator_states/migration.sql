@@ -0,0 +1,17 @@
+-- CreateTable
+CREATE TABLE "indicator_states" (
+    "stock_id" TEXT NOT NULL,
+    "last_date" TIMESTAMP(3) NOT NULL,
+    "bars" INTEGER NOT NULL,
+    "closes" DOUBLE PRECISION[],
+    "avg_gain" DOUBLE PRECISION NOT NULL,
+    "avg_loss" DOUBLE PRECISION NOT NULL,
+    "prev_avg_gain" DOUBLE PRECISION NOT NULL,
+    "prev_avg_loss" DOUBLE PRECISION NOT NULL,
+    "updated_at" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "indicator_states_pkey" PRIMARY KEY ("stock_id")
+);
+
+-- AddForeignKey
+ALTER TABLE "indicator_states" ADD CONSTRAINT "indicator_states_stock_id_fkey" FOREIGN KEY ("stock_id") REFERENCES "stocks"("id") ON DELETE CASCADE ON UPDATE CASCADE;